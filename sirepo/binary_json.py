@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+u"""JSON with numeric arrays as typed binary
+
+Plot responses (heatmaps, line plots) are mostly numbers. A client
+which sends ``Accept: application/x-sirepo-binary-json`` receives the
+response in this envelope instead of JSON text::
+
+    magic      4 bytes  b'SRB1'
+    length     uint32 little-endian length of header
+    header     utf-8 JSON: {"arrays": [...], "value": ...}
+    padding    to a multiple of 8 bytes
+    data       arrays, each padded to a multiple of 8 bytes
+
+In ``value`` each numeric array (a numpy array or a list of numbers or
+equal length lists of numbers with at least `MIN_ARRAY_SIZE` elements)
+is replaced by ``{"__array__": index}``. ``arrays[index]`` has dtype
+(``<f4``, ``<f8``, or ``<i4``), shape, and offset from the start of
+data, which is aligned so a client can use
+``new Float32Array(buffer, offset, count)`` without copying.
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+from pykern.pkdebug import pkdc, pkdexc, pkdlog, pkdp
+import json
+import numbers
+import numpy as np
+import struct
+
+#: Content-Type of encoded responses
+MIME_TYPE = 'application/x-sirepo-binary-json'
+
+#: Smaller arrays are left in the header
+MIN_ARRAY_SIZE = 32
+
+#: Key in header which references an array
+ARRAY_KEY = '__array__'
+
+#: Identifies the format and version
+_MAGIC = b'SRB1'
+
+#: Array data alignment
+_ALIGN = 8
+
+#: Range of <i4
+_INT32 = np.iinfo(np.int32)
+
+
+def decode(data):
+    """Parse envelope created by `encode`
+
+    Args:
+        data (bytes): envelope
+
+    Returns:
+        object: value with numpy arrays
+    """
+    assert data[:len(_MAGIC)] == _MAGIC, \
+        'invalid magic: {}'.format(repr(data[:len(_MAGIC)]))
+    n = struct.unpack_from('<I', data, len(_MAGIC))[0]
+    i = len(_MAGIC) + 4
+    h = json.loads(data[i:i + n].decode('utf-8'))
+    start = _aligned(i + n)
+    arrays = []
+    for a in h['arrays']:
+        arrays.append(
+            np.frombuffer(
+                data,
+                dtype=a['dtype'],
+                count=int(np.prod(a['shape'])),
+                offset=start + a['offset'],
+            ).reshape(a['shape']),
+        )
+    return _restore(h['value'], arrays)
+
+
+def encode(value, float_dtype='<f4'):
+    """Convert value into envelope
+
+    Args:
+        value (object): plot data which would otherwise be sent as JSON
+        float_dtype (str): ``<f4`` or ``<f8`` [``<f4``]
+
+    Returns:
+        bytes: envelope
+    """
+    arrays = []
+    v = _replace(value, arrays, float_dtype)
+    desc = []
+    offset = 0
+    for a in arrays:
+        desc.append(dict(dtype=a.dtype.str, shape=a.shape, offset=offset))
+        offset = _aligned(offset + a.nbytes)
+    h = json.dumps(dict(arrays=desc, value=v), allow_nan=False).encode('utf-8')
+    n = len(_MAGIC) + 4 + len(h)
+    res = [_MAGIC, struct.pack('<I', len(h)), h, b'\0' * (_aligned(n) - n)]
+    for a in arrays:
+        b = a.tobytes()
+        res.append(b)
+        res.append(b'\0' * (_aligned(len(b)) - len(b)))
+    return b''.join(res)
+
+
+def _aligned(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _array(value, float_dtype):
+    """Numeric numpy array for value or None"""
+    if isinstance(value, np.ndarray):
+        a = value
+    else:
+        if len(value) < MIN_ARRAY_SIZE and not (
+            value and isinstance(value[0], list)
+        ):
+            return None
+        if not (
+            isinstance(value[0], numbers.Real)
+            or isinstance(value[0], list) and value[0] and isinstance(value[0][0], numbers.Real)
+        ):
+            return None
+        try:
+            a = np.asarray(value)
+        except ValueError:
+            # ragged
+            return None
+    if a.size < MIN_ARRAY_SIZE or a.dtype.kind not in 'biuf':
+        return None
+    if a.dtype.kind == 'f':
+        return a.astype(float_dtype, copy=False)
+    if a.size and (a.min() < _INT32.min or a.max() > _INT32.max):
+        return a.astype('<f8')
+    return a.astype('<i4', copy=False)
+
+
+def _replace(value, arrays, float_dtype):
+    if isinstance(value, dict):
+        return dict((k, _replace(v, arrays, float_dtype)) for k, v in value.items())
+    if isinstance(value, np.ndarray) and not value.ndim:
+        return value.item()
+    if isinstance(value, (list, tuple, np.ndarray)):
+        if len(value):
+            a = _array(value, float_dtype)
+            if a is not None:
+                arrays.append(np.ascontiguousarray(a))
+                return {ARRAY_KEY: len(arrays) - 1}
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        return [_replace(v, arrays, float_dtype) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _restore(value, arrays):
+    if isinstance(value, dict):
+        if len(value) == 1 and ARRAY_KEY in value:
+            return arrays[value[ARRAY_KEY]]
+        return dict((k, _restore(v, arrays)) for k, v in value.items())
+    if isinstance(value, list):
+        return [_restore(v, arrays) for v in value]
+    return value
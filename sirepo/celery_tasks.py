@@ -10,12 +10,16 @@ from pykern import pkconfig
 pkconfig.append_load_path('sirepo')
 
 from celery import Celery
+from celery import signals
 from pykern import pkcollections
 from pykern import pkio
 from pykern import pksubprocess
 from pykern.pkdebug import pkdc, pkdexc, pkdp
+from sirepo import job_history
+from sirepo import worker_pool
 from sirepo.template import template_common
 import py.path
+import resource
 
 
 celery = Celery('sirepo')
@@ -83,14 +87,27 @@ def start_simulation(cmd, run_dir):
     Args:
         cmd (list): simulation command line
         run_dir (str): directory
+
+    Returns:
+        dict: resource usage of the simulation (see `job_history.rusage`)
     """
     # Avoid circular import
     from sirepo import simulation_db
     run_dir = py.path.local(run_dir)
     simulation_db.hack_nfs_write_status('running', run_dir)
-    with pkio.save_chdir(run_dir):
-        pksubprocess.check_call_with_signals(
-            cmd,
-            msg=pkdp,
-            output=str(run_dir.join(template_common.RUN_LOG)),
-        )
+    if not worker_pool.run(cmd, run_dir):
+        with pkio.save_chdir(run_dir):
+            pksubprocess.check_call_with_signals(
+                cmd,
+                msg=pkdp,
+                output=str(run_dir.join(template_common.RUN_LOG)),
+            )
+    # the worker runs one task (CELERYD_MAX_TASKS_PER_CHILD) so its
+    # children are the simulation's processes
+    return job_history.rusage(resource.getrusage(resource.RUSAGE_CHILDREN), 0)
+
+
+@signals.worker_init.connect
+def _worker_init(**kwargs):
+    """Import the codes before the workers are forked"""
+    worker_pool.preload()
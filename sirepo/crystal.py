@@ -3,16 +3,94 @@
 """
 Get polarizability from X0h server (http://x-server.gmca.aps.anl.gov/x0h.html).
 For details see http://x-server.gmca.aps.anl.gov/pub/Stepanov_CR_1991_08.pdf.
+
+Server responses are stored in a persistent cache (one JSON file per
+material and reflection) so the server is only queried once for each
+(material, energy, h, k, l). Energies between two nearby cached
+energies are interpolated, which covers the common crystals when an
+energy grid has been fetched with ``sirepo crystal cache_grid``.
 """
 from __future__ import division
 
+from pykern import pkcollections
+from pykern import pkconfig
+from pykern import pkio
+from pykern.pkdebug import pkdc, pkdlog, pkdp
+import bisect
+import json
 import math
+import os
 import re
+import threading
 
 import requests
 
 X0H_SERVER = 'http://x-server.gmca.aps.anl.gov/cgi/x0h_form.exe'
 
+#: Default ratio between energies of cache_grid
+GRID_STEP = 1.01
+
+#: Subdirectory of the server's db_dir when cfg.cache_dir is not set
+_CACHE_SUBDIR = 'crystal'
+
+#: Interpolate only if neighbors are closer than this ratio
+_MAX_INTERPOLATION_RATIO = GRID_STEP * 1.001
+
+#: Polarizabilities decrease like energy ** -2 (real) and -3 (imag)
+#: away from absorption edges. A steeper slope between neighbors means
+#: there is an edge so the energy must be fetched.
+_MAX_SLOPE = 5.0
+
+#: Fields which vary with energy
+_POLARIZABILITY_FIELDS = ('xr0', 'xi0', 'xrh', 'xih')
+
+#: (material, h, k, l) to points in cache file (see _store)
+_stores = {}
+
+#: Protects _stores and cache files
+_lock = threading.RLock()
+
+
+def cache_grid(material, h, k, l, min_eV, max_eV, step=GRID_STEP):
+    """Fetch parameters for energies from min_eV to max_eV
+
+    Energies increase by step so `get_crystal_parameters` can
+    interpolate between them without accessing the server.
+
+    Args:
+        material (str): material full name (e.g., 'Silicon').
+        h (int): Miller's index h.
+        k (int): Miller's index k.
+        l (int): Miller's index l.
+        min_eV (float): lowest photon energy [eV].
+        max_eV (float): highest photon energy [eV].
+        step (float): ratio between energies [GRID_STEP].
+
+    Returns:
+        int: number of energies fetched from the server.
+    """
+    min_eV = float(min_eV)
+    max_eV = float(max_eV)
+    step = float(step)
+    assert 1 < step <= GRID_STEP, \
+        '{}: step must be greater than 1 and at most {}'.format(step, GRID_STEP)
+    res = 0
+    e = min_eV
+    while True:
+        with _lock:
+            hit = _energy_key(e) in _store(material, h, k, l)
+        if not hit:
+            try:
+                _fetch(material, e, h, k, l)
+                res += 1
+            except AssertionError:
+                # no reflection, e.g. below the Bragg cutoff
+                pkdlog('{} {}{}{} {}eV: no parameters from server', material, h, k, l, e)
+        if e >= max_eV:
+            # grid brackets max_eV
+            return res
+        e = round(e * step, 3)
+
 
 def calc_bragg_angle(d, energy_eV, n=1):
     """Calculate Bragg angle from the provided energy and d-spacing.
@@ -68,10 +146,38 @@ def get_crystal_parameters(material, energy_eV, h, k, l):
     k = int(k)
     l = int(l)
 
+    with _lock:
+        points = _store(material, h, k, l)
+        res = points.get(_energy_key(energy_eV))
+        if not res:
+            res = _interpolate(points, energy_eV)
+        if res:
+            return dict(res)
+    return _fetch(material, energy_eV, h, k, l)
+
+
+def _cache_dir():
+    if not cfg.cache_dir:
+        from sirepo import server
+        cfg.cache_dir = server.cfg.db_dir.join(_CACHE_SUBDIR)
+    return pkio.mkdir_parent(cfg.cache_dir)
+
+
+@pkconfig.parse_none
+def _cfg_cache_dir(value):
+    return pkio.py_path(value) if value else None
+
+
+def _energy_key(energy_eV):
+    return '{:.3f}'.format(energy_eV)
+
+
+def _fetch(material, energy_eV, h, k, l):
+    """Get parameters from the server and add them to the cache"""
     energy_keV = energy_eV / 1000.0  # convert to keV
     content = _get_server_data(energy_keV, material, h, k, l)
     crystal_parameters = _get_crystal_parameters(content, [h, k, l])
-
+    _save(material, h, k, l, energy_eV, crystal_parameters)
     return crystal_parameters
 
 
@@ -160,11 +266,106 @@ def _get_server_data(energy, material, h, k, l):
         'df1df2': -1,
         'modeout': 1,
     }
-    r = requests.get(X0H_SERVER, params=payload)
+    pkdc('{}: {}', cfg.server, payload)
+    r = requests.get(cfg.server, params=payload, timeout=cfg.timeout)
+    r.raise_for_status()
     content = r.text
     content = content.split('\n')
     return content
 
 
+def _interpolate(points, energy_eV):
+    """Interpolate between the nearest cached energies
+
+    Polarizabilities are interpolated linearly in log-log space
+    (exact for a power law) and geometry comes from the neighbor.
+
+    Args:
+        points (dict): energy key to parameters
+        energy_eV (float): photon energy [eV].
+
+    Returns:
+        dict: parameters or None if no close neighbors
+    """
+    energies = sorted(float(e) for e in points)
+    i = bisect.bisect_left(energies, energy_eV)
+    if i == 0 or i >= len(energies):
+        return None
+    e0 = energies[i - 1]
+    e1 = energies[i]
+    if e1 / e0 > _MAX_INTERPOLATION_RATIO:
+        return None
+    p0 = points[_energy_key(e0)]
+    p1 = points[_energy_key(e1)]
+    f = math.log(energy_eV / e0) / math.log(e1 / e0)
+    res = dict(p0)
+    for k in _POLARIZABILITY_FIELDS:
+        v0 = p0[k]
+        v1 = p1[k]
+        if v0 * v1 <= 0:
+            return None
+        slope = math.log(v1 / v0) / math.log(e1 / e0)
+        if abs(slope) > _MAX_SLOPE:
+            # absorption edge
+            return None
+        res[k] = v0 * math.exp(f * math.log(v1 / v0))
+    res['bragg_angle_deg'] = calc_bragg_angle(res['d'], energy_eV)['bragg_angle_deg']
+    return res
+
+
 def _parse_xr_xi(string):
     return float(string.split('=')[-1].strip())
+
+
+def _save(material, h, k, l, energy_eV, crystal_parameters):
+    """Add server response to the cache file"""
+    with _lock:
+        points = _store(material, h, k, l, reload=True)
+        points[_energy_key(energy_eV)] = crystal_parameters
+        fn = _store_path(material, h, k, l)
+        tmp = fn + '.tmp{}'.format(os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(points, f, indent=0, sort_keys=True)
+        os.rename(tmp, fn)
+
+
+def _store(material, h, k, l, reload=False):
+    """Points in cache file for material and reflection
+
+    Another process may have added points so the file is reread
+    when its mtime changes.
+
+    Returns:
+        dict: energy key to parameters
+    """
+    key = (material, h, k, l)
+    fn = _store_path(material, h, k, l)
+    try:
+        m = os.path.getmtime(fn)
+    except OSError:
+        m = None
+    s = _stores.get(key)
+    if s and s.mtime == m and not reload:
+        return s.points
+    points = {}
+    if m is not None:
+        try:
+            with open(fn) as f:
+                points = json.load(f)
+        except ValueError:
+            pkdlog('{}: corrupt crystal cache, ignoring', fn)
+    _stores[key] = pkcollections.Dict(mtime=m, points=points)
+    return points
+
+
+def _store_path(material, h, k, l):
+    assert re.search(r'^\w+$', material), \
+        '{}: invalid material'.format(material)
+    return str(_cache_dir().join('{}-{}-{}-{}.json'.format(material, h, k, l)))
+
+
+cfg = pkconfig.init(
+    cache_dir=(None, _cfg_cache_dir, 'where X0h results are cached [<server db_dir>/crystal]'),
+    server=(X0H_SERVER, str, 'X0h server url'),
+    timeout=(30, float, 'seconds to wait for X0h server'),
+)
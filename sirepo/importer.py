@@ -65,6 +65,7 @@ def read_zip(stream, template=None):
         dict: data
     """
     from pykern import pkcollections
+    from pykern import pkio
     from sirepo import simulation_db
     from sirepo.template import template_common
     import py.path
@@ -102,5 +103,7 @@ def read_zip(stream, template=None):
     lib_d = simulation_db.simulation_lib_dir(template.SIM_TYPE)
     for b, src in zipped.items():
         if b in needed:
+            # replace, because lib files may be linked to the shared example store
+            pkio.unchecked_remove(needed[b])
             src.copy(needed[b])
     return data
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+u"""Resource usage of finished jobs
+
+When a job started by `sirepo.runner` stops, the runner records the
+simulation type, report, parameters hash, exit status, wall time, CPU
+time, peak resident set size, cores, and the size of the run dir in a
+store shared by all server processes on the host.
+
+The CPU time and peak RSS come from whatever waits for the job's
+process: ``os.wait4`` for `sirepo.runner.Background`, the task's
+result for `sirepo.runner.Celery`, and the container's cgroup for
+`sirepo.runner.Docker`. Jobs which are not children of the server
+write them to `RUSAGE_FILE` in the run dir (see `write_rusage`).
+
+`summarize` computes percentiles per simulation type and report. It is
+available with ``sirepo admin job-history`` and the jobHistory API
+(see `cfg.admin_secret`).
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+from pykern import pkcollections
+from pykern import pkconfig
+from pykern import pkio
+from pykern.pkdebug import pkdc, pkdexc, pkdlog, pkdp
+from sirepo import retention
+from sirepo import sqlite_util
+from sirepo import util
+import Queue
+import json
+import os
+import threading
+import time
+
+#: Store file in db_dir
+DB_FILE = 'job-history.db'
+
+#: Written in the run dir by processes which wait for the job
+RUSAGE_FILE = 'rusage.json'
+
+#: Columns which `summarize` computes percentiles of
+METRICS = ('wall_secs', 'cpu_secs', 'max_rss', 'output_bytes')
+
+#: Percentiles computed by `summarize`
+PERCENTILES = (50, 90, 99)
+
+#: `_write` removes expired jobs at most this often per process
+_PRUNE_SECS = 3600
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS job (
+    jid TEXT NOT NULL,
+    sim_type TEXT NOT NULL,
+    report TEXT NOT NULL,
+    parameters_hash TEXT,
+    uid TEXT NOT NULL,
+    job_class TEXT NOT NULL,
+    resource_class TEXT NOT NULL,
+    state TEXT NOT NULL,
+    exit_status INTEGER,
+    cores REAL NOT NULL,
+    start_time REAL NOT NULL,
+    end_time REAL NOT NULL,
+    wall_secs REAL NOT NULL,
+    cpu_secs REAL,
+    max_rss INTEGER,
+    output_bytes INTEGER NOT NULL
+)
+'''
+
+_INDEX = 'CREATE INDEX IF NOT EXISTS job_end_time ON job (end_time)'
+
+#: Path to database (see `init`)
+_path = None
+
+#: Time of last prune by `_write`
+_pruned = 0
+
+#: Jobs passed to `record` (see `_write`)
+_queue = Queue.Queue()
+
+#: Process which started the thread running `_write`
+_writer = None
+
+#: Serializes access within a process
+_lock = threading.RLock()
+
+
+def init(db_dir):
+    """Create the store if necessary
+
+    Args:
+        db_dir (py.path): where the store lives
+    """
+    global _path
+    _path = str(db_dir.join(DB_FILE))
+    with _transaction() as c:
+        c.execute(_SCHEMA)
+        c.execute(_INDEX)
+
+
+def read_rusage(run_dir):
+    """Resource usage written by `write_rusage`
+
+    Args:
+        run_dir (py.path): where the job ran
+
+    Returns:
+        Dict: cpu_secs, max_rss, exit_status (may be empty)
+    """
+    try:
+        with open(str(run_dir.join(RUSAGE_FILE))) as f:
+            return pkcollections.Dict(json.load(f))
+    except Exception as e:
+        if not pkio.exception_is_not_found(e):
+            pkdlog('{}: invalid {}: {}', run_dir, RUSAGE_FILE, e)
+    return pkcollections.Dict()
+
+
+def record(job, stopped):
+    """Queue a stopped job to be added by `_write`
+
+    The caller may be a signal handler (`sirepo.runner.Background`) so
+    the run dir and the store are read and written by a thread.
+
+    Args:
+        job (sirepo.runner.Base): job which ran (has data, run_dir, start_time)
+        stopped (callable): called by the thread; returns Dict of state
+            (of the run dir), cores, and usage (see `rusage`)
+    """
+    global _writer
+
+    if not _path:
+        return
+    _queue.put((job, stopped, time.time()))
+    with _lock:
+        # uwsgi forks the workers after init
+        if _writer != os.getpid():
+            _writer = os.getpid()
+            t = threading.Thread(target=_write)
+            t.daemon = True
+            t.start()
+
+
+def rusage(ru, status=None):
+    """Convert output of ``os.wait4`` or ``resource.getrusage``
+
+    Args:
+        ru (resource.struct_rusage): usage of the job's processes
+        status (int): wait status [None]
+
+    Returns:
+        Dict: cpu_secs, max_rss (bytes), exit_status (negative signal
+            if killed, like `subprocess.Popen.returncode`)
+    """
+    res = pkcollections.Dict(
+        cpu_secs=ru.ru_utime + ru.ru_stime,
+        # kilobytes on Linux
+        max_rss=ru.ru_maxrss * 1024,
+        exit_status=None,
+    )
+    if status is not None:
+        res.exit_status = -os.WTERMSIG(status) if os.WIFSIGNALED(status) \
+            else os.WEXITSTATUS(status)
+    return res
+
+
+def summarize(days=None, sim_type=None):
+    """Percentiles of jobs per simulation type and report
+
+    Args:
+        days (float): only jobs which ended in the last days [None]
+        sim_type (str): only jobs of this simulation type [None]
+
+    Returns:
+        list: Dict rows (sim_type, report, jobs, errors, core_secs, and
+            ``<metric>_p<percentile>`` of `METRICS` and `PERCENTILES`)
+            ordered by core_secs descending, i.e. the most load first
+    """
+    w = []
+    a = []
+    if days:
+        w.append('end_time >= ?')
+        a.append(time.time() - float(days) * 86400)
+    if sim_type:
+        w.append('sim_type = ?')
+        a.append(sim_type)
+    with _transaction(immediate=False) as c:
+        rows = c.execute(
+            'SELECT * FROM job{} ORDER BY sim_type, report'.format(
+                ' WHERE ' + ' AND '.join(w) if w else '',
+            ),
+            a,
+        ).fetchall()
+    groups = {}
+    for r in rows:
+        groups.setdefault((r['sim_type'], r['report']), []).append(r)
+    res = []
+    for k, g in groups.items():
+        x = pkcollections.Dict(
+            sim_type=k[0],
+            report=k[1],
+            jobs=len(g),
+            errors=sum(1 for r in g if r['state'] != 'completed'),
+            core_secs=sum(r['wall_secs'] * r['cores'] for r in g),
+        )
+        for m in METRICS:
+            v = sorted(r[m] for r in g if r[m] is not None)
+            for p in PERCENTILES:
+                x['{}_p{}'.format(m, p)] = _percentile(v, p)
+        res.append(x)
+    res.sort(key=lambda x: (-x.core_secs, x.sim_type, x.report))
+    return res
+
+
+def write_rusage(run_dir, usage):
+    """Save usage for the server (see `read_rusage`)
+
+    Args:
+        run_dir (py.path): where the job ran
+        usage (dict): from `rusage`
+    """
+    with open(str(run_dir.join(RUSAGE_FILE)), 'w') as f:
+        json.dump(usage, f)
+
+
+def _percentile(values, percent):
+    """Nearest rank of sorted values (None if empty)"""
+    if not values:
+        return None
+    return values[max(0, -(-len(values) * percent // 100) - 1)]
+
+
+def _write():
+    """Add jobs queued by `record` (runs in a thread)"""
+    global _pruned
+
+    while True:
+        job, stopped, now = _queue.get()
+        try:
+            x = stopped()
+            s = getattr(job, 'start_time', None) or now
+            # outside the transaction, which blocks other processes
+            b = util.dir_size(job.run_dir)
+            with _transaction() as c:
+                c.execute(
+                    '''INSERT INTO job
+                    (jid, sim_type, report, parameters_hash, uid, job_class, resource_class,
+                    state, exit_status, cores, start_time, end_time, wall_secs, cpu_secs,
+                    max_rss, output_bytes)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                    (
+                        job.jid,
+                        job.data['simulationType'],
+                        job.data['report'],
+                        job.data.get('reportParametersHash'),
+                        job.uid,
+                        job.__class__.__name__,
+                        job.resource_class,
+                        x.state,
+                        x.usage.get('exit_status'),
+                        x.cores,
+                        s,
+                        now,
+                        now - s,
+                        x.usage.get('cpu_secs'),
+                        x.usage.get('max_rss'),
+                        b,
+                    ),
+                )
+                if cfg.keep_days and _pruned < now - _PRUNE_SECS:
+                    _pruned = now
+                    c.execute('DELETE FROM job WHERE end_time < ?', (now - cfg.keep_days * 86400,))
+            retention.record_size(job.run_dir, b)
+        except Exception:
+            pkdlog('{}: record failed: {}', job.jid, pkdexc())
+
+
+def _transaction(immediate=True):
+    assert _path, 'init() not called'
+    return sqlite_util.transaction(_path, _lock, immediate)
+
+
+cfg = pkconfig.init(
+    admin_secret=(None, str, 'secret of the jobHistory API (disabled if not set)'),
+    keep_days=(90, int, 'jobs which ended earlier are removed (0 keeps all)'),
+)
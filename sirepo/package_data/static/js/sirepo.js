@@ -24,7 +24,8 @@ angular.element(document).ready(function() {
                 srlog("schema load failed: ", err);
             }
         },
-        method: 'POST',
+        // GET so the browser can revalidate with the ETag
+        method: 'GET',
         dataType: 'json',
     });
 });
@@ -1554,8 +1555,11 @@ SIREPO.app.factory('simulationQueue', function($rootScope, $interval, requestSen
                     requestSender.sendRequest(
                         'runStatus', process, qi.request, process);
                 },
-                // Sanity check in case of defect on server
-                Math.max(1, resp.nextRequestSeconds) * 1000,
+                // server holds the request until the status changes
+                resp.nextRequest && resp.nextRequest.runStatusKey
+                    ? 0
+                    // Sanity check in case of defect on server
+                    : Math.max(1, resp.nextRequestSeconds) * 1000,
                 1
             );
             if (qi.persistent) {
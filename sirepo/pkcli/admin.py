@@ -33,7 +33,7 @@ def create_examples():
             simulation_db.verify_app_directory(sim_type)
             names = map(
                 lambda x: x['name'],
-                simulation_db.iterate_simulation_datafiles(sim_type, simulation_db.process_simulation_list, {
+                simulation_db.iterate_simulation_catalog(sim_type, simulation_db.process_simulation_list, {
                     'simulation.isExample': True,
                 }))
             for s in simulation_db.examples(sim_type):
@@ -41,6 +41,39 @@ def create_examples():
                     simulation_db.save_new_example(s)
 
 
+def job_history(days=None, sim_type=None):
+    """Summarize resource usage of jobs per report
+
+    See `sirepo.job_history` for configuration.
+
+    Args:
+        days (float): only jobs which ended in the last days [all]
+        sim_type (str): only jobs of this simulation type [all]
+
+    Returns:
+        str: jobs, errors, core hours, and p50/p90/p99 of wall and cpu
+            seconds, peak RSS and output size (MB) per report, most load first
+    """
+    from sirepo import job_history
+    from sirepo import server
+
+    server.init()
+    res = [
+        ['sim_type', 'report', 'jobs', 'errors', 'core_hours']
+        + [m + ' ' + '/'.join('p{}'.format(p) for p in job_history.PERCENTILES) for m in job_history.METRICS],
+    ]
+    for r in job_history.summarize(days=days, sim_type=sim_type):
+        x = [r.sim_type, r.report, str(r.jobs), str(r.errors), '{:.2f}'.format(r.core_secs / 3600)]
+        for m in job_history.METRICS:
+            x.append('/'.join(
+                '-' if v is None else '{:.1f}'.format(v / 1e6 if m in ('max_rss', 'output_bytes') else v)
+                for v in (r['{}_p{}'.format(m, p)] for p in job_history.PERCENTILES)
+            ))
+        res.append(x)
+    w = [max(len(x[i]) for x in res) for i in range(len(res[0]))]
+    return '\n'.join('  '.join(v.ljust(w[i]) for i, v in enumerate(x)).rstrip() for x in res)
+
+
 def purge_users(days=180, confirm=False):
     """Remove old users from db which have not registered.
 
@@ -79,5 +112,30 @@ def purge_users(days=180, confirm=False):
     return to_remove
 
 
+def retention(confirm=False):
+    """Remove least recently used run dirs to enforce disk budgets
+
+    See `sirepo.retention` for configuration.
+
+    Args:
+        confirm (bool): delete the directories if True (else don't delete) [False]
+
+    Returns:
+        str: bytes reclaimed and directories removed (or to remove if not confirm)
+    """
+    from sirepo import retention
+    from sirepo import server
+
+    server.init()
+    res = retention.sweep(confirm=confirm)
+    return '{} bytes in {} runs, {} bytes {}\n{}'.format(
+        res.bytes,
+        res.runs,
+        res.reclaimed,
+        'reclaimed' if confirm else 'to reclaim',
+        '\n'.join(str(d) for d in res.removed),
+    )
+
+
 def _is_src_dir(d):
     return re.search(r'/src$', str(d))
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+u"""Crystal parameter cache
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+
+#: Materials offered by the srw CrystalMaterial enum
+_MATERIALS = 'Silicon,Germanium,Diamond'
+
+#: Common reflections
+_REFLECTIONS = '111,220,311,400'
+
+
+def cache_grid(materials=_MATERIALS, reflections=_REFLECTIONS, min_eV=2000, max_eV=30000, step=None):
+    """Fetch an energy grid from the X0h server for common crystals
+
+    After this runs, `sirepo.crystal.get_crystal_parameters`
+    interpolates energies in [min_eV, max_eV] without the server.
+
+    Args:
+        materials (str): comma separated X0h material names [Silicon,Germanium,Diamond]
+        reflections (str): comma separated Miller indices, e.g. 111,220 [111,220,311,400]
+        min_eV (float): lowest photon energy [2000]
+        max_eV (float): highest photon energy [30000]
+        step (float): ratio between energies [sirepo.crystal.GRID_STEP]
+
+    Returns:
+        str: number of energies fetched per material and reflection
+    """
+    from sirepo import crystal
+
+    res = []
+    for m in materials.split(','):
+        for r in reflections.split(','):
+            assert len(r) == 3 and r.isdigit(), \
+                '{}: reflection must be three digits (hkl)'.format(r)
+            n = crystal.cache_grid(
+                m,
+                int(r[0]),
+                int(r[1]),
+                int(r[2]),
+                min_eV,
+                max_eV,
+                step or crystal.GRID_STEP,
+            )
+            res.append('{} {}: {}'.format(m, r, n))
+    return '\n'.join(res)
@@ -7,30 +7,41 @@ u"""Database utilities
 from __future__ import absolute_import, division, print_function
 
 
+def rebuild_sid_locator():
+    """Recreate the index used to find simulations by id across users
+
+    Returns:
+        str: number of simulations indexed
+    """
+    from sirepo import simulation_db
+    from sirepo import server
+
+    server.init()
+    return '{} simulations'.format(simulation_db.rebuild_sid_locator())
+
+
 def upgrade():
-    """Upgrade the database"""
+    """Upgrade the database
+
+    Documents are replaced (not written in place), because examples are
+    links to read-only files shared by all users.
+    """
     from pykern import pkio
     from sirepo import simulation_db
     from sirepo import server
-    import re
-
-    def _inc(m):
-        return m.group(1) + str(int(m.group(2)) + 1)
 
+    names = {
+        'WARP example laser simulation': 'Laser-Plasma Wakefield',
+        'Laser Pulse': 'Laser-Plasma Wakefield',
+        'WARP example electron beam simulation': 'Electron Beam',
+    }
     server.init()
     for d in pkio.sorted_glob(simulation_db.user_dir_name().join('*/warppba')):
-        for fn in pkio.sorted_glob(d.join('*/sirepo-data.json')):
-            with open(str(fn)) as f:
-                t = f.read()
-            for old, new in (
-                ('"WARP example laser simulation"', '"Laser-Plasma Wakefield"'),
-                ('"Laser Pulse"', '"Laser-Plasma Wakefield"'),
-                ('"WARP example electron beam simulation"', '"Electron Beam"'),
-            ):
-                if not old in t:
-                    continue
-                t = t.replace(old, new)
-                t = re.sub(r'(simulationSerial":\s+)(\d+)', _inc, t)
-                break
-            with open(str(fn), 'w') as f:
-                f.write(t)
+        for fn in pkio.sorted_glob(d.join('*', simulation_db.SIMULATION_DATA_FILE)):
+            data = simulation_db.read_json(fn)
+            s = data.models.simulation
+            if s.name not in names:
+                continue
+            s.name = names[s.name]
+            s.simulationSerial += 1
+            simulation_db.write_json(fn, data)
@@ -14,7 +14,7 @@ from pykern import pkinspect
 from pykern import pkio
 from pykern import pkjinja
 from pykern import pksubprocess
-from pykern.pkdebug import pkdc, pkdexc, pkdp
+from pykern.pkdebug import pkdc, pkdexc, pkdlog, pkdp
 import json
 import os
 import py
@@ -115,6 +115,24 @@ def rabbitmq():
                 pkcli.command_error('docker is not installed')
 
 
+def retention():
+    """Sweep run dirs periodically to enforce disk budgets
+
+    See `sirepo.retention` for configuration.
+    """
+    from sirepo import retention
+    from sirepo import server
+    import time
+
+    server.init()
+    while True:
+        try:
+            retention.sweep()
+        except Exception:
+            pkdlog('sweep failed: {}', pkdexc())
+        time.sleep(retention.cfg.sweep_secs)
+
+
 def uwsgi():
     """Starts UWSGI server"""
     run_dir = _run_dir()
@@ -130,6 +148,19 @@ def uwsgi():
         pksubprocess.check_call_with_signals(cmd)
 
 
+def worker_pool(sim_type):
+    """Import sim_type once and fork its jobs
+
+    Started by `sirepo.runner`, see `sirepo.worker_pool`.
+
+    Args:
+        sim_type (str): code of the sequential reports
+    """
+    from sirepo import worker_pool
+
+    worker_pool.serve(sim_type)
+
+
 def _cfg_emails(value):
     """Parse a list of emails separated by comma, colons, semicolons or spaces.
 
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+u"""Results of runs shared by all simulations and users
+
+A run is determined by its simulation type, report (run dir), the
+report's parameters (`template_common.report_parameters_hash`), the
+contents of its lib files, and the schema version. When a run
+completes, the files in its run dir are hard linked into an entry
+named by the hash of those inputs. A simulation which requests the
+same run (another user's copy of an example, a copy, an undo) has its
+run dir populated from the entry instead of running again.
+
+Entries live in db_dir/result-cache/<key>. The files are read-only,
+because they are shared, and templates replace files rather than
+modify them. The mtime of an entry is the time it was last used. When
+the total size exceeds `cfg.max_bytes`, the least recently used entries
+are removed.
+
+`key` also identifies identical runs which are in progress, which
+`sirepo.runner` shares with `copy_run`.
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+from pykern import pkconfig
+from pykern import pkio
+from pykern.pkdebug import pkdc, pkdexc, pkdlog, pkdp
+from sirepo import simulation_db
+from sirepo.template import template_common
+import errno
+import hashlib
+import os
+import shutil
+import threading
+
+#: Directory in db_dir
+DIR = 'result-cache'
+
+#: Describes the entry: size, files, simulationType, and report
+_ENTRY_FILE = 'entry.json'
+
+#: Directory in the entry which holds the run dir's files
+_RUN_DIR = 'run'
+
+#: Where entries live (None if disabled, see `init`)
+_root = None
+
+#: Content hashes of lib files by path and identity
+_lib_hash = {}
+
+#: Serializes `_lib_hash` updates
+_lib_hash_lock = threading.Lock()
+
+
+def copy_run(src, data, run_dir):
+    """Populate run_dir from another completed run
+
+    Used by `sirepo.runner` to share the result of an identical run
+    (same `key`) which was in progress when data was started. The
+    files are shared so they are made read-only like an entry's.
+
+    Args:
+        src (py.path): completed run dir
+        data (dict): input file of run_dir
+        run_dir (py.path): replaced by the files of src
+    """
+    _populate(src, data, run_dir, read_only=True)
+
+
+def fetch(data, run_dir):
+    """Populate run_dir from the entry for data
+
+    The entry's files are linked into a new directory, which replaces
+    run_dir. The input file is written from data so the run dir
+    belongs to this simulation.
+
+    Args:
+        data (dict): request with models
+        run_dir (py.path): where the run would happen
+
+    Returns:
+        bool: True if run_dir was populated
+    """
+    if not _root:
+        return False
+    k = key(data, run_dir)
+    e = _root.join(k)
+    try:
+        entry = simulation_db.read_json(e.join(_ENTRY_FILE))
+    except Exception as x:
+        if not pkio.exception_is_not_found(x):
+            pkdlog('{}: invalid entry: {}', e, x)
+        return False
+    if not _populate(e.join(_RUN_DIR), data, run_dir, files=entry.files):
+        # removed by another process while linking
+        pkdlog('{}: entry incomplete, ignoring', e)
+        return False
+    try:
+        # most recently used
+        os.utime(str(e), None)
+    except OSError:
+        pass
+    pkdlog('{}: from {}', run_dir, k)
+    return True
+
+
+def init(db_dir):
+    """Enable the cache if `cfg.max_bytes`
+
+    Args:
+        db_dir (py.path): where the entries live
+    """
+    global _root
+    _root = db_dir.join(DIR) if cfg.max_bytes > 0 else None
+
+
+def key(data, run_dir):
+    """Hash of everything which determines the files of the run
+
+    Args:
+        data (dict): request with models
+        run_dir (py.path): where the run happens
+
+    Returns:
+        str: identifies the run across simulations and users
+    """
+    res = hashlib.md5()
+    for v in (
+        simulation_db.SCHEMA_COMMON['version'],
+        data.simulationType,
+        run_dir.basename,
+        template_common.report_parameters_hash(data),
+    ):
+        res.update((v + '\n').encode())
+    for f in sorted(template_common.lib_files(data)):
+        res.update('{} {}\n'.format(f.basename, _lib_file_hash(f)).encode())
+    return res.hexdigest()
+
+
+def store(data, run_dir):
+    """Add completed run to cache, unless it is already there
+
+    Args:
+        data (dict): input file of run_dir
+        run_dir (py.path): completed run
+    """
+    if not _root:
+        return
+    k = key(data, run_dir)
+    e = _root.join(k)
+    if e.check(dir=True):
+        return
+    t = simulation_db.json_filename(template_common.INPUT_BASE_NAME, run_dir).mtime()
+    for f in template_common.lib_files(data):
+        if f.exists() and f.mtime() > t:
+            pkdc('{}: lib file modified after run, not storing', f)
+            return
+    tmp = _tmp(e)
+    try:
+        n = _link_tree(run_dir, tmp.join(_RUN_DIR), read_only=True)
+        s = 0
+        for d, _, files in os.walk(str(tmp)):
+            for f in files:
+                s += os.path.getsize(os.path.join(d, f))
+        if s > cfg.max_bytes:
+            pkdc('{}: size={} larger than cache', run_dir, s)
+            pkio.unchecked_remove(tmp)
+            return
+        simulation_db.write_json(
+            tmp.join(_ENTRY_FILE),
+            dict(
+                files=n,
+                report=run_dir.basename,
+                simulationType=data.simulationType,
+                size=s,
+            ),
+        )
+        os.rename(str(tmp), str(e))
+    except OSError as x:
+        pkio.unchecked_remove(tmp)
+        if x.errno in (errno.EEXIST, errno.ENOTEMPTY):
+            # stored by another process
+            return
+        raise
+    except Exception:
+        pkio.unchecked_remove(tmp)
+        raise
+    pkdlog('{}: stored {} size={}', run_dir, k, s)
+    _evict()
+
+
+def _evict():
+    """Remove least recently used entries until under `cfg.max_bytes`"""
+    entries = []
+    total = 0
+    for k in os.listdir(str(_root)):
+        if k.startswith('.'):
+            continue
+        e = _root.join(k)
+        try:
+            entries.append((e.mtime(), simulation_db.read_json(e.join(_ENTRY_FILE)).size, e))
+        except Exception as x:
+            if not pkio.exception_is_not_found(x):
+                pkdlog('{}: invalid entry, removing: {}', e, x)
+                _remove(e)
+            continue
+        total += entries[-1][1]
+    entries.sort()
+    while total > cfg.max_bytes and entries:
+        _, s, e = entries.pop(0)
+        pkdlog('{}: evicting size={}', e, s)
+        _remove(e)
+        total -= s
+
+
+def _lib_file_hash(path):
+    """Hash of contents of path (None if it does not exist)"""
+    p = str(path)
+    try:
+        s = os.stat(p)
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            return None
+        raise
+    k = (s.st_ino, s.st_mtime, s.st_size)
+    with _lib_hash_lock:
+        c = _lib_hash.get(p)
+        if c and c[0] == k:
+            return c[1]
+    h = hashlib.md5()
+    with open(p, 'rb') as f:
+        for b in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(b)
+    res = h.hexdigest()
+    with _lib_hash_lock:
+        _lib_hash[p] = (k, res)
+    return res
+
+
+def _link_tree(src, dst, read_only=False):
+    """Hard link the regular files of src into dst
+
+    Symlinks (lib files) and the input file are not linked.
+
+    Returns:
+        int: number of files linked
+    """
+    res = 0
+    skip = str(simulation_db.json_filename(template_common.INPUT_BASE_NAME, src))
+    src = str(src)
+    pkio.mkdir_parent(dst)
+    for d, dirs, files in os.walk(src):
+        t = os.path.join(str(dst), os.path.relpath(d, src))
+        for x in dirs:
+            if not os.path.islink(os.path.join(d, x)):
+                os.mkdir(os.path.join(t, x))
+        for x in files:
+            p = os.path.join(d, x)
+            if p == skip or os.path.islink(p):
+                continue
+            if read_only:
+                # shared so it must be replaced, not modified
+                os.chmod(p, 0o444)
+            try:
+                os.link(p, os.path.join(t, x))
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                    raise
+                shutil.copy2(p, os.path.join(t, x))
+            res += 1
+    return res
+
+
+def _populate(src, data, run_dir, files=None, read_only=False):
+    """Link the files of src into a new directory, which replaces run_dir
+
+    Returns:
+        bool: False if files is not None and fewer were linked
+    """
+    tmp = _tmp(run_dir)
+    try:
+        n = _link_tree(src, tmp, read_only=read_only)
+        if files is not None and n != files:
+            pkio.unchecked_remove(tmp)
+            return False
+        template_common.copy_lib_files(data, None, tmp)
+        simulation_db.write_json(tmp.join(template_common.INPUT_BASE_NAME), data)
+        pkio.unchecked_remove(run_dir)
+        tmp.rename(run_dir)
+    except Exception:
+        pkio.unchecked_remove(tmp)
+        raise
+    return True
+
+
+def _remove(entry):
+    """Remove entry so no process sees it partially removed"""
+    t = _tmp(entry)
+    try:
+        os.rename(str(entry), str(t))
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            return
+        raise
+    pkio.unchecked_remove(t)
+
+
+def _tmp(path):
+    return path.new(
+        basename='.{}.tmp{}-{}'.format(path.basename, os.getpid(), threading.current_thread().ident),
+    )
+
+
+cfg = pkconfig.init(
+    max_bytes=(0, int, 'Total size of shared results (0 disables)'),
+)
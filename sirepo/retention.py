@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+u"""Disk budgets for run dirs
+
+Run dirs (`simulation_db.simulation_run_dir`) are kept until they are
+run again, so large outputs accumulate. The server records when a run
+dir is accessed (`touch`) in an index shared by all server processes.
+`sweep` updates the sizes in the index and removes the least
+recently used run dirs until each user is within `cfg.user_max_bytes`
+and all users are within `cfg.max_bytes`.
+
+The size of a run dir is recorded when its job stops (`record_size`),
+so `sweep` only walks run dirs which were modified since their size
+was recorded.
+
+Only run dirs which are not pending or running and have not been
+accessed for `cfg.min_idle_secs` are removed. The simulation
+documents (the inputs) are not touched so the reports can be run
+again.
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+from pykern import pkcollections
+from pykern import pkconfig
+from pykern import pkio
+from pykern.pkdebug import pkdc, pkdexc, pkdlog, pkdp
+from sirepo import simulation_db
+from sirepo import sqlite_util
+from sirepo import util
+import collections
+import os
+import threading
+import time
+
+#: Index file in db_dir
+DB_FILE = 'retention.db'
+
+#: States of run dirs which must not be removed
+_ACTIVE_STATES = ('pending', 'running')
+
+#: `touch` writes the index at most this often per run dir and process
+_TOUCH_SECS = 60
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS run_dir (
+    path TEXT PRIMARY KEY NOT NULL,
+    uid TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL,
+    mtime REAL
+)
+'''
+
+#: Path to database (None if disabled, see `init`)
+_path = None
+
+#: run dir to time of last `touch` which wrote the index
+_touched = {}
+
+#: Serializes access within a process
+_lock = threading.RLock()
+
+
+def init(db_dir):
+    """Create the index if a budget is configured
+
+    Args:
+        db_dir (py.path): where the index lives
+    """
+    global _path
+    if not (cfg.max_bytes or cfg.user_max_bytes):
+        _path = None
+        return
+    _path = str(db_dir.join(DB_FILE))
+    with _transaction() as c:
+        c.execute(_SCHEMA)
+
+
+def record_size(run_dir, size):
+    """Save the size of run_dir when its job stopped
+
+    `sweep` uses the size until run_dir is modified.
+
+    Args:
+        run_dir (py.path): where the job ran
+        size (int): bytes of the files in run_dir (see `sirepo.util.dir_size`)
+    """
+    if not _path:
+        return
+    p = str(run_dir)
+    try:
+        m = os.stat(p).st_mtime
+    except OSError:
+        return
+    r = _relpath(p)
+    with _transaction() as c:
+        c.execute(
+            'INSERT OR IGNORE INTO run_dir (path, uid, size, last_access) VALUES (?, ?, 0, ?)',
+            (r, r.split(os.sep)[0], time.time()),
+        )
+        c.execute('UPDATE run_dir SET size = ?, mtime = ? WHERE path = ?', (size, m, r))
+
+
+def sweep(confirm=True):
+    """Update the index and remove run dirs to enforce the budgets
+
+    Args:
+        confirm (bool): remove run dirs if True (else only report) [True]
+
+    Returns:
+        Dict: runs (count), bytes (total before), removed (list of
+            run dirs), reclaimed (bytes)
+    """
+    assert _path, 'retention is not enabled'
+    now = time.time()
+    rows = _scan(now)
+    res = pkcollections.Dict(
+        runs=len(rows),
+        bytes=sum(r.size for r in rows),
+        removed=[],
+        reclaimed=0,
+    )
+    users = collections.Counter()
+    for r in rows:
+        users[r.uid] += r.size
+    # least recently used first
+    rows.sort(key=lambda r: (r.last_access, r.path))
+    evict = []
+    total = res.bytes
+    for r in rows:
+        if r.active:
+            continue
+        if r.last_access > now - cfg.min_idle_secs:
+            break
+        if (
+            cfg.user_max_bytes and users[r.uid] > cfg.user_max_bytes
+            or cfg.max_bytes and total > cfg.max_bytes
+        ):
+            evict.append(r)
+            users[r.uid] -= r.size
+            total -= r.size
+    gone = []
+    for r in evict:
+        d = simulation_db.user_dir_name().join(r.path)
+        if confirm and not _remove(d):
+            continue
+        gone.append((r.path,))
+        res.removed.append(d)
+        res.reclaimed += r.size
+    if confirm:
+        with _transaction() as c:
+            c.executemany('DELETE FROM run_dir WHERE path = ?', gone)
+    pkdlog(
+        'runs={} bytes={} removed={} reclaimed={} confirm={}',
+        res.runs,
+        res.bytes,
+        len(res.removed),
+        res.reclaimed,
+        confirm,
+    )
+    return res
+
+
+def touch(run_dir):
+    """Record the run dir was accessed
+
+    Writes the index at most every `_TOUCH_SECS` per run dir.
+
+    Args:
+        run_dir (py.path): run dir of a request
+    """
+    if not _path:
+        return
+    p = str(run_dir)
+    now = time.time()
+    with _lock:
+        if _touched.get(p, 0) > now - _TOUCH_SECS:
+            return
+        _touched[p] = now
+    r = _relpath(p)
+    with _transaction() as c:
+        c.execute(
+            'INSERT OR IGNORE INTO run_dir (path, uid, size, last_access) VALUES (?, ?, 0, ?)',
+            (r, r.split(os.sep)[0], now),
+        )
+        c.execute('UPDATE run_dir SET last_access = ? WHERE path = ?', (now, r))
+
+
+def _relpath(run_dir):
+    """Key of run_dir in the index"""
+    return os.path.relpath(run_dir, str(simulation_db.user_dir_name()))
+
+
+def _remove(run_dir):
+    """Remove run_dir unless it became active"""
+    if simulation_db.read_status(run_dir) in _ACTIVE_STATES:
+        return False
+    t = run_dir.new(basename='.{}.rm{}'.format(run_dir.basename, os.getpid()))
+    try:
+        run_dir.rename(t)
+    except Exception as e:
+        if pkio.exception_is_not_found(e):
+            return False
+        raise
+    pkio.unchecked_remove(t)
+    pkdlog('{}: removed', run_dir)
+    return True
+
+
+def _scan(now):
+    """Find the run dirs of all users and update the index
+
+    A run dir which is not in the index was last accessed when it was
+    last modified. Only run dirs which were modified since their size
+    was recorded are walked.
+
+    Returns:
+        list: Dict rows (active, last_access, path, size, uid)
+    """
+    with _transaction(immediate=False) as c:
+        known = dict(
+            (x['path'], x)
+            for x in c.execute('SELECT path, last_access, mtime, size FROM run_dir').fetchall()
+        )
+    u = simulation_db.user_dir_name()
+    found = {}
+    changed = []
+    for p in pkio.sorted_glob(u.join('*', '*', '*', simulation_db.SIMULATION_DATA_FILE)):
+        for r in pkio.sorted_glob(p.dirpath().join('*')):
+            if not r.check(dir=True, link=False) or r.basename.startswith('.'):
+                continue
+            k = u.bestrelpath(r)
+            m = r.stat().mtime
+            x = known.get(k)
+            v = pkcollections.Dict(
+                active=simulation_db.read_status(r) in _ACTIVE_STATES,
+                last_access=x['last_access'] if x else m,
+                mtime=m,
+                path=k,
+                uid=k.split(os.sep)[0],
+            )
+            if x and x['mtime'] == m:
+                v.size = x['size']
+            else:
+                v.size = util.dir_size(r)
+                changed.append(v)
+            found[k] = v
+    with _transaction() as c:
+        c.executemany(
+            'DELETE FROM run_dir WHERE path = ?',
+            [(x,) for x in known if x not in found],
+        )
+        for v in changed:
+            c.execute(
+                'INSERT OR IGNORE INTO run_dir (path, uid, size, last_access) VALUES (?, ?, 0, ?)',
+                (v.path, v.uid, v.last_access),
+            )
+            c.execute(
+                'UPDATE run_dir SET size = ?, mtime = ? WHERE path = ?',
+                (v.size, v.mtime, v.path),
+            )
+    return [
+        pkcollections.Dict((k, v[k]) for k in ('active', 'last_access', 'path', 'size', 'uid'))
+        for v in found.values()
+    ]
+
+
+def _transaction(immediate=True):
+    assert _path, 'init() not called'
+    return sqlite_util.transaction(_path, _lock, immediate)
+
+
+cfg = pkconfig.init(
+    max_bytes=(0, int, 'Total size of run dirs of all users (0 is unlimited)'),
+    min_idle_secs=(3600, int, 'Run dirs accessed more recently are not removed'),
+    sweep_secs=(3600, int, 'How often `sirepo service retention` sweeps'),
+    user_max_bytes=(0, int, 'Total size of run dirs of each user (0 is unlimited)'),
+)
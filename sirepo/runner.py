@@ -21,10 +21,16 @@ from pykern import pkconfig
 from pykern import pkio
 from pykern import pkjinja
 from pykern.pkdebug import pkdc, pkdexc, pkdlog, pkdp
+from sirepo import job_history
+from sirepo import mpi
+from sirepo import result_cache
+from sirepo import runner_db
 from sirepo import simulation_db
+from sirepo import worker_pool
 from sirepo.template import template_common
 import aenum
 import errno
+import multiprocessing
 import os
 import pwd
 import signal
@@ -49,6 +55,8 @@ class State(aenum.UniqueEnum):
     KILL = 3
     RUN = 4
     STOP = 5
+    # waiting for the scheduler
+    QUEUE = 6
 
 # how long to wait before assuming thread that created
 # job is dead.
@@ -63,8 +71,39 @@ _KILL_TIMEOUT_SECS = 3
 # prefix all report names
 _DOCKER_CONTAINER_PREFIX = 'srjob-'
 
+# cpus and memory of a container unless cfg.docker_resources says otherwise
+_DOCKER_DEFAULT_RESOURCES = pkcollections.Dict(cpus='1', memory='1g')
+
+# volumes of pool containers in db_dir
+_DOCKER_POOL_DIR = 'docker-pool'
+
+# don't give a pool container to a job this close to its exit
+_DOCKER_POOL_EXPIRE_MARGIN_SECS = 60
+
+# pool containers exit if they don't get a job within this time
+_DOCKER_POOL_IDLE_SECS = 3600
+
+# how often a pool container checks for a job
+_DOCKER_POOL_POLL_SECS = 0.1
+
+# how old the shared docker ps may be
+_DOCKER_PS_SECS = 1
+
+# first word of docker ps status to state (default is exited)
+_DOCKER_PS_STATUS = {
+    'Created': 'created',
+    'Restarting': 'running',
+    'Up': 'running',
+}
+
 _MAX_OPEN_FILES = 1024
 
+#: How often `_scheduler` admits queued jobs
+_SCHEDULE_SECS = 1
+
+#: Thread which admits queued jobs of this process (see `_scheduler_start`)
+_scheduler = None
+
 @pkconfig.parse_none
 def cfg_job_class(value):
     """Return job queue class based on name
@@ -96,6 +135,7 @@ def cfg_job_class(value):
 
 def init(app, uwsgi):
     """Initialize module"""
+    runner_db.init(app.sirepo_db_dir)
     if cfg.job_class is None:
         from sirepo import server
         d = 'Background'
@@ -105,14 +145,25 @@ def init(app, uwsgi):
         cfg.job_class = cfg_job_class(d)
         assert not uwsgi or not issubclass(cfg.job_class, Background), \
             'uwsgi does not work if sirepo.runner.cfg.job_class=Background'
+    b = issubclass(cfg.job_class, Background)
+    # Celery and Docker jobs may run on other hosts so this host's cpus don't matter
+    if cfg.max_host_jobs is None:
+        cfg.max_host_jobs = multiprocessing.cpu_count() * 2 if b else 0
+    if cfg.max_user_jobs is None:
+        cfg.max_user_jobs = multiprocessing.cpu_count() if b else 0
+    if b:
+        worker_pool.init()
+    elif issubclass(cfg.job_class, Docker):
+        Docker._pool_init(app.sirepo_db_dir)
 
 
 def job_is_processing(jid):
+    _schedule()
     with _job_map_lock:
-        try:
-            job = _job_map[jid]
-        except KeyError:
-            return False
+        job = _job_map.get(jid)
+    if not job:
+        # may have been started by another server process
+        return bool(runner_db.read(jid)) or _follower_is_processing(jid)
     return job.is_processing()
 
 
@@ -126,8 +177,18 @@ def job_kill(jid):
         try:
             job = _job_map[jid]
         except KeyError:
-            return
-    job.kill()
+            job = None
+    if job:
+        job.kill()
+        return
+    r = runner_db.read(jid)
+    if r:
+        # owned by another server process, which reaps it
+        _JOB_CLASSES[r.job_class]._kill_remote(r)
+        runner_db.delete(jid, owner_only=False)
+        return
+    # the leader keeps running for its own simulation
+    runner_db.unfollow(jid)
 
 
 def job_race_condition_reap(jid):
@@ -144,8 +205,26 @@ def job_start(data):
 # to manage all this.
             raise Collision(jid)
         job = cfg.job_class(jid, data)
+        run_dir = simulation_db.simulation_run_dir(data)
+        r = runner_db.insert(
+            jid,
+            job.uid,
+            cfg.job_class.__name__,
+            job.resource_class,
+            job.state.name,
+            run_key=_run_key(data, run_dir, job.resource_class),
+            run_dir=str(run_dir),
+        )
+        if not r:
+            # processing in another server process
+            raise Collision(jid)
+        if r is not True:
+            _follow(jid, data, run_dir, r)
+            return
         _job_map[jid] = job
     job.start()
+    _schedule()
+    _scheduler_start()
 
 
 class Base(object):
@@ -154,6 +233,10 @@ class Base(object):
         self.data = data
         self.jid = jid
         self.lock = threading.RLock()
+        #POSIT: jid begins with uid (see simulation_db.job_id)
+        self.uid = jid.split('-')[0]
+        self.resource_class = _resource_class(data)
+        self.__recorded = False
         self.set_state(State.INIT)
 
     def is_processing(self):
@@ -164,6 +247,9 @@ class Base(object):
             elif self.state == State.INIT:
                 if time.time() < self.state_changed + _INIT_TOO_LONG_SECS:
                     return True
+            elif self.state == State.QUEUE:
+                # started by _schedule
+                return True
             else:
                 assert self.state in (State.START, State.KILL, State.STOP), \
                     '{}: invalid state for jid='.format(self.state, self.jid)
@@ -173,14 +259,21 @@ class Base(object):
 
     def kill(self):
         with self.lock:
+            # kill is reentered by _sigchld_handler while _kill waits
+            ran = self.state in (State.RUN, State.KILL) and not self.__recorded
+            if ran:
+                self.__recorded = True
             if self.state in (State.RUN, State.START, State.KILL):
                 # normal case (RUN) or thread died while trying to kill job
                 self._kill()
-            elif not self.state in (State.INIT, State.STOP):
+            elif not self.state in (State.INIT, State.QUEUE, State.STOP):
                 raise AssertionError(
                     '{}: invalid state for jid='.format(self.state, self.jid),
                 )
             self.set_state(State.STOP)
+        runner_db.delete(self.jid)
+        if ran:
+            self.__record()
         with _job_map_lock:
             try:
                 if self == _job_map[self.jid]:
@@ -189,9 +282,10 @@ class Base(object):
                 # stopped and no longer in map
                 return
 
-    def set_state(self, state):
+    def set_state(self, state, **kwargs):
         self.state = state
         self.state_changed = time.time()
+        runner_db.update(self.jid, state=state.name, **kwargs)
 
     def start(self):
         with self.lock:
@@ -210,13 +304,66 @@ class Base(object):
                     '{}: unexpected state for jid={}'.format(self.state, self.jid)
             self.set_state(State.START)
             self.cmd, self.run_dir = simulation_db.prepare_simulation(self.data)
-            self._start()
-            self.set_state(State.RUN)
+            # the run_dir says "pending" until _schedule starts the job
+            self.set_state(State.QUEUE)
+
+    def _admit(self):
+        """Start the job if the scheduler has a slot"""
+        with self.lock:
+            if self.state != State.QUEUE:
+                return
+            ok = runner_db.admit(self.jid, cfg.max_host_jobs, cfg.max_user_jobs)
+            if ok is None:
+                # removed by job_kill in another server process
+                self.kill()
+                return
+            if not ok:
+                return
+            self.set_state(State.START)
+            self.start_time = time.time()
+            try:
+                self._start()
+            except Exception:
+                # nothing to kill
+                self.set_state(State.STOP)
+                raise
+            self.set_state(State.RUN, **self._registry_ids())
+
+    def _cores(self):
+        """Cores the job may use"""
+        return mpi.cfg.cores if self.resource_class == 'parallel' else 1
+
+    def _rusage(self):
+        """Usage of a job which is not a child of this process"""
+        return job_history.read_rusage(self.run_dir)
+
+    def __record(self):
+        """Add the job's resource usage to `job_history`"""
+
+        def stopped():
+            s = simulation_db.read_status(self.run_dir)
+            if s in ('pending', 'running'):
+                # exited without a result
+                s = 'error'
+            return pkcollections.Dict(state=s, usage=self._rusage(), cores=self._cores())
+
+        job_history.record(self, stopped)
 
 
 class Background(Base):
     """Run as subprocess"""
 
+    @classmethod
+    def _kill_remote(cls, row):
+        if not (row.pid and runner_db.is_local(row)):
+            return
+        pkdlog('{}: kill SIGTERM pid={} owner_pid={}', row.jid, row.pid, row.owner_pid)
+        try:
+            _kill_group(row.pid, signal.SIGTERM)
+        except OSError as e:
+            if e.errno != errno.ESRCH:
+                raise
+
     def _is_processing(self):
         try:
             os.kill(self.pid, 0)
@@ -226,31 +373,41 @@ class Background(Base):
         return True
 
     def _kill(self):
+        t = getattr(self, 'timer', None)
+        if t:
+            t.cancel()
         if self.pid == 0:
             return
+        if self.in_pool:
+            self.__kill_pooled()
+            return
         pid = self.pid
         for sig in (signal.SIGTERM, signal.SIGKILL):
             try:
-                pkdlog('{}: kill {} pid={}', self.jid, sig, self.pid)
-                os.kill(self.pid, sig)
+                pkdlog('{}: kill {} pid={}', self.jid, sig, pid)
+                _kill_group(pid, sig)
                 for j in range(_KILL_TIMEOUT_SECS):
                     time.sleep(1)
-                    pid, status = os.waitpid(self.pid, os.WNOHANG)
-                    if pid != 0:
+                    if self.pid == 0:
+                        # reaped by _sigchld_handler()
+                        return
+                    p, status, ru = os.wait4(pid, os.WNOHANG)
+                    if p != 0:
                         break
                 else:
                     continue
-                if pid == self.pid:
+                if p == pid:
                     pkdlog('{}: waitpid: status={}', pid, status)
+                    self.rusage = job_history.rusage(ru, status)
                     self.pid = 0
                     break
                 else:
                     pkdlog(
                         'pid={} status={}: unexpected waitpid result; job={} pid={}',
-                        pid,
+                        p,
                         status,
                         self.jid,
-                        self.pid,
+                        pid,
                     )
             except OSError as e:
                 if not e.errno in (errno.ESRCH, errno.ECHILD):
@@ -268,7 +425,7 @@ class Background(Base):
                     # are doing popens, which does a waitpid.
                     # see radiasoft/sirepo#681
                     return
-                pid, status = os.waitpid(-1, os.WNOHANG)
+                pid, status, ru = os.wait4(-1, os.WNOHANG)
                 if pid == 0:
                     # a process that was reaped before sigchld called
                     return
@@ -276,16 +433,33 @@ class Background(Base):
                     # state of 'pid' is unknown since outside self.lock
                     if isinstance(self, Background) and getattr(self, 'pid', 0) == pid:
                         pkdlog('{}: waitpid pid={} status={}', self.jid, pid, status)
+                        self.rusage = job_history.rusage(ru, status)
                         break
                 else:
                     pkdlog('pid={} status={}: unexpected waitpid', pid, status)
                     return
+            if os.WIFSIGNALED(status) and os.WTERMSIG(status) == signal.SIGXCPU:
+                simulation_db.write_status(
+                    'error',
+                    self.run_dir,
+                    reason=simulation_db.STATUS_REASON_CPU_LIMIT,
+                )
             with self.lock:
                 self.pid = 0
                 self.kill()
         except OSError as e:
             if not e.errno in (errno.ESRCH, errno.ECHILD):
                 pkdlog('waitpid: OSError: {} errno={}', e.strerror, e.errno)
+        except Exception:
+            # signal handlers must not raise; runner_db removes dead jobs
+            pkdlog('sigchld: {}', pkdexc())
+
+    def _registry_ids(self):
+        return dict(pid=self.pid)
+
+    def _rusage(self):
+        # a worker_pool zygote writes the usage of its children
+        return getattr(self, 'rusage', None) or super(Background, self)._rusage()
 
     def _start(self):
         """Detach a process from the controlling terminal and run it in the
@@ -294,6 +468,15 @@ class Background(Base):
         We don't use pksubprocess. This method is not called from the MainThread
         so can't set signals.
         """
+        self.in_pool = False
+        r = _rlimits()
+        pid = worker_pool.spawn(self.cmd, self.run_dir, r)
+        if pid:
+            pkdlog('{}: started in worker_pool: pid={} cmd={}', self.jid, pid, self.cmd)
+            self.in_pool = True
+            self.pid = pid
+            self.__supervise()
+            return
         try:
             pid = os.fork()
         except OSError as e:
@@ -302,11 +485,23 @@ class Background(Base):
         if pid != 0:
             pkdlog('{}: started: pid={} cmd={}', self.jid, pid, self.cmd)
             self.pid = pid
+            try:
+                # also in the child, whichever runs first
+                os.setpgid(pid, pid)
+            except OSError:
+                # child has exec'd or exited
+                pass
+            self.__supervise()
             return
         try:
             os.chdir(str(self.run_dir))
-            #Don't os.setsid() so signals propagate properly
+            # Own process group so the whole job (e.g. mpiexec and its
+            # children) can be killed. Not os.setsid(), which would
+            # detach it from the terminal.
+            os.setpgid(0, 0)
             import resource
+            for k, v in r:
+                resource.setrlimit(getattr(resource, k), v)
             maxfd = resource.getrlimit(resource.RLIMIT_NOFILE)[1]
             if (maxfd == resource.RLIM_INFINITY):
                 maxfd = _MAX_OPEN_FILES
@@ -334,6 +529,45 @@ class Background(Base):
                 f.write('{}: error starting simulation: {}'.format(self.jid, e))
             raise
 
+    def __expire(self, secs):
+        """Kill the job, because it ran longer than secs"""
+        with self.lock:
+            if self.state != State.RUN or not self.pid:
+                return
+            pkdlog('{}: timed out after {}s pid={}', self.jid, secs, self.pid)
+            simulation_db.write_status(
+                'error',
+                self.run_dir,
+                reason='Timed out after {} seconds'.format(secs),
+            )
+        self.kill()
+
+    def __kill_pooled(self):
+        """Child of a worker_pool zygote, which reaps it, so poll"""
+        pid = self.pid
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            pkdlog('{}: kill {} pid={}', self.jid, sig, pid)
+            try:
+                _kill_group(pid, sig)
+            except OSError as e:
+                if e.errno != errno.ESRCH:
+                    raise
+                break
+            for j in range(_KILL_TIMEOUT_SECS):
+                time.sleep(1)
+                if not self._is_processing():
+                    return
+        self.pid = 0
+
+    def __supervise(self):
+        """Start a timer which kills the job after <resource_class>_secs"""
+        s = getattr(cfg, self.resource_class + '_secs')
+        if not s:
+            return
+        self.timer = threading.Timer(s, self.__expire, args=(s,))
+        self.timer.daemon = True
+        self.timer.start()
+
 
 class Celery(Base):
     """Run job in Celery (prod)"""
@@ -343,6 +577,14 @@ class Celery(Base):
         res = getattr(self, 'async_result', None)
         return res and not res.ready()
 
+    @classmethod
+    def _kill_remote(cls, row):
+        if not row.cid:
+            return
+        from sirepo import celery_tasks
+        pkdlog('{}: kill SIGTERM tid={} owner_pid={}', row.jid, row.cid, row.owner_pid)
+        celery_tasks.start_simulation.AsyncResult(row.cid).revoke(terminate=True, signal='SIGTERM')
+
     def _kill(self):
         from celery.exceptions import TimeoutError
         if not self._is_processing():
@@ -356,6 +598,15 @@ class Celery(Base):
             pkdlog('{}: kill SIGKILL tid={}', self.jid, tid)
             res.revoke(terminate=True, signal='SIGKILL')
 
+    def _registry_ids(self):
+        return dict(cid=self.async_result.task_id)
+
+    def _rusage(self):
+        """Returned by `celery_tasks.start_simulation`"""
+        res = getattr(self, 'async_result', None)
+        if res and res.ready() and res.successful() and isinstance(res.result, dict):
+            return pkcollections.Dict(res.result)
+        return pkcollections.Dict()
 
     def _start(self):
         """Detach a process from the controlling terminal and run it in the
@@ -384,11 +635,42 @@ class Collision(Exception):
 
 
 class Docker(Base):
-    """Run a code in docker"""
+    """Run a code in docker
+
+    The state of all containers is read with one ``docker ps`` every
+    `_DOCKER_PS_SECS` (see `__status`) instead of a ``docker inspect``
+    per job and status request.
+
+    Sequential jobs are started in containers which were started
+    before the job (see `_pool_fill`). The container waits for the job's
+    run script to appear in its volume (slot). The slot is renamed to
+    the job's run_dir so the job's output ends up where the server
+    expects it.
+    """
+
+    #: Containers waiting for a job (cid, slot, expires)
+    _pool = []
+
+    #: Directory of the volumes of the pool containers (see `_pool_init`)
+    _pool_dir = None
+
+    _pool_filling = False
+
+    _pool_lock = threading.Lock()
+
+    #: Status of containers (cid to docker ps status) at `_ps_time`
+    _ps = {}
+
+    _ps_lock = threading.Lock()
+
+    _ps_time = 0
+
+    def _cores(self):
+        return float(_docker_resources(self.resource_class, self.data).cpus)
 
     def _is_processing(self):
-        """Inspect container to see if still in running state"""
-        out = self.__docker(['inspect', '--format={{.State.Status}}', self.cid])
+        """Check container is still in running state"""
+        out = self.__status(self.cid, self.state_changed)
         if not out:
             self.cid = None
             return False
@@ -404,46 +686,60 @@ class Docker(Base):
             self.__docker(['stop', '--time={}'.format(_KILL_TIMEOUT_SECS), self.cid])
             self.cid = None
 
+    @classmethod
+    def _kill_remote(cls, row):
+        if row.cid:
+            pkdlog('{}: stop cid={} owner_pid={}', row.jid, row.cid, row.owner_pid)
+            cls.__docker(['stop', '--time={}'.format(_KILL_TIMEOUT_SECS), row.cid])
+
+    @classmethod
+    def _pool_fill(cls):
+        """Start containers in a thread until there are `cfg.docker_pool_size`"""
+        with cls._pool_lock:
+            if (
+                cls._pool_filling or not cls._pool_dir
+                or len(cls._pool) >= cfg.docker_pool_size
+            ):
+                return
+            cls._pool_filling = True
+        t = threading.Thread(target=cls.__pool_fill)
+        t.daemon = True
+        t.start()
+
+    @classmethod
+    def _pool_init(cls, db_dir):
+        """Start the pool if `cfg.docker_pool_size`
+
+        Args:
+            db_dir (py.path): slots must be on the same file system as run dirs
+        """
+        if not cfg.docker_pool_size:
+            return
+        cls._pool_dir = pkio.mkdir_parent(db_dir.join(_DOCKER_POOL_DIR))
+        # slots of containers which expired while their server was down
+        t = time.time() - _DOCKER_POOL_IDLE_SECS * 2
+        for s in pkio.sorted_glob(cls._pool_dir.join('*')):
+            if s.mtime() < t:
+                pkio.unchecked_remove(s)
+        cls._pool_fill()
+
+    def _registry_ids(self):
+        return dict(cid=self.cid)
+
     def _start(self):
         """Detach a process from the controlling terminal and run it in the
         background as a daemon.
         """
+        r = _docker_resources(self.resource_class, self.data)
+        if self.resource_class == 'sequential' and r == _docker_resources('sequential'):
+            p = self.__pool_take()
+            if p:
+                self.__start_in_pool(*p)
+                return
         #POSIT: jid is valid docker name (word chars and dash)
         self.cname = _DOCKER_CONTAINER_PREFIX + self.jid
-        ctx = pkcollections.Dict(
-            kill_secs=_KILL_TIMEOUT_SECS,
-            run_dir=self.run_dir,
-            run_log=self.run_dir.join(template_common.RUN_LOG),
-            run_secs=self.__run_secs(),
-            sh_cmd=self.__sh_cmd(),
-        )
-        script = str(self.run_dir.join(_DOCKER_CONTAINER_PREFIX + 'run.sh'))
-        with open(str(script), 'wb') as f:
-            f.write(pkjinja.render_resource('runner/docker.sh', ctx))
-        cmd = [
-            'run',
-#TODO(robnagler) configurable
-            '--cpus=1',
-            '--detach',
-            '--init',
-            '--log-driver=json-file',
-            # never should be large, just for output of the monitor
-            '--log-opt=max-size=1m',
-            '--memory=1g',
-            '--name=' + self.cname,
-            '--network=none',
-            '--rm',
-            '--ulimit=core=0',
-#TODO(robnagler) this doesn't do anything
-#            '--ulimit=cpu=1',
-            '--ulimit=nofile={}'.format(_MAX_OPEN_FILES),
-            '--user=' + pwd.getpwuid(os.getuid()).pw_name,
-        ] + self.__volumes() + [
-#TODO(robnagler) make this configurable per code (would be structured)
-            self.__image(),
-            'bash',
-            script,
-        ]
+        script = self.__write_script(self.run_dir)
+        cmd = self.__run_cmd(self.cname, r, self.run_dir, script)
         self.cid = self.__docker(cmd)
         pkdc(
             '{}: started cname={} cid={} dir={} len_jobs={} cmd={}',
@@ -455,7 +751,8 @@ class Docker(Base):
             ' '.join(cmd),
         )
 
-    def __docker(self, cmd):
+    @staticmethod
+    def __docker(cmd):
         cmd = ['docker'] + cmd
         try:
             pkdc('Running: {}', ' '.join(cmd))
@@ -468,29 +765,172 @@ class Docker(Base):
             pkdlog('{}: failed: exit={} output={}', cmd, e.returncode, e.output)
             return None
 
-    def __image(self):
+    @staticmethod
+    def __image():
         res = cfg.docker_image
         if ':' in res:
             return res
         return res + ':' + pkconfig.cfg.channel
 
+    @classmethod
+    def __pool_fill(cls):
+        try:
+            while True:
+                with cls._pool_lock:
+                    if len(cls._pool) >= cfg.docker_pool_size:
+                        return
+                s = pkio.mkdir_parent(cls._pool_dir.join(str(uuid.uuid4())))
+                f = s.join(_DOCKER_CONTAINER_PREFIX + 'pool.sh')
+                pkjinja.render_resource(
+                    'runner/docker_pool.sh',
+                    pkcollections.Dict(
+                        poll_secs=_DOCKER_POOL_POLL_SECS,
+                        run_script=s.join(_DOCKER_CONTAINER_PREFIX + 'run.sh'),
+                        wait_count=int(_DOCKER_POOL_IDLE_SECS / _DOCKER_POOL_POLL_SECS),
+                    ),
+                    output=f,
+                )
+                e = time.time() + _DOCKER_POOL_IDLE_SECS - _DOCKER_POOL_EXPIRE_MARGIN_SECS
+                c = cls.__docker(
+                    cls.__run_cmd(
+                        _DOCKER_CONTAINER_PREFIX + 'pool-' + s.basename,
+                        _docker_resources('sequential'),
+                        s,
+                        f,
+                    ),
+                )
+                if not c:
+                    pkio.unchecked_remove(s)
+                    # docker is broken, try again when a container is taken
+                    return
+                pkdc('pool container started: cid={} slot={}', c, s)
+                with cls._pool_lock:
+                    cls._pool.append((c, s, e))
+        except Exception:
+            pkdlog('pool fill failed: {}', pkdexc())
+        finally:
+            with cls._pool_lock:
+                cls._pool_filling = False
+
+    @classmethod
+    def __pool_take(cls):
+        """Remove a waiting container from the pool
+
+        Returns:
+            tuple: cid and slot or None
+        """
+        res = None
+        while True:
+            with cls._pool_lock:
+                if not cls._pool:
+                    break
+                c, s, e = cls._pool.pop(0)
+            if time.time() < e and cls.__status(c) == 'running':
+                res = (c, s)
+                break
+            pkdlog('pool container gone: cid={}', c)
+            pkio.unchecked_remove(s)
+        cls._pool_fill()
+        return res
+
+    @classmethod
+    def __run_cmd(cls, cname, resources, run_dir, script):
+        return [
+            'run',
+            '--cpus={}'.format(resources.cpus),
+            '--detach',
+            '--init',
+            '--log-driver=json-file',
+            # never should be large, just for output of the monitor
+            '--log-opt=max-size=1m',
+            '--memory={}'.format(resources.memory),
+            '--name=' + cname,
+            '--network=none',
+            '--rm',
+            '--ulimit=core=0',
+#TODO(robnagler) this doesn't do anything
+#            '--ulimit=cpu=1',
+            '--ulimit=nofile={}'.format(_MAX_OPEN_FILES),
+            '--user=' + pwd.getpwuid(os.getuid()).pw_name,
+        ] + cls.__volumes(run_dir) + [
+            cls.__image(),
+            'bash',
+            str(script),
+        ]
+
     def __run_secs(self):
-        if self.data['report'] == 'backgroundImport':
-            return cfg.import_secs
-        if simulation_db.is_parallel(self.data):
-            return cfg.parallel_secs
-        return cfg.sequential_secs
-
-    def __sh_cmd(self):
-        """Convert ``self.cmd`` into a bash cmd"""
+        return getattr(cfg, self.resource_class + '_secs')
+
+    def __sh_cmd(self, run_dir):
+        """Convert ``self.cmd`` into a bash cmd which runs in run_dir"""
         res = []
         for c in self.cmd:
+            if c == str(self.run_dir):
+                c = str(run_dir)
             assert not "'" in c, \
                 '{}: sh_cmd contains a single quote'.format(cmd)
             res.append("'{}'".format(c))
         return ' '.join(res)
 
-    def __volumes(self):
+    def __start_in_pool(self, cid, slot):
+        """Move the job into the volume of cid and start it"""
+        simulation_db.write_status(simulation_db.read_status(self.run_dir), slot)
+        d = []
+        for f in self.run_dir.listdir():
+            if slot.join(f.basename).check():
+                d.append(f)
+            else:
+                f.rename(slot.join(f.basename))
+        # status stays in run_dir until just before the rename
+        for f in d:
+            f.remove()
+        # replaces the empty run_dir
+        slot.rename(self.run_dir)
+        self.cname = _DOCKER_CONTAINER_PREFIX + 'pool-' + slot.basename
+        self.cid = cid
+        # the container sees the run_dir as the slot
+        self.__write_script(slot)
+        pkdc(
+            '{}: started in pool cname={} cid={} dir={} len_jobs={}',
+            self.jid,
+            self.cname,
+            self.cid,
+            self.run_dir,
+            len(_job_map),
+        )
+
+    @classmethod
+    def __status(cls, cid, since=0):
+        """Status of cid from ``docker ps`` shared by all jobs
+
+        Args:
+            cid (str): container id
+            since (float): ps must be newer than this [0]
+
+        Returns:
+            str: running, created, exited, etc. or None if no container
+        """
+        with cls._ps_lock:
+            n = time.time()
+            if cls._ps_time < max(since, n - _DOCKER_PS_SECS):
+                out = cls.__docker([
+                    'ps',
+                    '--all',
+                    '--filter=name=' + _DOCKER_CONTAINER_PREFIX,
+                    '--format={{.ID}} {{.Status}}',
+                    '--no-trunc',
+                ])
+                if out is None:
+                    return None
+                cls._ps = {}
+                for l in out.splitlines():
+                    i, s = l.split(' ', 1)
+                    cls._ps[i] = _DOCKER_PS_STATUS.get(s.split(' ')[0], 'exited')
+                cls._ps_time = n
+            return cls._ps.get(cid)
+
+    @staticmethod
+    def __volumes(run_dir):
         res = []
 
         def _res(src, tgt):
@@ -501,9 +941,39 @@ class Docker(Base):
                 v = pkio.py_path('~/src')
                 # pyenv and src shouldn't be writable, only rundir
                 _res(v, v + ':ro')
-        _res(self.run_dir, self.run_dir)
+        _res(run_dir, run_dir)
         return res
 
+    def __write_script(self, run_dir):
+        """Write the run script of the job as seen from the container
+
+        The script is renamed into place, because a pool container
+        starts it as soon as it exists.
+
+        Args:
+            run_dir (py.path): what the container mounts as run_dir
+        """
+        res = run_dir.join(_DOCKER_CONTAINER_PREFIX + 'run.sh')
+        t = self.run_dir.join(res.basename + '.tmp')
+        pkjinja.render_resource(
+            'runner/docker.sh',
+            pkcollections.Dict(
+                kill_secs=_KILL_TIMEOUT_SECS,
+                run_dir=run_dir,
+                run_log=run_dir.join(template_common.RUN_LOG),
+                run_secs=self.__run_secs(),
+                rusage_file=job_history.RUSAGE_FILE,
+                sh_cmd=self.__sh_cmd(run_dir),
+            ),
+            output=t,
+        )
+        t.rename(self.run_dir.join(res.basename))
+        return res
+
+
+#: runner_db.job_class to class
+_JOB_CLASSES = dict((c.__name__, c) for c in (Background, Celery, Docker))
+
 
 def _assert_celery():
     """Verify celery & rabbit are running"""
@@ -527,11 +997,212 @@ def _assert_celery():
     pkcli.command_error(err)
 
 
+def _cfg_docker_resources(value):
+    """Parse space separated ``<key>=<cpus>:<memory>``
+
+    key is a resource class (e.g. ``parallel``), ``<sim_type>.<resource_class>``,
+    or ``<sim_type>.<report>``.
+    """
+    res = {}
+    for x in (value or '').split():
+        try:
+            k, v = x.split('=')
+            c, m = v.split(':')
+            float(c)
+        except ValueError:
+            raise AssertionError('{}: invalid docker_resources, expect key=cpus:memory'.format(x))
+        res[k] = pkcollections.Dict(cpus=c, memory=m)
+    return res
+
+
+def _docker_resources(resource_class, data=None):
+    """cpus and memory of a container
+
+    Args:
+        resource_class (str): see `_resource_class`
+        data (dict): simulation request [None]
+
+    Returns:
+        Dict: most specific of ``<sim_type>.<report>``,
+            ``<sim_type>.<resource_class>``, and ``<resource_class>``
+            in `cfg.docker_resources`
+    """
+    k = [resource_class]
+    if data:
+        t = data['simulationType']
+        k = [t + '.' + data['report'], t + '.' + resource_class] + k
+    for x in k:
+        if x in cfg.docker_resources:
+            return cfg.docker_resources[x]
+    return _DOCKER_DEFAULT_RESOURCES
+
+
+def _follow(jid, data, run_dir, leader):
+    """Prepare run_dir of a job which shares the result of leader"""
+    pkio.unchecked_remove(run_dir)
+    pkio.mkdir_parent(run_dir)
+    simulation_db.write_json(run_dir.join(template_common.INPUT_BASE_NAME), data)
+    simulation_db.write_status('pending', run_dir)
+    pkdlog('{}: following {}', jid, leader.jid)
+
+
+def _follower_is_processing(jid):
+    """Mirror the status of the leader of jid and share its result
+
+    When the leader is done, its files are copied (linked) into the
+    follower's run_dir if it completed the same run. Otherwise, the
+    follower is started as a job of its own.
+
+    Returns:
+        bool: True if jid follows a job or was started
+    """
+    f = runner_db.follower(jid)
+    if not f:
+        return False
+    d = pkio.py_path(f.run_dir)
+    l = pkio.py_path(f.leader_run_dir)
+    if job_is_processing(f.leader_jid):
+        s = simulation_db.read_status(l)
+        if s == 'running' and simulation_db.read_status(d) != s:
+            simulation_db.write_status(s, d)
+        return True
+    if not runner_db.unfollow(jid):
+        # handled by another server process, which may have started it
+        return bool(runner_db.read(jid))
+    data = simulation_db.read_json(d.join(template_common.INPUT_BASE_NAME))
+    try:
+        if simulation_db.read_status(l) == 'completed' and f.run_key == result_cache.key(
+            simulation_db.read_json(l.join(template_common.INPUT_BASE_NAME)),
+            l,
+        ):
+            result_cache.copy_run(l, data, d)
+            pkdlog('{}: result of {}', jid, f.leader_jid)
+            return False
+    except Exception as e:
+        # leader's run_dir was replaced by another run
+        pkdlog('{}: copy from {} failed: {}', jid, f.leader_jid, e)
+    pkdlog('{}: {} did not complete, starting', jid, f.leader_jid)
+    try:
+        job_start(data)
+    except Collision:
+        pass
+    return True
+
+
+def _kill_group(pid, sig):
+    """Signal the process group of a Background job
+
+    A job started by a worker_pool may not have its own group yet.
+    """
+    # 0 would signal this process's group
+    assert pid > 0, '{}: invalid pid'.format(pid)
+    try:
+        os.killpg(pid, sig)
+    except OSError as e:
+        if e.errno != errno.ESRCH:
+            raise
+        os.kill(pid, sig)
+
+
+def _resource_class(data):
+    """What kind of resources the job needs
+
+    Args:
+        data (dict): simulation request
+
+    Returns:
+        str: import, parallel, or sequential
+    """
+    if data['report'] == 'backgroundImport':
+        return 'import'
+    if simulation_db.is_parallel(data):
+        return 'parallel'
+    return 'sequential'
+
+
+def _rlimits():
+    """Resource limits of each process of a Background job
+
+    Returns:
+        list: (resource name, (soft, hard))
+    """
+    res = []
+    if cfg.rlimit_as:
+        res.append(('RLIMIT_AS', (cfg.rlimit_as, cfg.rlimit_as)))
+    if cfg.rlimit_cpu:
+        # SIGXCPU at the soft limit, SIGKILL at the hard limit
+        res.append(('RLIMIT_CPU', (cfg.rlimit_cpu, cfg.rlimit_cpu + _KILL_TIMEOUT_SECS)))
+    return res
+
+
+def _run_key(data, run_dir, resource_class):
+    """Identifies identical jobs (see `runner_db.insert`)
+
+    Only sequential jobs are coalesced. A follower gets the result when
+    the leader is done so the frames of a parallel (animation) job
+    would not be visible while it runs.
+    """
+    if not cfg.coalesce or resource_class != 'sequential':
+        return None
+    return result_cache.key(data, run_dir)
+
+
+def _scheduler_loop():
+    """Admit queued jobs of this process until there are none"""
+    global _scheduler
+
+    while True:
+        time.sleep(_SCHEDULE_SECS)
+        try:
+            _schedule()
+        except Exception:
+            pkdlog('schedule failed: {}', pkdexc())
+        with _job_map_lock:
+            if not any(j.state == State.QUEUE for j in _job_map.values()):
+                _scheduler = None
+                return
+
+
+def _scheduler_start():
+    """Admit queued jobs even when this process gets no status requests
+
+    Started on demand, not in `init`, because uwsgi forks the
+    workers after the app is loaded.
+    """
+    global _scheduler
+
+    with _job_map_lock:
+        if _scheduler:
+            return
+        _scheduler = threading.Thread(target=_scheduler_loop)
+        _scheduler.daemon = True
+        _scheduler.start()
+
+
+def _schedule():
+    """Start queued jobs of this process which fit within the limits"""
+    with _job_map_lock:
+        jobs = [j for j in _job_map.values() if j.state == State.QUEUE]
+    for j in sorted(jobs, key=lambda j: j.state_changed):
+        try:
+            j._admit()
+        except Exception:
+            pkdlog('{}: start failed: {}', j.jid, pkdexc())
+            j.kill()
+
+
 cfg = pkconfig.init(
+    coalesce=(True, bool, 'sequential jobs identical to a running job share its result instead of running'),
     docker_image=('radiasoft/sirepo', str, 'docker image to run all jobs'),
+    docker_pool_size=(0, int, 'containers started before sequential jobs per server process'),
+    docker_resources=('', _cfg_docker_resources, 'cpus and memory per resource class, sim_type.resource_class, or sim_type.report, e.g. parallel=4:8g srw.parallel=8:16g'),
     import_secs=(10, int, 'maximum runtime of backgroundImport'),
     # default is set in init(), because of server.cfg.job_gueue
     job_class=(None, cfg_job_class, 'how to run jobs: Celery or Background'),
+    max_host_jobs=(None, int, 'maximum jobs running on a host (0 is unlimited) [Background: 2 * cpus, else 0]'),
+    max_user_jobs=(None, int, 'maximum jobs running per user on a host (0 is unlimited) [Background: cpus, else 0]'),
     parallel_secs=(3600, int, 'maximum runtime of serial job'),
+    rlimit_as=(0, int, 'maximum address space (bytes) of each process of a Background job (0 is unlimited)'),
+    rlimit_cpu=(0, int, 'maximum CPU seconds of each process of a Background job (0 is unlimited)'),
     sequential_secs=(300, int, 'maximum runtime of serial job'),
 )
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+u"""Job registry shared by all server processes
+
+Each job started by `sirepo.runner` has a row which records its state,
+the process (owner) which started it, and the pid or container id of
+the job. Any server process can tell if a job is running and the
+scheduler uses the rows to limit concurrent jobs per host and per user.
+
+A job which is started while an identical job (same run_key, see
+`sirepo.result_cache.key`) is alive is not run. It has a follower row
+instead, and `sirepo.runner` shares the leader's result with it.
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+from pykern import pkcollections
+from pykern.pkdebug import pkdc, pkdexc, pkdlog, pkdp
+from sirepo import sqlite_util
+import collections
+import errno
+import os
+import socket
+import threading
+import time
+
+#: Registry file in db_dir
+DB_FILE = 'runner.db'
+
+#: States (`sirepo.runner.State` names) which hold a slot
+ACTIVE_STATES = ('START', 'RUN', 'KILL')
+
+#: State waiting for a slot
+QUEUE_STATE = 'QUEUE'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS job (
+    jid TEXT PRIMARY KEY NOT NULL,
+    state TEXT NOT NULL,
+    uid TEXT NOT NULL,
+    host TEXT NOT NULL,
+    owner_pid INTEGER NOT NULL,
+    job_class TEXT NOT NULL,
+    resource_class TEXT NOT NULL,
+    pid INTEGER,
+    cid TEXT,
+    queue_time REAL NOT NULL,
+    start_time REAL,
+    state_changed REAL NOT NULL,
+    run_key TEXT,
+    run_dir TEXT
+)
+'''
+
+_FOLLOWER_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS follower (
+    jid TEXT PRIMARY KEY NOT NULL,
+    leader_jid TEXT NOT NULL,
+    run_key TEXT NOT NULL,
+    run_dir TEXT NOT NULL,
+    leader_run_dir TEXT NOT NULL
+)
+'''
+
+#: Columns which may be changed by `update`
+_UPDATE_COLUMNS = frozenset(('state', 'pid', 'cid', 'start_time'))
+
+#: Path to database (see `init`)
+_path = None
+
+#: This host
+_host = socket.gethostname()
+
+#: Serializes access within a process
+_lock = threading.RLock()
+
+
+def admit(jid, max_host, max_user):
+    """Move queued job to START if the limits allow
+
+    Queued jobs on this host are admitted oldest first so a job
+    which was queued earlier gets the next free slot, unless its
+    user is at `max_user`.
+
+    Args:
+        jid (str): queued job
+        max_host (int): maximum active jobs on this host (0 is unlimited)
+        max_user (int): maximum active jobs per user on this host (0 is unlimited)
+
+    Returns:
+        bool: True if the job may start, False if it must wait, and
+            None if it is no longer queued
+    """
+    with _transaction() as c:
+        _purge(c)
+        r = c.execute('SELECT state FROM job WHERE jid = ?', (jid,)).fetchone()
+        if not r or r['state'] != QUEUE_STATE:
+            return None
+        host_count = 0
+        user_count = collections.Counter()
+        for r in c.execute(
+            'SELECT uid FROM job WHERE host = ? AND state IN ({})'.format(
+                ','.join('?' * len(ACTIVE_STATES)),
+            ),
+            (_host,) + ACTIVE_STATES,
+        ):
+            host_count += 1
+            user_count[r['uid']] += 1
+        for r in c.execute(
+            'SELECT jid, uid FROM job WHERE host = ? AND state = ? ORDER BY queue_time, rowid',
+            (_host, QUEUE_STATE),
+        ).fetchall():
+            ok = (not max_host or host_count < max_host) \
+                and (not max_user or user_count[r['uid']] < max_user)
+            if r['jid'] == jid:
+                if ok:
+                    _update(c, jid, dict(state='START', start_time=time.time()))
+                return ok
+            if ok:
+                # older job gets the slot
+                host_count += 1
+                user_count[r['uid']] += 1
+    return False
+
+
+def delete(jid, owner_only=True):
+    """Remove job
+
+    Args:
+        jid (str): job id
+        owner_only (bool): only if owned by this process [True]
+    """
+    with _transaction() as c:
+        if owner_only:
+            c.execute(
+                'DELETE FROM job WHERE jid = ? AND host = ? AND owner_pid = ?',
+                (jid, _host, os.getpid()),
+            )
+        else:
+            c.execute('DELETE FROM job WHERE jid = ?', (jid,))
+
+
+def follower(jid):
+    """Lookup the job jid follows
+
+    Args:
+        jid (str): job id
+
+    Returns:
+        Dict: leader_jid, run_key, run_dir, and leader_run_dir or None
+    """
+    with _transaction(immediate=False) as c:
+        r = c.execute('SELECT * FROM follower WHERE jid = ?', (jid,)).fetchone()
+        return r and pkcollections.Dict(zip(r.keys(), r))
+
+
+def init(db_dir):
+    """Create the database if necessary
+
+    Args:
+        db_dir (py.path): where the database lives
+    """
+    global _path
+    _path = str(db_dir.join(DB_FILE))
+    with _transaction() as c:
+        c.execute(_SCHEMA)
+        c.execute(_FOLLOWER_SCHEMA)
+
+
+def insert(jid, uid, job_class, resource_class, state, run_key=None, run_dir=None):
+    """Register a new job owned by this process
+
+    A row for a job which is not alive (see `read`) is replaced.
+
+    If another live job has run_key, jid follows it (see `follower`)
+    instead of being registered. The check and the insert are one
+    transaction so only one of many identical jobs runs.
+
+    Args:
+        jid (str): job id
+        uid (str): owner of the simulation
+        job_class (str): name of `sirepo.runner` class
+        resource_class (str): parallel, sequential, import
+        state (str): initial state
+        run_key (str): identifies identical jobs [None]
+        run_dir (str): where the job runs (required with run_key) [None]
+
+    Returns:
+        object: False if another process holds a live job for jid,
+            the leader's row (Dict) if jid follows it, else True
+    """
+    with _transaction() as c:
+        r = c.execute('SELECT * FROM job WHERE jid = ?', (jid,)).fetchone()
+        if r and _is_alive(r):
+            return False
+        c.execute('DELETE FROM follower WHERE jid = ?', (jid,))
+        if run_key:
+            for r in c.execute(
+                'SELECT * FROM job WHERE run_key = ? AND jid != ? ORDER BY queue_time',
+                (run_key, jid),
+            ).fetchall():
+                if _is_alive(r):
+                    c.execute(
+                        '''INSERT INTO follower
+                        (jid, leader_jid, run_key, run_dir, leader_run_dir)
+                        VALUES (?, ?, ?, ?, ?)''',
+                        (jid, r['jid'], run_key, run_dir, r['run_dir']),
+                    )
+                    return pkcollections.Dict(zip(r.keys(), r))
+        now = time.time()
+        c.execute(
+            '''INSERT OR REPLACE INTO job
+            (jid, state, uid, host, owner_pid, job_class, resource_class, queue_time, state_changed, run_key, run_dir)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (jid, state, uid, _host, os.getpid(), job_class, resource_class, now, now, run_key, run_dir),
+        )
+    return True
+
+
+def is_local(row):
+    """Is the job running on this host?
+
+    Args:
+        row (Dict): from `read`
+
+    Returns:
+        bool: True if the job's processes are on this host
+    """
+    return row.host == _host
+
+
+def read(jid):
+    """Lookup job, removing it if its owner or process died
+
+    Args:
+        jid (str): job id
+
+    Returns:
+        Dict: columns or None if no live job
+    """
+    with _transaction(immediate=False) as c:
+        r = c.execute('SELECT * FROM job WHERE jid = ?', (jid,)).fetchone()
+    if r and not _is_alive(r):
+        # rare so the write lock is only taken here
+        with _transaction() as c:
+            r = c.execute('SELECT * FROM job WHERE jid = ?', (jid,)).fetchone()
+            if r and not _is_alive(r):
+                c.execute('DELETE FROM job WHERE jid = ?', (jid,))
+                r = None
+    return r and pkcollections.Dict(zip(r.keys(), r))
+
+
+def unfollow(jid):
+    """Remove follower row of jid
+
+    Args:
+        jid (str): job id
+
+    Returns:
+        bool: True if jid was following a job
+    """
+    with _transaction() as c:
+        return c.execute('DELETE FROM follower WHERE jid = ?', (jid,)).rowcount > 0
+
+
+def update(jid, **kwargs):
+    """Change columns of a job owned by this process
+
+    Args:
+        jid (str): job id
+        kwargs (dict): state, pid, cid, or start_time
+    """
+    with _transaction() as c:
+        _update(c, jid, kwargs)
+
+
+def _is_alive(row):
+    """Owner and job process exist (only verifiable on this host)"""
+    if row['host'] != _host:
+        return True
+    if not _pid_exists(row['owner_pid']):
+        return False
+    if row['state'] == 'RUN' and row['pid']:
+        return _pid_exists(row['pid'])
+    return True
+
+
+def _pid_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        # EPERM means some other user's process has the pid
+        return e.errno == errno.EPERM
+    return True
+
+
+def _purge(c):
+    """Delete rows for this host whose owner or process died"""
+    for r in c.execute('SELECT * FROM job WHERE host = ?', (_host,)).fetchall():
+        if not _is_alive(r):
+            pkdlog('{}: removing dead job state={} owner_pid={}', r['jid'], r['state'], r['owner_pid'])
+            c.execute('DELETE FROM job WHERE jid = ?', (r['jid'],))
+
+
+def _transaction(immediate=True):
+    assert _path, 'init() not called'
+    return sqlite_util.transaction(_path, _lock, immediate)
+
+
+def _update(c, jid, values):
+    assert set(values) <= _UPDATE_COLUMNS, \
+        '{}: invalid columns'.format(values.keys())
+    if 'state' in values:
+        values['state_changed'] = time.time()
+    k = sorted(values.keys())
+    c.execute(
+        'UPDATE job SET {} WHERE jid = ? AND host = ? AND owner_pid = ?'.format(
+            ', '.join(x + ' = ?' for x in k),
+        ),
+        [values[x] for x in k] + [jid, _host, os.getpid()],
+    )
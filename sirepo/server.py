@@ -9,23 +9,34 @@ from pykern import pkcollections
 from pykern import pkconfig
 from pykern import pkio
 from pykern.pkdebug import pkdc, pkdexc, pkdlog, pkdp
+from sirepo import binary_json
 from sirepo import feature_config
+from sirepo import job_history
+from sirepo import result_cache
+from sirepo import retention
 from sirepo import runner
 from sirepo import simulation_db
 from sirepo import util
 from sirepo import uri_router
 from sirepo.template import template_common
 import beaker.middleware
+import collections
+import copy
 import datetime
 import flask
 import flask.sessions
 import glob
+import gzip
+import hashlib
+import hmac
+import io
 import os
 import os.path
 import py.path
 import re
 import sirepo.template
 import sys
+import threading
 import time
 import werkzeug
 import werkzeug.exceptions
@@ -55,6 +66,15 @@ _PY_PATH_LOCAL_CLASS = type(pkio.py_path())
 #: What is_running?
 _RUN_STATES = ('pending', 'running')
 
+#: Max run_dirs in _run_status_cache
+_RUN_STATUS_CACHE_MAX = 1000
+
+#: How often a held runStatus checks for changes not seen by `simulation_db.run_dir_wait`
+_RUN_STATUS_CHECK_SECS = 0.5
+
+#: Minimum time a runStatus is held, which limits the request rate when the status changes constantly
+_RUN_STATUS_MIN_SECS = 0.5
+
 #: Identifies the user in the Beaker session
 _SESSION_KEY_USER = 'uid'
 
@@ -70,6 +90,18 @@ SR_UNIT_TEST_IN_REQUEST = 'test_in_request'
 #: WSGIApp instance (see `init_by_server`)
 _wsgi_app = None
 
+#: run_dir => (key, response) of the last _simulation_run_status, oldest first
+_run_status_cache = collections.OrderedDict()
+
+#: Number of runStatus requests being held by `_run_status_wait`
+_run_status_held = 0
+
+#: Protects _run_status_cache and _run_status_held
+_run_status_lock = threading.Lock()
+
+#: sim_type => serialized schema (see _schema_response)
+_schema_response_cache = {}
+
 #: Default file to serve on errors
 DEFAULT_ERROR_FILE = 'server-error.html'
 
@@ -135,7 +167,7 @@ def api_copySimulation():
     data = simulation_db.read_simulation_json(sim_type, sid=req['simulationId'])
     if not name:
         base_name = data['models']['simulation']['name']
-        names = simulation_db.iterate_simulation_datafiles(sim_type, _simulation_name)
+        names = simulation_db.iterate_simulation_catalog(sim_type, _simulation_name)
         count = 0
         while True:
             count += 1
@@ -251,6 +283,25 @@ def api_favicon():
 app_favicon = api_favicon
 
 
+def api_jobHistory():
+    """Resource usage percentiles per report (see `sirepo.job_history`)
+
+    The request has adminSecret (`job_history.cfg.admin_secret`) and
+    optionally days and simulationType to limit the jobs summarized.
+
+    Returns:
+        Response: reports (rows of `job_history.summarize`)
+    """
+    req = _json_input()
+    s = job_history.cfg.admin_secret
+    if not s or not hmac.compare_digest(str(req.get('adminSecret', '')), str(s)):
+        util.raise_not_found('jobHistory: invalid adminSecret')
+    return _json_response_ok(dict(
+        reports=job_history.summarize(days=req.get('days'), sim_type=req.get('simulationType')),
+    ))
+app_job_history = api_jobHistory
+
+
 def api_listFiles(simulation_type, simulation_id, file_type):
     file_type = werkzeug.secure_filename(file_type)
     res = []
@@ -283,8 +334,9 @@ def api_findByName(simulation_type, application_mode, simulation_name):
     if cfg.oauth_login:
         from sirepo import oauth
         oauth.set_default_state(logged_out_as_anonymous=True)
+    simulation_db.verify_app_directory(simulation_type)
     # use the existing named simulation, or copy it from the examples
-    rows = simulation_db.iterate_simulation_datafiles(simulation_type, simulation_db.process_simulation_list, {
+    rows = simulation_db.iterate_simulation_catalog(simulation_type, simulation_db.process_simulation_list, {
         'simulation.name': simulation_name,
         'simulation.isExample': True,
     })
@@ -292,7 +344,7 @@ def api_findByName(simulation_type, application_mode, simulation_name):
         for s in simulation_db.examples(simulation_type):
             if s['models']['simulation']['name'] == simulation_name:
                 simulation_db.save_new_example(s)
-                rows = simulation_db.iterate_simulation_datafiles(simulation_type, simulation_db.process_simulation_list, {
+                rows = simulation_db.iterate_simulation_catalog(simulation_type, simulation_db.process_simulation_list, {
                     'simulation.name': simulation_name,
                 })
                 break
@@ -500,6 +552,7 @@ def api_runCancel():
         # indicate the cancel instead of the termination error that
         # will happen as a result of the kill.
         simulation_db.write_result({'state': 'canceled'}, run_dir=run_dir)
+        _run_status_cache_remove(run_dir)
         runner.job_kill(jid)
         # TODO(robnagler) should really be inside the template (t.cancel_simulation()?)
         # the last frame file may not be finished, remove it
@@ -519,31 +572,35 @@ def api_runSimulation():
             and (res['state'] != 'completed' or data.get('forceRun', False))
         ) or res.get('parametersChanged', True)
     ):
-        try:
-            _start_simulation(data)
-        except runner.Collision:
-            pkdlog('{}: runner.Collision, ignoring start', simulation_db.job_id(data))
+        if not _result_cache_fetch(data, res):
+            try:
+                _start_simulation(data)
+            except runner.Collision:
+                pkdlog('{}: runner.Collision, ignoring start', simulation_db.job_id(data))
         res = _simulation_run_status(data)
-    return _json_response(res)
+    return _plot_response(res)
 app_run_simulation = api_runSimulation
 
 
 def api_runStatus():
     data = _parse_data_input()
-    return _json_response(_simulation_run_status(data))
+    _run_status_wait(data)
+    return _plot_response(_simulation_run_status(data))
 app_run_status = api_runStatus
 
 
 def api_saveSimulationData():
     data = _parse_data_input(validate=True)
-    res = _validate_serial(data)
-    if res:
-        return res
     simulation_type = data['simulationType']
-    template = sirepo.template.import_module(simulation_type)
-    if hasattr(template, 'prepare_for_save'):
-        data = template.prepare_for_save(data)
-    data = simulation_db.save_simulation_json(data)
+    # another save must not happen between the serial check and the save
+    with simulation_db.simulation_lock(simulation_type, simulation_db.parse_sid(data)):
+        res = _validate_serial(data)
+        if res:
+            return res
+        template = sirepo.template.import_module(simulation_type)
+        if hasattr(template, 'prepare_for_save'):
+            data = template.prepare_for_save(data)
+        data = simulation_db.save_simulation_json(data)
     return app_simulation_data(
         data['simulationType'],
         data['models']['simulation']['simulationId'],
@@ -552,6 +609,44 @@ def api_saveSimulationData():
 app_save_simulation_data = api_saveSimulationData
 
 
+def api_simulationBatch():
+    """Status of reports and frames of one simulation in one request
+
+    The request has simulationType, simulationId, models (if any
+    status items need them), and items. A status item has report and
+    optionally reportParametersHash (like nextRequest). A frame item
+    has frameId (see `api_simulationFrame`). The response has items,
+    which are the responses of runStatus or simulationFrame for each
+    item, in order. An item which fails does not fail the others.
+
+    Returns:
+        Response: items
+    """
+    data = _parse_data_input()
+    items = data.pop('items', None)
+    if not isinstance(items, list):
+        return _json_response({'state': 'error', 'error': 'items missing'})
+    # each run_dir's in.json is read once for all the items
+    inputs = {}
+    res = []
+    for i in items:
+        if 'frameId' in i:
+            try:
+                f = _parse_frame_id(i['frameId'])
+                for k in 'simulationType', 'simulationId':
+                    assert f[k] == data[k], \
+                        '{}: frame is not for {}={}'.format(i['frameId'], k, data[k])
+                res.append(_simulation_frame(f, inputs)[0])
+            except Exception:
+                res.append(_simulation_error(pkdexc(), 'frameId', i['frameId']))
+            continue
+        d = copy.copy(data)
+        d.update(i)
+        res.append(_simulation_run_status(d, inputs=inputs))
+    return _plot_response({'items': res})
+app_simulation_batch = api_simulationBatch
+
+
 def api_simulationData(simulation_type, simulation_id, pretty, section=None):
     #TODO(robnagler) need real type transforms for inputs
     pretty = bool(int(pretty))
@@ -580,15 +675,8 @@ app_simulation_data = api_simulationData
 
 
 def api_simulationFrame(frame_id):
-    #TODO(robnagler) startTime is reportParametersHash; need version on URL and/or param names in URL
-    keys = ['simulationType', 'simulationId', 'modelName', 'animationArgs', 'frameIndex', 'startTime']
-    data = dict(zip(keys, frame_id.split('*')))
-    template = sirepo.template.import_module(data)
-    data['report'] = template.get_animation_name(data)
-    run_dir = simulation_db.simulation_run_dir(data)
-    model_data = simulation_db.read_json(run_dir.join(template_common.INPUT_BASE_NAME))
-    frame = template.get_simulation_frame(run_dir, data, model_data)
-    response = _json_response(frame)
+    frame, template = _simulation_frame(_parse_frame_id(frame_id))
+    response = _plot_response(frame)
     if 'error' not in frame and template.WANT_BROWSER_FRAME_CACHE:
         now = datetime.datetime.utcnow()
         expires = now + datetime.timedelta(365)
@@ -608,7 +696,7 @@ def api_listSimulations():
     simulation_db.verify_app_directory(sim_type)
     return _json_response(
         sorted(
-            simulation_db.iterate_simulation_datafiles(sim_type, simulation_db.process_simulation_list, search),
+            simulation_db.iterate_simulation_catalog(sim_type, simulation_db.process_simulation_list, search),
             key=lambda row: row['name'],
         )
     )
@@ -616,8 +704,8 @@ app_simulation_list = api_listSimulations
 
 
 def api_simulationSchema():
-    sim_type = sirepo.template.assert_sim_type(flask.request.form['simulationType'])
-    return _json_response(simulation_db.get_schema(sim_type))
+    sim_type = sirepo.template.assert_sim_type(flask.request.values['simulationType'])
+    return _schema_response(sim_type)
 app_simulation_schema = api_simulationSchema
 
 
@@ -637,9 +725,13 @@ def api_updateFolder():
     data = _parse_data_input()
     old_name = data['oldName']
     new_name = data['newName']
-    for row in simulation_db.iterate_simulation_datafiles(data['simulationType'], _simulation_data):
+    for row in simulation_db.iterate_simulation_catalog(data['simulationType'], _simulation_data):
         folder = row['models']['simulation']['folder']
         if folder.startswith(old_name):
+            row = simulation_db.read_simulation_json(
+                data['simulationType'],
+                sid=row['models']['simulation']['simulationId'],
+            )
             row['models']['simulation']['folder'] = re.sub(re.escape(old_name), new_name, folder, 1)
             simulation_db.save_simulation_json(row)
     return _json_response_ok()
@@ -661,6 +753,8 @@ def api_uploadFile(simulation_type, simulation_id, file_type):
                 err = 'File is in use in other simulations. Please confirm you would like to replace the file for all simulations.'
     if not err:
         pkio.mkdir_parent_only(p)
+        # replace, because p may be linked to the shared example store
+        pkio.unchecked_remove(p)
         f.save(str(p))
         template = sirepo.template.import_module(simulation_type)
         if hasattr(template, 'validate_file'):
@@ -718,6 +812,9 @@ def init(db_dir=None, uwsgi=None):
     for err, file in simulation_db.SCHEMA_COMMON['customErrors'].items():
         app.register_error_handler(int(err), _handle_error)
     runner.init(app, uwsgi)
+    result_cache.init(app.sirepo_db_dir)
+    job_history.init(app.sirepo_db_dir)
+    retention.init(app.sirepo_db_dir)
     return app
 
 
@@ -971,6 +1068,38 @@ def _parse_data_input(validate=False):
     return simulation_db.fixup_old_data(data)[0] if validate else data
 
 
+def _parse_frame_id(frame_id):
+    """Split frame_id into a request
+
+    Args:
+        frame_id (str): simulationType*simulationId*modelName*animationArgs*frameIndex*startTime
+
+    Returns:
+        dict: request for `_simulation_frame`
+    """
+    #TODO(robnagler) startTime is reportParametersHash; need version on URL and/or param names in URL
+    keys = ['simulationType', 'simulationId', 'modelName', 'animationArgs', 'frameIndex', 'startTime']
+    return dict(zip(keys, frame_id.split('*')))
+
+
+def _plot_response(value):
+    """JSON or `sirepo.binary_json` response, if the client prefers it
+
+    Args:
+        value (dict): what to format
+    Returns:
+        Response: flask response
+    """
+    a = flask.request.accept_mimetypes
+    if a.best_match(('application/json', binary_json.MIME_TYPE)) != binary_json.MIME_TYPE:
+        res = _json_response(value)
+    else:
+        res = app.response_class(binary_json.encode(value), mimetype=binary_json.MIME_TYPE)
+    # frames may be cached by the browser
+    res.vary.add('Accept')
+    return res
+
+
 def _render_root_page(page, values):
     values.source_cache_key = _source_cache_key()
     values.app_version = simulation_db.app_version()
@@ -989,6 +1118,45 @@ def _save_new_and_reply(*args):
     )
 
 
+def _schema_response(sim_type):
+    """Schema which is serialized and compressed once per process
+
+    The ETag is the content hash and sirepo version so browsers
+    can revalidate GET requests and receive 304 Not Modified.
+
+    Args:
+        sim_type (str): simulation type
+    Returns:
+        Response: flask response
+    """
+    s = _schema_response_cache.get(sim_type)
+    if not s:
+        j = simulation_db.generate_json(simulation_db.get_schema(sim_type))
+        if isinstance(j, unicode):
+            j = j.encode('utf-8')
+        b = io.BytesIO()
+        # mtime=0 so the bytes only depend on the content
+        with gzip.GzipFile(fileobj=b, mode='wb', mtime=0) as f:
+            f.write(j)
+        s = pkcollections.Dict(
+            etag='{}-{}'.format(simulation_db.app_version(), hashlib.md5(j).hexdigest()),
+            gzip=b.getvalue(),
+            json=j,
+        )
+        _schema_response_cache[sim_type] = s
+    is_gzip = 'gzip' in flask.request.accept_encodings
+    res = app.response_class(
+        s.gzip if is_gzip else s.json,
+        mimetype=app.config.get('JSONIFY_MIMETYPE', 'application/json'),
+    )
+    if is_gzip:
+        res.headers['Content-Encoding'] = 'gzip'
+    res.vary.add('Accept-Encoding')
+    # each encoding is a different representation
+    res.set_etag(s.etag + ('-gzip' if is_gzip else ''))
+    return res.make_conditional(flask.request)
+
+
 def _simulation_error(err, *args, **kwargs):
     """Something unexpected went wrong.
 
@@ -1013,7 +1181,7 @@ def _simulation_error(err, *args, **kwargs):
 
 
 def _simulation_data(res, path, data):
-    """Iterator function to return entire simulation data
+    """Iterator function to return entire simulation data (or catalog entry)
     """
     res.append(data)
 
@@ -1024,99 +1192,304 @@ def _simulation_name(res, path, data):
     res.append(data['models']['simulation']['name'])
 
 
-def _simulation_run_status(data, quiet=False):
+def _result_cache_fetch(data, status):
+    """Populate the run_dir from `sirepo.result_cache`
+
+    A completed run which is requested again (forceRun) with the same
+    parameters is run again, e.g. when its output is invalid.
+
+    Args:
+        data (dict): request
+        status (dict): from `_simulation_run_status`
+
+    Returns:
+        bool: True if the run is complete
+    """
+    if status['state'] in _RUN_STATES \
+        or status['state'] == 'completed' and not status.get('parametersChanged', True):
+        return False
+    try:
+        run_dir = simulation_db.simulation_run_dir(data)
+        if not result_cache.fetch(data, run_dir):
+            return False
+    except Exception:
+        pkdlog('{}: result_cache.fetch failed: {}', simulation_db.job_id(data), pkdexc())
+        return False
+    _run_status_cache_remove(run_dir)
+    return True
+
+
+def _run_status_cache_remove(run_dir):
+    with _run_status_lock:
+        _run_status_cache.pop(str(run_dir), None)
+
+
+def _run_status_digest(key):
+    return hashlib.md5(repr(key).encode()).hexdigest()
+
+
+def _run_status_key(data, signature):
+    """What the status of data depends on
+
+    Args:
+        data (dict): request
+        signature (str): from `_run_status_signature`
+
+    Returns:
+        tuple: parameters hash, is processing, and signature
+    """
+    return (
+        template_common.report_parameters_hash(data),
+        runner.job_is_processing(simulation_db.job_id(data)),
+        signature,
+    )
+
+
+def _run_status_signature(data, run_dir, template):
+    """`simulation_db.run_dir_signature` including progress
+
+    The status of a parallel report also depends on its progress,
+    which `background_percent_complete` reads from files which the
+    template lists with ``background_progress_files(report, run_dir)``,
+    e.g. a log, or the frames directory and its last frame. Without
+    the hook, the progress is unknown so the status is not cached.
+
+    Args:
+        data (dict): request
+        run_dir (py.path): data's run_dir
+        template (module): data's template
+
+    Returns:
+        str: signature or None if not cacheable
+    """
+    if not simulation_db.is_parallel(data):
+        return simulation_db.run_dir_signature(run_dir)
+    if hasattr(template, 'background_progress_files'):
+        return simulation_db.run_dir_signature(
+            run_dir,
+            template.background_progress_files(data['report'], run_dir),
+        )
+    return None
+
+
+def _run_status_wait(data):
+    """Hold a runStatus request until its status changes (long poll)
+
+    The client sends back runStatusKey from the previous response's
+    nextRequest. The request is held until the key changes or
+    cfg.run_status_wait_secs. While held, only the signature, which
+    covers progress, is recomputed. It is not held when the key is
+    missing, the wait is disabled, or cfg.run_status_wait_max requests
+    (each holding a server thread) are already held.
+
+    Args:
+        data (dict): request
+    """
+    global _run_status_held
+
+    k = data.get('runStatusKey')
+    if not k or not cfg.run_status_wait_secs:
+        return
+    with _run_status_lock:
+        if _run_status_held >= cfg.run_status_wait_max:
+            return
+        _run_status_held += 1
+    try:
+        end = time.time() + cfg.run_status_wait_secs
+        time.sleep(_RUN_STATUS_MIN_SECS)
+        run_dir = simulation_db.simulation_run_dir(data)
+        template = sirepo.template.import_module(data)
+        s = _run_status_signature(data, run_dir, template)
+        if s is None or _run_status_digest(_run_status_key(data, s)) != k:
+            return
+        while True:
+            t = end - time.time()
+            if t <= 0:
+                return
+            simulation_db.run_dir_wait(run_dir, min(t, _RUN_STATUS_CHECK_SECS))
+            # the key changes if the signature does
+            if _run_status_signature(data, run_dir, template) != s:
+                return
+    except Exception:
+        # reported by _simulation_run_status
+        pkdc('{}: error: {}', data.get('report'), pkdexc())
+    finally:
+        with _run_status_lock:
+            _run_status_held -= 1
+
+
+def _simulation_frame(data, inputs=None):
+    """Compute the frame identified by data
+
+    Args:
+        data (dict): from `_parse_frame_id`
+        inputs (dict): see `simulation_db.read_run_input` [None]
+
+    Returns:
+        tuple: (frame, template module)
+    """
+    template = sirepo.template.import_module(data)
+    data['report'] = template.get_animation_name(data)
+    run_dir = simulation_db.simulation_run_dir(data)
+    retention.touch(run_dir)
+    model_data = simulation_db.read_run_input(run_dir, inputs)
+    return template.get_simulation_frame(run_dir, data, model_data), template
+
+
+def _simulation_run_status(data, quiet=False, inputs=None):
     """Look for simulation status and output
 
+    Polls are frequent so the response is cached per run_dir. It is
+    recomputed only when the request's parameters, whether the job
+    is processing, or `simulation_db.run_dir_signature`, which covers
+    the progress files of parallel reports, changes (see
+    `_run_status_signature`).
+
     Args:
         data (dict): request
         quiet (bool): don't write errors to log
+        inputs (dict): see `simulation_db.read_run_input` [None]
 
     Returns:
         dict: status response
     """
     try:
-        #TODO(robnagler): Lock
-        rep = simulation_db.report_info(data)
-        is_processing = runner.job_is_processing(rep.job_id)
-        is_running = rep.job_status in _RUN_STATES
-        res = {'state': rep.job_status}
-        pkdc(
-            '{}: is_processing={} is_running={} state={} cached_data={}',
-            rep.job_id,
-            is_processing,
+        run_dir = simulation_db.simulation_run_dir(data)
+        retention.touch(run_dir)
+        k = str(run_dir)
+        t = sirepo.template.import_module(data)
+        # before computing so a concurrent update invalidates the result
+        key = _run_status_key(data, _run_status_signature(data, run_dir, t))
+        with _run_status_lock:
+            c = _run_status_cache.pop(k, None)
+            if c and c[0] == key:
+                # most recently used is last
+                _run_status_cache[k] = c
+                res = copy.deepcopy(c[1])
+            else:
+                res = None
+        if res is None:
+            res = _simulation_run_status_uncached(data, inputs, key[1])
+            if key[2]:
+                with _run_status_lock:
+                    _run_status_cache[k] = (key, copy.deepcopy(res))
+                    while len(_run_status_cache) > _RUN_STATUS_CACHE_MAX:
+                        _run_status_cache.popitem(last=False)
+        # the client polls if changes can't be seen or too many are held
+        if (
+            cfg.run_status_wait_secs
+            and key[2]
+            and 'nextRequest' in res
+            and _run_status_held < cfg.run_status_wait_max
+        ):
+            res['nextRequest']['runStatusKey'] = _run_status_digest(key)
+        return res
+    except Exception:
+        return _simulation_error(pkdexc(), quiet=quiet)
+
+
+def _simulation_run_status_uncached(data, inputs, is_processing):
+    """Compute simulation status from run_dir
+
+    Args:
+        data (dict): request
+        inputs (dict): see `simulation_db.read_run_input`
+        is_processing (bool): from `_run_status_key`
+
+    Returns:
+        dict: status response
+    """
+    #TODO(robnagler): Lock
+    # reportParametersHash was set by _run_status_key
+    rep = simulation_db.report_info(data, inputs)
+    is_running = rep.job_status in _RUN_STATES
+    res = {'state': rep.job_status}
+    pkdc(
+        '{}: is_processing={} is_running={} state={} cached_data={}',
+        rep.job_id,
+        is_processing,
+        is_running,
+        rep.job_status,
+        bool(rep.cached_data),
+    )
+    if is_processing and not is_running:
+        runner.job_race_condition_reap(rep.job_id)
+        pkdc('{}: is_processing and not is_running', rep.job_id)
+        is_processing = False
+    template = sirepo.template.import_module(data)
+    if is_processing:
+        if not rep.cached_data:
+            return _simulation_error(
+                'input file not found, but job is running',
+                rep.input_file,
+            )
+    else:
+        is_running = False
+        if rep.run_dir.exists():
+            if hasattr(template, 'prepare_output_file') and 'models' in data:
+                template.prepare_output_file(rep, data)
+            res2, err = simulation_db.read_result(rep.run_dir)
+            if err:
+                r = simulation_db.read_status_reason(rep.run_dir)
+                if simulation_db.is_parallel(data):
+                    # allow parallel jobs to use template to parse errors below
+                    res['state'] = 'error'
+                    if r:
+                        res['error'] = r
+                elif r:
+                    # stopped by a runner limit, e.g. timed out
+                    return {'state': 'error', 'error': r}
+                else:
+                    if hasattr(template, 'parse_error_log'):
+                        res = template.parse_error_log(rep.run_dir)
+                        if res:
+                            return res
+                    return _simulation_error(err, 'error in read_result', rep.run_dir)
+            else:
+                res = res2
+                if rep.cache_hit and res.get('state') == 'completed':
+                    try:
+                        result_cache.store(rep.cached_data, rep.run_dir)
+                    except Exception:
+                        pkdlog('{}: result_cache.store failed: {}', rep.job_id, pkdexc())
+    if simulation_db.is_parallel(data):
+        new = template.background_percent_complete(
+            rep.model_name,
+            rep.run_dir,
             is_running,
-            rep.job_status,
-            bool(rep.cached_data),
         )
-        if is_processing and not is_running:
-            runner.job_race_condition_reap(rep.job_id)
-            pkdc('{}: is_processing and not is_running', rep.job_id)
-            is_processing = False
-        template = sirepo.template.import_module(data)
-        if is_processing:
-            if not rep.cached_data:
-                return _simulation_error(
-                    'input file not found, but job is running',
-                    rep.input_file,
-                )
-        else:
-            is_running = False
-            if rep.run_dir.exists():
-                if hasattr(template, 'prepare_output_file') and 'models' in data:
-                    template.prepare_output_file(rep, data)
-                res2, err = simulation_db.read_result(rep.run_dir)
-                if err:
-                    if simulation_db.is_parallel(data):
-                        # allow parallel jobs to use template to parse errors below
-                        res['state'] = 'error'
-                    else:
-                        if hasattr(template, 'parse_error_log'):
-                            res = template.parse_error_log(rep.run_dir)
-                            if res:
-                                return res
-                        return _simulation_error(err, 'error in read_result', rep.run_dir)
-                else:
-                    res = res2
-        if simulation_db.is_parallel(data):
-            new = template.background_percent_complete(
-                rep.model_name,
-                rep.run_dir,
-                is_running,
-            )
-            new.setdefault('percentComplete', 0.0)
-            new.setdefault('frameCount', 0)
-            res.update(new)
-        res['parametersChanged'] = rep.parameters_changed
-        if res['parametersChanged']:
-            pkdlog(
-                '{}: parametersChanged=True req_hash={} cached_hash={}',
-                rep.job_id,
-                rep.req_hash,
-                rep.cached_hash,
-            )
-        #TODO(robnagler) verify serial number to see what's newer
-        res.setdefault('startTime', _mtime_or_now(rep.input_file))
-        res.setdefault('lastUpdateTime', _mtime_or_now(rep.run_dir))
-        res.setdefault('elapsedTime', res['lastUpdateTime'] - res['startTime'])
-        if is_processing:
-            res['nextRequestSeconds'] = simulation_db.poll_seconds(rep.cached_data)
-            res['nextRequest'] = {
-                'report': rep.model_name,
-                'reportParametersHash': rep.cached_hash,
-                'simulationId': rep.cached_data['simulationId'],
-                'simulationType': rep.cached_data['simulationType'],
-            }
-        pkdc(
-            '{}: processing={} state={} cache_hit={} cached_hash={} data_hash={}',
+        new.setdefault('percentComplete', 0.0)
+        new.setdefault('frameCount', 0)
+        res.update(new)
+    res['parametersChanged'] = rep.parameters_changed
+    if res['parametersChanged']:
+        pkdlog(
+            '{}: parametersChanged=True req_hash={} cached_hash={}',
             rep.job_id,
-            is_processing,
-            res['state'],
-            rep.cache_hit,
-            rep.cached_hash,
             rep.req_hash,
+            rep.cached_hash,
         )
-    except Exception:
-        return _simulation_error(pkdexc(), quiet=quiet)
+    #TODO(robnagler) verify serial number to see what's newer
+    res.setdefault('startTime', _mtime_or_now(rep.input_file))
+    res.setdefault('lastUpdateTime', _mtime_or_now(rep.run_dir))
+    res.setdefault('elapsedTime', res['lastUpdateTime'] - res['startTime'])
+    if is_processing:
+        res['nextRequestSeconds'] = simulation_db.poll_seconds(rep.cached_data)
+        res['nextRequest'] = {
+            'report': rep.model_name,
+            'reportParametersHash': rep.cached_hash,
+            'simulationId': rep.cached_data['simulationId'],
+            'simulationType': rep.cached_data['simulationType'],
+        }
+    pkdc(
+        '{}: processing={} state={} cache_hit={} cached_hash={} data_hash={}',
+        rep.job_id,
+        is_processing,
+        res['state'],
+        rep.cache_hit,
+        rep.cached_hash,
+        rep.req_hash,
+    )
     return res
 
 
@@ -1125,7 +1498,15 @@ def _simulations_using_file(simulation_type, file_type, search_name, ignore_sim_
     template = sirepo.template.import_module(simulation_type)
     if not hasattr(template, 'validate_delete_file'):
         return res
-    for row in simulation_db.iterate_simulation_datafiles(simulation_type, _simulation_data):
+    for row in simulation_db.iterate_simulation_catalog(simulation_type, _simulation_data):
+        # only read documents which refer to the file; entries without
+        # libFiles are from older catalogs so read the document
+        if 'libFiles' in row and not search_name in row.libFiles:
+            continue
+        row = simulation_db.read_simulation_json(
+            simulation_type,
+            sid=row['models']['simulation']['simulationId'],
+        )
         if template.validate_delete_file(row, search_name, file_type):
             sim = row['models']['simulation']
             if ignore_sim_id and sim['simulationId'] == ignore_sim_id:
@@ -1155,6 +1536,7 @@ def _start_simulation(data):
         'startTime': int(time.time()),
         'state': 'pending',
     }
+    _run_status_cache_remove(simulation_db.simulation_run_dir(data))
     runner.job_start(data)
 
 
@@ -1192,4 +1574,6 @@ cfg = pkconfig.init(
     oauth_login=(False, bool, 'OAUTH: enable login'),
     enable_source_cache_key=(True, bool, 'enable source cache key, disable to allow local file edits in Chrome'),
     enable_bluesky=(False, bool, 'Enable calling simulations directly from NSLS-II/bluesky'),
+    run_status_wait_max=(5, int, 'Most runStatus requests held at once, each holds a server thread'),
+    run_status_wait_secs=(0, int, 'Hold runStatus until the status changes, up to this many seconds (0 disables)'),
 )
@@ -14,11 +14,15 @@ from pykern.pkdebug import pkdc, pkdexc, pkdlog, pkdp
 from sirepo import feature_config
 from sirepo.template import template_common
 from sirepo import util
+import collections
+import contextlib
 import copy
 import datetime
 import errno
+import fcntl
 import flask
 import glob
+import hashlib
 import json
 import numconv
 import os
@@ -26,6 +30,7 @@ import os.path
 import py
 import random
 import re
+import select
 import sirepo.template
 import threading
 import time
@@ -34,21 +39,39 @@ import werkzeug.exceptions
 #: Json files
 JSON_SUFFIX = '.json'
 
+#: Per-user, per-sim-type index of simulations
+CATALOG_FILE = 'sirepo-catalog' + JSON_SUFFIX
+
 #: Schema common values, e.g. version
 SCHEMA_COMMON = None
 
 #: Simulation file name is globally unique to avoid collisions with simulation output
 SIMULATION_DATA_FILE = 'sirepo-data' + JSON_SUFFIX
 
+#: Status reason of a job killed by its CPU time limit (RLIMIT_CPU)
+STATUS_REASON_CPU_LIMIT = 'CPU time limit exceeded'
+
 #: Where server files and static files are found
 STATIC_FOLDER = py.path.local(pkresource.filename('static'))
 
 #: Verify ID
 _IS_PARALLEL_RE = re.compile('animation', re.IGNORECASE)
 
+#: Saves and deletes since CATALOG_FILE was written (see `_catalog_update`)
+_CATALOG_LOG_FILE = 'sirepo-catalog.log'
+
+#: `_catalog_refresh` rewrites CATALOG_FILE when the log is larger
+_CATALOG_LOG_MAX_BYTES = 256 * 1024
+
+#: Changes when the format of catalog entries changes
+_CATALOG_VERSION = 2
+
 #: How to find examples in resources
 _EXAMPLE_DIR = 'examples'
 
+#: Shared example documents and lib files under db_dir (see `_example_store`)
+_EXAMPLE_STORE_DIR = 'examples'
+
 #: Valid characters in ID
 _ID_CHARS = numconv.BASE62
 
@@ -64,6 +87,12 @@ _ID_RE = re.compile('^{}$'.format(_ID_PARTIAL_RE_STR))
 #: where users live under db_dir
 _LIB_DIR = 'lib'
 
+#: sid locator (symlinks to simulation dirs) under db_dir
+_LOCATOR_DIR = 'sid'
+
+#: Lock file in simulation type dir, formatted with "<sid>." for a simulation lock
+_LOCK_FILE = '.{}lock'
+
 #: lib relative to sim_dir
 _REL_LIB_DIR = '../' + _LIB_DIR
 
@@ -73,12 +102,22 @@ _OLDEST_VERSION = '20140101.000001'
 #: Matches cancelation errors in run_log: KeyboardInterrupt probably only happens in dev
 _RUN_LOG_CANCEL_RE = re.compile(r'^KeyboardInterrupt$', flags=re.MULTILINE)
 
+#: inotify_init1 flag
+_IN_CLOEXEC = 0o2000000
+
+#: inotify events which change a run_dir (see `run_dir_wait`): modify,
+#: attrib, close_write, moved_from, moved_to, create, delete, delete_self, move_self
+_IN_RUN_DIR_MASK = 0x2 | 0x4 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200 | 0x400 | 0x800
+
 #: Cache of schemas keyed by app name
 _SCHEMA_CACHE = {}
 
 #: Status file name
 _STATUS_FILE = 'status'
 
+#: Why a job was stopped (see `write_status`)
+_STATUS_REASON_FILE = 'status-reason'
+
 #: created under dir
 _TMP_DIR = 'tmp'
 
@@ -94,6 +133,36 @@ _serial_prev = 0
 #: Locking for global operations like serial, user moves, etc.
 _global_lock = threading.RLock()
 
+#: simulation type dir to (CATALOG_FILE identity, log bytes applied, entries) (see `_catalog_load`)
+_catalog_cache = {}
+
+#: Protects `_catalog_cache`
+_catalog_lock = threading.Lock()
+
+#: Fixed up documents (see `_json_cache_read`) keyed by path, oldest first
+_json_cache = collections.OrderedDict()
+
+#: Sum of file sizes of documents in `_json_cache`
+_json_cache_size = 0
+
+#: `_json_cache` hits and misses since process start
+_json_cache_counts = pkcollections.Dict(hits=0, misses=0)
+
+#: Protects `_json_cache`
+_json_cache_lock = threading.Lock()
+
+#: paths of `simulation_lock` files held by the current thread
+_simulation_lock_held = threading.local()
+
+#: `_example_store` by simulation type
+_example_stores = {}
+
+#: `_field_validators` by simulation type
+_field_validators_cache = {}
+
+#: libc for inotify, False if not available (see `_inotify_watch`)
+_libc = None
+
 #: sirepo.server module, initialized manually to avoid circularity
 _server = None
 
@@ -107,6 +176,120 @@ class CopyRedirect(Exception):
         self.sr_response = response
 
 
+class _JsonCacheDict(pkcollections.Dict):
+    """Copy-on-write view of a cached dict (see `_json_cache_view`)
+
+    Values which are shared with the cache are replaced by views when
+    they are read, so callers may modify anything they get. The C
+    parts of json and dict (e.g. ``dict(x)``) see the shared values,
+    which is fine for reading. Once no values are shared, the view
+    becomes a plain Dict so it costs nothing more.
+    """
+    def __init__(self, value):
+        super(_JsonCacheDict, self).__init__(value)
+        object.__setattr__(self, '_shared', _json_cache_shared(dict.itervalues(self)))
+        self._owned()
+
+    def __getitem__(self, key):
+        v = dict.__getitem__(self, key)
+        if id(v) in self._shared:
+            self._shared.discard(id(v))
+            v = _json_cache_view(v)
+            dict.__setitem__(self, key, v)
+            self._owned()
+        return v
+
+    def __reduce_ex__(self, protocol):
+        # copy, deepcopy, and pickle the values, not the view
+        return pkcollections.Dict, (dict(self._own()),)
+
+    def copy(self):
+        return _JsonCacheDict(self)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def items(self):
+        return dict.items(self._own())
+
+    def iteritems(self):
+        return dict.iteritems(self._own())
+
+    def itervalues(self):
+        return dict.itervalues(self._own())
+
+    def pop(self, key, *default):
+        if key in self:
+            self[key]
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        k, v = dict.popitem(self)
+        return k, _json_cache_view(v) if id(v) in self._shared else v
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        return dict.setdefault(self, key, default)
+
+    def values(self):
+        return dict.values(self._own())
+
+    def _own(self):
+        """Replace all shared values, which are about to be iterated"""
+        s = self._shared
+        for k, v in dict.items(self):
+            # may become a Dict (see _owned)
+            if id(v) in s:
+                self[k]
+        return self
+
+    def _owned(self):
+        if not self._shared:
+            object.__delattr__(self, '_shared')
+            object.__setattr__(self, '__class__', pkcollections.Dict)
+
+
+class _JsonCacheList(list):
+    """Copy-on-write view of a cached list (see `_JsonCacheDict`)"""
+    def __init__(self, value):
+        super(_JsonCacheList, self).__init__(value)
+        self._shared = _json_cache_shared(list.__iter__(self))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list.__getitem__(self._own(), index)
+        v = list.__getitem__(self, index)
+        if id(v) in self._shared:
+            self._shared.discard(id(v))
+            v = _json_cache_view(v)
+            list.__setitem__(self, index, v)
+        return v
+
+    def __getslice__(self, i, j):
+        return list.__getslice__(self._own(), i, j)
+
+    def __iter__(self):
+        return list.__iter__(self._own())
+
+    def __reduce_ex__(self, protocol):
+        return list, (list(self._own()),)
+
+    def __reversed__(self):
+        return list.__reversed__(self._own())
+
+    def pop(self, index=-1):
+        self[index]
+        return list.pop(self, index)
+
+    def _own(self):
+        """Replace all shared values, which are about to be iterated"""
+        if self._shared:
+            for i in range(len(self)):
+                self[i]
+        return self
+
+
 def app_version():
     """Force the version to be dynamic if running in dev channel
 
@@ -151,7 +334,12 @@ def default_data(sim_type):
 def delete_simulation(simulation_type, sid):
     """Deletes the simulation's directory.
     """
-    pkio.unchecked_remove(simulation_dir(simulation_type, sid))
+    with simulation_lock(simulation_type, sid):
+        pkio.unchecked_remove(simulation_dir(simulation_type, sid))
+        _locator_remove(simulation_type, sid)
+        # sids aren't reused so a waiter locking the removed file is harmless
+        pkio.unchecked_remove(_simulation_lock_path(simulation_type, sid))
+    _catalog_update(simulation_type, sid, None)
 
 
 def examples(app):
@@ -167,23 +355,26 @@ def examples(app):
 
 
 def find_global_simulation(sim_type, sid, checked=False):
-    paths = pkio.sorted_glob(user_dir_name().join('*', sim_type, sid))
-    if len(paths) == 1:
-        return str(paths[0])
-    if len(paths) == 0:
-        if checked:
-            util.raise_not_found(
-                '{}/{}: global simulation not found',
-                sim_type,
-                sid,
-            )
-        return None
-    util.raise_not_found(
-        '{}: more than one path found for simulation={}/{}',
-        paths,
-        sim_type,
-        sid,
-    )
+    """Find simulation in any user's directory with the sid locator
+
+    Args:
+        sim_type (str): simulation type
+        sid (str): simulation id
+        checked (bool): raise not found if True [False]
+
+    Returns:
+        str: simulation directory or None
+    """
+    res = _locator_read(sim_type, sid)
+    if res:
+        return str(res)
+    if checked:
+        util.raise_not_found(
+            '{}/{}: global simulation not found',
+            sim_type,
+            sid,
+        )
+    return None
 
 
 def fixup_old_data(data, force=False):
@@ -281,24 +472,23 @@ def get_schema(sim_type):
 # Validate the schema itself.  Start by checking that the default data (if any) is valid -
 # other validation may follow
 def _validate_schema(schema):
-    sch_models = schema['model']
-    sch_enums = schema['enum']
-    for model_name in sch_models:
-        sch_model = sch_models[model_name]
-        for field_name in sch_model:
-            sch_field_info = sch_model[field_name]
+    for fields in _field_validators(schema).values():
+        for f in fields.values():
+            sch_field_info = f[3]
             if len(sch_field_info) <= 2:
                 continue
             field_default = sch_field_info[2]
             if field_default == '' or field_default == None:
                 continue
-            _validate_enum(field_default, sch_field_info, sch_enums)
-            _validate_number(field_default, sch_field_info)
+            _validate_field(field_default, f, schema['enum'])
 
 
 def init_by_server(app, server):
     """Avoid circular import by explicit call from `sirepo.server`.
 
+    Builds the sid locator if it does not exist, e.g. after an upgrade.
+    Otherwise, it is only rebuilt by ``sirepo db rebuild_sid_locator``.
+
     Args:
         app (Flask): flask instance
         server (module): sirepo.server
@@ -307,6 +497,11 @@ def init_by_server(app, server):
     _app = app
     global _server
     _server = server
+    if not _locator_dir().check(dir=True):
+        with _locator_lock():
+            # another worker may have built it while this one waited
+            if not _locator_dir().check(dir=True):
+                _locator_rebuild()
 
 
 def is_parallel(data):
@@ -325,6 +520,8 @@ def generate_json(data, pretty=False):
     """Convert data to JSON to be send back to client
 
     Use only for responses. Use `:func:write_json` to save.
+    numpy arrays and scalars are converted to lists and numbers.
+
     Args:
         data (dict): what to format
         pretty (bool): pretty print [False]
@@ -332,8 +529,8 @@ def generate_json(data, pretty=False):
         str: formatted data
     """
     if pretty:
-        return json.dumps(data, indent=4, separators=(',', ': '), sort_keys=True, allow_nan=False)
-    return json.dumps(data, allow_nan=False)
+        return json.dumps(data, indent=4, separators=(',', ': '), sort_keys=True, allow_nan=False, default=_json_default)
+    return json.dumps(data, allow_nan=False, default=_json_default)
 
 
 def hack_nfs_write_status(status, run_dir):
@@ -353,7 +550,32 @@ def hack_nfs_write_status(status, run_dir):
             break
         time.sleep(cfg.nfs_sleep)
     # Try once always
-    pkio.write_text(fn, status)
+    _write_atomic(fn, status)
+
+
+def iterate_simulation_catalog(simulation_type, op, search=None):
+    """Call op for each simulation in the catalog which matches search
+
+    Catalog entries look like documents which only contain
+    ``models.simulation``, plus ``libFiles`` (basenames of the files
+    in the lib dir used by the simulation by any report) and
+    ``mtime`` of the document. Use `iterate_simulation_datafiles` if
+    the full document is needed.
+
+    Args:
+        simulation_type (str): srw, warppba, ...
+        op (func): called with (res, path, entry)
+        search (dict): see `_search_data`
+
+    Returns:
+        list: result accumulated by op
+    """
+    res = []
+    for sid, e in _catalog_refresh(simulation_type).items():
+        if search and not _search_data(e, search):
+            continue
+        op(res, sim_data_file(simulation_type, sid), _json_cache_view(e))
+    return res
 
 
 def iterate_simulation_datafiles(simulation_type, op, search=None):
@@ -419,6 +641,21 @@ def json_load(*args, **kwargs):
     return pkcollections.json_load_any(*args, **kwargs)
 
 
+def json_cache_stats():
+    """Counters for the cache of fixed up documents used by `open_json_file`
+
+    Returns:
+        Dict: hits, misses, entries, and bytes (file sizes) cached
+    """
+    with _json_cache_lock:
+        return pkcollections.Dict(
+            hits=_json_cache_counts.hits,
+            misses=_json_cache_counts.misses,
+            entries=len(_json_cache),
+            bytes=_json_cache_size,
+        )
+
+
 def lib_dir_from_sim_dir(sim_dir):
     """Path to lib dir from simulation dir
 
@@ -448,6 +685,7 @@ def move_user_simulations(to_uid):
             pkdlog('{} -> {}', dir_path, new_dir_path)
             pkio.mkdir_parent(new_dir_path)
             os.rename(dir_path, new_dir_path)
+            _locator_write(data['simulationType'], _sid_from_path(path), new_dir_path)
 
 
 def open_json_file(sim_type, path=None, sid=None, fixup=True):
@@ -464,40 +702,7 @@ def open_json_file(sim_type, path=None, sid=None, fixup=True):
     Raises:
         CopyRedirect: if the simulation is in another user's
     """
-    if not path:
-        path = sim_data_file(sim_type, sid)
-    if not os.path.isfile(str(path)):
-        global_sid = None
-        if sid:
-            #TODO(robnagler) workflow should be in server.py,
-            # because only valid in one case, not e.g. for opening examples
-            # which are not found.
-            user_copy_sid = _find_user_simulation_copy(sim_type, sid)
-            if find_global_simulation(sim_type, sid):
-                global_sid = sid
-        if global_sid:
-            raise CopyRedirect({
-                'redirect': {
-                    'simulationId': global_sid,
-                    'userCopySimulationId': user_copy_sid,
-                },
-            })
-        util.raise_not_found(
-            '{}/{}: global simulation not found',
-            sim_type,
-            sid,
-        )
-    data = None
-    try:
-        with open(str(path)) as f:
-            data = json_load(f)
-            # ensure the simulationId matches the path
-            if sid:
-                data['models']['simulation']['simulationId'] = _sid_from_path(path)
-    except Exception as e:
-        pkdlog('{}: error: {}', path, pkdexc())
-        raise
-    return fixup_old_data(data)[0] if fixup else data
+    return _open_json_file(sim_type, path, sid, fixup)[0]
 
 
 def parse_sid(data):
@@ -592,7 +797,8 @@ def process_simulation_list(res, path, data):
         'name': sim['name'],
         'folder': sim['folder'],
         'last_modified': datetime.datetime.fromtimestamp(
-            os.path.getmtime(str(path))
+            # catalog entries have the mtime so the document isn't statted
+            data.get('mtime') or os.path.getmtime(str(path))
         ).strftime('%Y-%m-%d %H:%M'),
         'isExample': sim['isExample'] if 'isExample' in sim else False,
         'simulation': sim,
@@ -655,6 +861,30 @@ def read_result(run_dir):
     return res, None
 
 
+def read_run_input(run_dir, inputs=None):
+    """Read the input (in.json) of run_dir
+
+    Requests which need the input of several reports (simulationBatch)
+    pass the same inputs so each run_dir's input is read and hashed once.
+    The documents in inputs are shared so must not be modified.
+
+    Args:
+        run_dir (py.path): simulation output directory
+        inputs (dict): documents already read by path, updated [None]
+
+    Returns:
+        dict: data which started the run
+    """
+    p = json_filename(template_common.INPUT_BASE_NAME, run_dir)
+    if inputs is None:
+        return read_json(p)
+    k = str(p)
+    res = inputs.get(k)
+    if res is None:
+        res = inputs[k] = read_json(p)
+    return res
+
+
 def read_simulation_json(sim_type, *args, **kwargs):
     """Calls `open_json_file` and fixes up data, possibly saving
 
@@ -664,10 +894,9 @@ def read_simulation_json(sim_type, *args, **kwargs):
     Returns:
         data (dict): simulation data
     """
-    data = open_json_file(sim_type, fixup=False, *args, **kwargs)
-    new, changed = fixup_old_data(data)
+    data, changed = _open_json_file(sim_type, *args, **kwargs)
     if changed:
-        return save_simulation_json(new)
+        return save_simulation_json(data)
     return data
 
 
@@ -686,7 +915,24 @@ def read_status(run_dir):
         return 'error'
 
 
-def report_info(data):
+def read_status_reason(run_dir):
+    """Why the job in run_dir was stopped by the runner
+
+    Args:
+        run_dir (py.path): where to read
+
+    Returns:
+        str: message for the user or None if not stopped by a limit
+    """
+    try:
+        return pkio.read_text(run_dir.join(_STATUS_REASON_FILE))
+    except IOError as e:
+        if pkio.exception_is_not_found(e):
+            return None
+        raise
+
+
+def report_info(data, inputs=None):
     """Read the run_dir and return cached_data.
 
     Only a hit if the models between data and cache match exactly. Otherwise,
@@ -694,6 +940,7 @@ def report_info(data):
 
     Args:
         data (dict): parameters identifying run_dir and models or reportParametersHash
+        inputs (dict): see `read_run_input` [None]
 
     Returns:
         Dict: report parameters and hashes
@@ -715,7 +962,7 @@ def report_info(data):
         return rep
     #TODO(robnagler) Lock
     try:
-        cd = read_json(rep.input_file)
+        cd = read_run_input(rep.run_dir, inputs)
         rep.cached_hash = template_common.report_parameters_hash(cd)
         rep.cached_data = cd
         if rep.req_hash == rep.cached_hash:
@@ -730,6 +977,75 @@ def report_info(data):
     return rep
 
 
+def run_dir_signature(run_dir, progress_files=()):
+    """Fingerprint of the state of run_dir
+
+    Changes when the status, result, run log, or one of progress_files
+    is written or a file is created in, removed from, or renamed into
+    run_dir. Only stats a few paths since it is computed on every
+    runStatus. Other files written in subdirectories (e.g. frames) are
+    not seen.
+
+    Args:
+        run_dir (py.path): simulation output directory
+        progress_files (list): other paths (files or directories) to include [()]
+
+    Returns:
+        str: hash of inodes, mtimes, and sizes or None if run_dir does not exist
+    """
+    res = hashlib.md5()
+    for p in [
+        run_dir,
+        run_dir.join(_STATUS_FILE),
+        run_dir.join(_STATUS_REASON_FILE),
+        json_filename(template_common.OUTPUT_BASE_NAME, run_dir),
+        run_dir.join(template_common.RUN_LOG),
+    ] + list(progress_files):
+        try:
+            s = os.stat(str(p))
+        except OSError:
+            if p is run_dir:
+                return None
+            res.update(b'-\n')
+            continue
+        res.update('{} {!r} {}\n'.format(s.st_ino, s.st_mtime, s.st_size).encode())
+    return res.hexdigest()
+
+
+def run_dir_wait(run_dir, timeout):
+    """Sleep until run_dir changes or timeout
+
+    Uses inotify where available, which only reports changes to files
+    in run_dir, not in its subdirectories. Otherwise, sleeps for
+    timeout. Callers check `run_dir_signature` to know what changed.
+
+    Args:
+        run_dir (py.path): simulation output directory
+        timeout (float): maximum seconds to wait
+    """
+    fd = _inotify_watch(run_dir)
+    if fd is None:
+        time.sleep(timeout)
+        return
+    try:
+        select.select([fd], [], [], timeout)
+    finally:
+        os.close(fd)
+
+
+def rebuild_sid_locator():
+    """Recreate the sid locator from the simulation directories
+
+    The new locator is built beside the current one and renamed into
+    place so lookups always see a complete locator.
+
+    Returns:
+        int: number of simulations found
+    """
+    with _locator_lock():
+        return _locator_rebuild()
+
+
 def save_new_example(data):
     data.models.simulation.isExample = True
     return save_new_simulation(fixup_old_data(data)[0], do_validate=False)
@@ -757,7 +1073,7 @@ def save_simulation_json(data, do_validate=True):
     data = fixup_old_data(data)[0]
     s = data.models.simulation
     fn = sim_data_file(data.simulationType, s.simulationId)
-    with _global_lock:
+    with simulation_lock(data.simulationType, s.simulationId):
         need_validate = True
         try:
             # OPTIMIZATION: If folder/name same, avoid reading entire folder
@@ -768,10 +1084,13 @@ def save_simulation_json(data, do_validate=True):
         except Exception:
             pass
         if need_validate and do_validate:
-            _validate_name(data)
-            _validate_fields(data)
-        s.simulationSerial = _serial_new()
-        write_json(fn, data)
+            # another simulation must not take the name before it is written
+            with simulation_lock(data.simulationType):
+                _validate_name(data)
+                _validate_fields(data)
+                _save_simulation_json(data, fn)
+        else:
+            _save_simulation_json(data, fn)
     return data
 
 
@@ -815,6 +1134,57 @@ def simulation_lib_dir(simulation_type):
     return simulation_dir(simulation_type).join(_LIB_DIR)
 
 
+@contextlib.contextmanager
+def simulation_lock(sim_type, sid=None, blocking=True):
+    """Exclusive lock on a simulation or a simulation type (names)
+
+    The lock is an OS file lock on a file in the user's simulation
+    type dir so it holds across processes. It is reentrant within a
+    thread. To avoid deadlocks, acquire a simulation lock before the
+    simulation type lock.
+
+    Args:
+        sim_type (str): simulation type
+        sid (str): simulation id or None for the type lock
+        blocking (bool): wait for lock [True]
+
+    Yields:
+        bool: True if acquired (always if blocking)
+    """
+    p = str(_simulation_lock_path(sim_type, sid))
+    held = getattr(_simulation_lock_held, 'paths', None)
+    if held is None:
+        held = _simulation_lock_held.paths = set()
+    if p in held:
+        yield True
+        return
+    try:
+        fd = os.open(p, os.O_RDWR | os.O_CREAT, 0o666)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        # first use of simulation type
+        pkio.mkdir_parent(os.path.dirname(p))
+        fd = os.open(p, os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            ok = True
+        except IOError as e:
+            if blocking or e.errno not in (errno.EACCES, errno.EAGAIN):
+                raise
+            ok = False
+        if ok:
+            held.add(p)
+        try:
+            yield ok
+        finally:
+            held.discard(p)
+    finally:
+        # releases the lock
+        os.close(fd)
+
+
 def simulation_run_dir(data, remove_dir=False):
     """Where to run the simulation
 
@@ -889,9 +1259,9 @@ def validate_serial(req_data):
     Returns:
         object: None if all ok, or json response (bad)
     """
-    with _global_lock:
-        sim_type = sirepo.template.assert_sim_type(req_data['simulationType'])
-        sid = parse_sid(req_data)
+    sim_type = sirepo.template.assert_sim_type(req_data['simulationType'])
+    sid = parse_sid(req_data)
+    with simulation_lock(sim_type, sid):
         req_ser = req_data['models']['simulation']['simulationSerial']
         curr = read_simulation_json(sim_type, sid=sid)
         curr_ser = curr['models']['simulation']['simulationSerial']
@@ -911,21 +1281,34 @@ def validate_serial(req_data):
 
 def verify_app_directory(simulation_type):
     """Ensure the app directory is present. If not, create it and add example files.
+
+    Called when the user first lists simulations of the type. The lib
+    dir is created last so it marks the app directory complete.
     """
-    d = simulation_dir(simulation_type)
+    d = simulation_lib_dir(simulation_type)
     if d.exists():
         return
-    _create_example_and_lib_files(simulation_type)
+    with simulation_lock(simulation_type):
+        if not d.exists():
+            _create_example_and_lib_files(simulation_type)
 
 
 def write_json(filename, data):
     """Write data as json to filename
 
+    The file is replaced atomically so readers never see a partial
+    file. It is pretty printed unless cfg.compact_json is set.
+
     Args:
         filename (py.path or str): will append JSON_SUFFIX if necessary
     """
-    with open(str(json_filename(filename)), 'w') as f:
-        f.write(generate_json(data, pretty=True))
+    fn = json_filename(filename)
+    _json_cache_remove(fn)
+    if cfg.compact_json:
+        j = json.dumps(data, separators=(',', ':'), allow_nan=False, default=_json_default)
+    else:
+        j = generate_json(data, pretty=True)
+    _write_atomic(fn, j)
 
 
 def write_result(result, run_dir=None):
@@ -952,33 +1335,409 @@ def write_result(result, run_dir=None):
             template.clean_run_dir(run_dir)
 
 
-def write_status(status, run_dir):
+def write_status(status, run_dir, reason=None):
     """Write status to simulation
 
     Args:
         status (str): pending, running, completed, canceled
         run_dir (py.path): where to write the file
+        reason (str): why the runner stopped the job (see `read_status_reason`) [None]
+    """
+    if reason:
+        # before status so a reader of the status sees the reason
+        _write_atomic(run_dir.join(_STATUS_REASON_FILE), reason)
+    _write_atomic(run_dir.join(_STATUS_FILE), status)
+
+
+def _catalog_entry(data, path):
+    """Create the catalog entry for the document at path
+
+    Args:
+        data (dict): simulation document
+        path (py.path): where data was read or written
+
+    Returns:
+        Dict: entry
+    """
+    s = os.stat(str(path))
+    # all the files, not just the ones of the last report run
+    d = pkcollections.Dict(data)
+    d.pop('report', None)
+    return pkcollections.Dict(
+        libFiles=[f.basename for f in template_common.lib_files(d)],
+        models=pkcollections.Dict(simulation=data.models.simulation),
+        mtime=s.st_mtime,
+        size=s.st_size,
+    )
+
+
+def _catalog_entry_read(simulation_type, sid, save=True):
+    """Read the document of sid and create its catalog entry
+
+    Args:
+        simulation_type (str): srw, warppba, ...
+        sid (str): simulation id
+        save (bool): save the document if `fixup_old_data` changed it [True]
+
+    Returns:
+        Dict: entry or None if there is no (valid) document
+    """
+    path = sim_data_file(simulation_type, sid)
+    if not path.check(file=True):
+        # being created or deleted
+        return None
+    try:
+        data = open_json_file(simulation_type, path, fixup=False)
+    except IOError as e:
+        if pkio.exception_is_not_found(e):
+            return None
+        raise
+    except ValueError as e:
+        pkdlog('{}: error: {}', path, e)
+        return None
+    data, fixed = fixup_old_data(data)
+    # save changes to avoid re-applying fixups on each iteration.
+    # Not blocking, because the caller may hold the type lock
+    # (see simulation_lock)
+    if fixed and save:
+        with simulation_lock(simulation_type, sid, blocking=False) as ok:
+            if ok:
+                save_simulation_json(data, do_validate=False)
+    return _catalog_entry(data, path)
+
+
+def _catalog_load(sim_dir, fd):
+    """CATALOG_FILE of sim_dir with the log applied
+
+    Parsed entries and the log offset are cached per process so only
+    the part of the log which was appended since the last call is read.
+
+    Args:
+        sim_dir (py.path): simulation type dir
+        fd (int): log locked by caller (see `_catalog_log`)
+
+    Returns:
+        Dict: entries keyed by sid (shared, so don't modify)
+        bool: False if CATALOG_FILE is missing or of another version
+    """
+    p = sim_dir.join(CATALOG_FILE)
+    try:
+        s = os.stat(str(p))
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return pkcollections.Dict(), False
+    i = (s.st_ino, s.st_mtime, s.st_size)
+    k = str(sim_dir)
+    n = os.fstat(fd).st_size
+    with _catalog_lock:
+        e = _catalog_cache.get(k)
+    if e and e[0] == i and e[1] <= n:
+        o, res = e[1], e[2]
+    else:
+        c = read_json(p)
+        if c.get('version') != _catalog_version():
+            return pkcollections.Dict(), False
+        o, res = 0, c.simulations
+    if o < n:
+        os.lseek(fd, o, os.SEEK_SET)
+        b = b''
+        while len(b) < n - o:
+            x = os.read(fd, n - o - len(b))
+            if not x:
+                break
+            b += x
+        # a line is complete once its newline is written
+        b = b[:b.rfind(b'\n') + 1]
+        res = pkcollections.Dict(res)
+        for l in b.splitlines():
+            sid, x = json_load(l)
+            if x is None:
+                res.pop(sid, None)
+            else:
+                res[sid] = x
+        o += len(b)
+    with _catalog_lock:
+        _catalog_cache[k] = (i, o, res)
+    return res, True
+
+
+@contextlib.contextmanager
+def _catalog_log(sim_dir, exclusive=False):
+    """Open and lock the catalog log of sim_dir
+
+    Appending and reading share the lock. Replacing CATALOG_FILE and
+    emptying the log (`_catalog_write`) holds it exclusively.
+
+    Args:
+        sim_dir (py.path): simulation type dir
+        exclusive (bool): lock for `_catalog_write` [False]
+
+    Yields:
+        int: file descriptor (opened for append)
+    """
+    p = str(sim_dir.join(_CATALOG_LOG_FILE))
+    try:
+        fd = os.open(p, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o666)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        pkio.mkdir_parent(sim_dir)
+        fd = os.open(p, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o666)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield fd
+    finally:
+        os.close(fd)
+
+
+def _catalog_refresh(simulation_type):
+    """Synchronize the catalog with the simulation dirs
+
+    Saves and deletes update the catalog (`_catalog_update`). The
+    simulation type dir is listed and the documents are statted to
+    find simulations which were created, removed, or written
+    otherwise, e.g. by `move_user_simulations`, the srw python import
+    (backgroundImport), or a save which crashed before updating the
+    catalog. Only the documents of those are read. The catalog is
+    rebuilt from all documents if it is missing or of another version.
+
+    Args:
+        simulation_type (str): srw, warppba, ...
+
+    Returns:
+        Dict: entries keyed by sid (shared, so don't modify)
+    """
+    d = simulation_dir(simulation_type)
+    with _catalog_log(d) as fd:
+        c, ok = _catalog_load(d, fd)
+    if not ok:
+        with _catalog_log(d, exclusive=True) as fd:
+            c, ok = _catalog_load(d, fd)
+            if not ok:
+                # The lock blocks saves so they aren't lost, which is
+                # why fixed up documents aren't saved here
+                c = pkcollections.Dict()
+                for sid in _catalog_sids(d):
+                    e = _catalog_entry_read(simulation_type, sid, save=False)
+                    if e:
+                        c[sid] = e
+                _catalog_write(d, fd, c)
+        return c
+    s = _catalog_sids(d)
+    for sid in set(c) - s:
+        _catalog_update(simulation_type, sid, None)
+    for sid in s:
+        e = c.get(sid)
+        if e:
+            try:
+                x = os.stat(str(sim_data_file(simulation_type, sid)))
+            except OSError as err:
+                if err.errno != errno.ENOENT:
+                    raise
+                # being created or deleted
+                continue
+            if e.mtime == x.st_mtime and e.size == x.st_size:
+                continue
+        e = _catalog_entry_read(simulation_type, sid)
+        if e:
+            _catalog_update(simulation_type, sid, e)
+    with _catalog_log(d) as fd:
+        c, _ = _catalog_load(d, fd)
+        if os.fstat(fd).st_size <= _CATALOG_LOG_MAX_BYTES:
+            return c
+    with _catalog_log(d, exclusive=True) as fd:
+        c, ok = _catalog_load(d, fd)
+        if ok:
+            _catalog_write(d, fd, c)
+    return c
+
+
+def _catalog_sids(sim_dir):
+    """Ids of the simulation dirs in sim_dir"""
+    return set(x for x in os.listdir(str(sim_dir)) if _ID_RE.search(x))
+
+
+def _catalog_update(simulation_type, sid, entry):
+    """Append the entry of sid to the catalog log
+
+    Args:
+        simulation_type (str): srw, warppba, ...
+        sid (str): simulation id
+        entry (dict): from `_catalog_entry` or None if deleted
+    """
+    d = simulation_dir(simulation_type)
+    l = (generate_json([sid, entry]) + '\n').encode()
+    with _catalog_log(d) as fd:
+        # O_APPEND so concurrent appends don't overwrite each other
+        os.write(fd, l)
+
+
+def _catalog_version():
+    return '{}-{}'.format(SCHEMA_COMMON['version'], _CATALOG_VERSION)
+
+
+def _catalog_write(sim_dir, fd, entries):
+    """Replace CATALOG_FILE atomically and empty the log
+
+    Args:
+        sim_dir (py.path): simulation type dir
+        fd (int): log locked exclusively (see `_catalog_log`)
+        entries (dict): keyed by sid
     """
-    pkio.write_text(run_dir.join(_STATUS_FILE), status)
+    _write_atomic(
+        sim_dir.join(CATALOG_FILE),
+        generate_json(dict(version=_catalog_version(), simulations=entries)),
+    )
+    os.ftruncate(fd, 0)
 
 
 def _create_example_and_lib_files(simulation_type):
+    """Link examples and lib files from the shared store into the user's dir
+
+    Example documents are hard links to the store until they are saved,
+    because `write_json` replaces files.
+    """
+    s = _example_store(simulation_type)
     d = simulation_dir(simulation_type)
     pkio.mkdir_parent(d)
-    for s in examples(simulation_type):
-        save_new_example(s)
+    with _catalog_log(d, exclusive=True) as fd:
+        c = pkcollections.Dict(_catalog_load(d, fd)[0])
+        for f, data in s.docs:
+            i = _random_id(d, simulation_type)
+            p = i.path.join(SIMULATION_DATA_FILE)
+            _link_or_copy(f, p)
+            data = _json_cache_view(data)
+            data.models.simulation.simulationId = i.id
+            c[i.id] = _catalog_entry(data, p)
+        _catalog_write(d, fd, c)
     d = simulation_lib_dir(simulation_type)
-    pkio.mkdir_parent(d)
-    template = sirepo.template.import_module(simulation_type)
-    if hasattr(template, 'resource_files'):
-        for f in template.resource_files():
-            #TODO(pjm): symlink has problems in containers
-            # d.join(f.basename).mksymlinkto(f)
-            f.copy(d)
+    tmp = d.new(basename='{}.tmp{}'.format(d.basename, os.getpid()))
+    pkio.unchecked_remove(tmp)
+    pkio.mkdir_parent(tmp)
+    for f in s.lib:
+        #TODO(pjm): symlink has problems in containers
+        # d.join(f.basename).mksymlinkto(f)
+        _link_or_copy(f, tmp.join(f.basename))
+    tmp.rename(d)
+
+
+def _example_store(sim_type):
+    """Shared read-only example documents and lib files
+
+    The store is db_dir/examples/<sim_type>-<digest> where the digest
+    changes with the names and contents of the package's example and
+    resource files and the schema version, so all servers running the
+    same package share the store. It is created once by the first
+    process which needs it. Documents are fixed up so users never need
+    to save them before they are modified.
+
+    Args:
+        sim_type (str): simulation type
+
+    Returns:
+        Dict: docs (list of (path, data)) and lib (list of paths)
+    """
+    with _global_lock:
+        res = _example_stores.get(sim_type)
+        if res:
+            return res
+        src = pkio.walk_tree(
+            template_common.resource_dir(sim_type).join(_EXAMPLE_DIR),
+            re.escape(JSON_SUFFIX) + '$',
+        )
+        t = sirepo.template.import_module(sim_type)
+        lib = t.resource_files() if hasattr(t, 'resource_files') else []
+        h = hashlib.md5(SCHEMA_COMMON['version'].encode())
+        for f in src + lib:
+            h.update('{} {}\n'.format(f.basename, f.size()).encode())
+            h.update(f.read_binary())
+        d = _app.sirepo_db_dir.join(
+            _EXAMPLE_STORE_DIR,
+            '{}-{}'.format(sim_type, h.hexdigest()),
+        )
+        if not d.check(dir=True):
+            _example_store_create(d, sim_type, lib)
+        res = pkcollections.Dict(
+            docs=[(f, read_json(f)) for f in pkio.sorted_glob(d.join('*' + JSON_SUFFIX))],
+            lib=pkio.sorted_glob(d.join(_LIB_DIR, '*')),
+        )
+        _example_stores[sim_type] = res
+        return res
+
+
+def _example_store_create(store_dir, sim_type, lib):
+    """Populate a new example store
+
+    Stores of other versions are not removed, because other processes
+    (servers of the other version) may link from them.
+    """
+    tmp = store_dir.new(basename='{}.tmp{}'.format(store_dir.basename, os.getpid()))
+    pkio.unchecked_remove(tmp)
+    pkio.mkdir_parent(tmp.join(_LIB_DIR))
+    for i, data in enumerate(examples(sim_type)):
+        data.models.simulation.isExample = True
+        data = fixup_old_data(data)[0]
+        data.models.simulation.simulationSerial = _serial_new()
+        p = tmp.join('{}{}'.format(i, JSON_SUFFIX))
+        write_json(p, data)
+        # users share the file so it must be replaced, not modified
+        p.chmod(0o444)
+    for f in lib:
+        p = tmp.join(_LIB_DIR, f.basename)
+        f.copy(p)
+        p.chmod(0o444)
+    try:
+        tmp.rename(store_dir)
+    except py.error.Error:
+        if not store_dir.check(dir=True):
+            raise
+        # created by another process
+        pkio.unchecked_remove(tmp)
+        return
+    pkdlog('{}: created example store', store_dir)
+
+
+def _field_validators(schema):
+    """Compile the schema's models for `_validate_field`
+
+    Ensure the value of a numeric field falls within the supplied limits
+    (if any). Note that currently the values in enum arrays at the
+    indices of the limits are sometimes used for other purposes, so
+    limits which are not numbers are ignored.
+
+    Args:
+        schema (dict): from `get_schema`
+
+    Returns:
+        dict: model name to dict of field name to
+            (enum values or None, min or None, max or None, field info)
+    """
+    res = _field_validators_cache.get(schema['simulationType'])
+    if res:
+        return res
+    res = {}
+    for model_name, sch_model in schema['model'].items():
+        fields = res[model_name] = {}
+        for field_name, info in sch_model.items():
+            enum = None
+            if info[1] in schema['enum']:
+                enum = frozenset(str(e[0]) for e in schema['enum'][info[1]])
+            fmin = fmax = None
+            if len(info) > 4:
+                try:
+                    fmin = float(info[4])
+                    if len(info) > 5:
+                        fmax = float(info[5])
+                except (TypeError, ValueError):
+                    pass
+            fields[field_name] = (enum, fmin, fmax, info)
+    _field_validators_cache[schema['simulationType']] = res
+    return res
 
 
 def _find_user_simulation_copy(simulation_type, sid):
-    rows = iterate_simulation_datafiles(simulation_type, process_simulation_list, {
+    rows = iterate_simulation_catalog(simulation_type, process_simulation_list, {
         'simulation.outOfSessionSimulationId': sid,
     })
     if len(rows):
@@ -994,9 +1753,275 @@ def _init():
     cfg = pkconfig.init(
         nfs_tries=(10, int, 'How many times to poll in hack_nfs_write_status'),
         nfs_sleep=(0.5, float, 'Seconds sleep per hack_nfs_write_status poll'),
+        json_cache_bytes=(16 * 1024 * 1024, int, 'Total size of simulation documents whose fixed up data is cached (0 disables)'),
+        compact_json=(False, bool, 'write_json without indentation (smaller and faster)'),
+        fsync=(False, bool, 'fsync files written by write_json and write_status and their directories'),
     )
 
 
+def _inotify_watch(path):
+    """File descriptor which is readable when path changes or None"""
+    global _libc
+    if _libc is None:
+        try:
+            import ctypes
+            import ctypes.util
+
+            _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            # AttributeError if not Linux
+            _libc.inotify_add_watch
+        except (AttributeError, OSError):
+            _libc = False
+    if not _libc:
+        return None
+    fd = _libc.inotify_init1(_IN_CLOEXEC)
+    if fd < 0:
+        return None
+    if _libc.inotify_add_watch(fd, str(path).encode(), _IN_RUN_DIR_MASK) < 0:
+        # e.g. path does not exist
+        os.close(fd)
+        return None
+    return fd
+
+
+def _json_cache_read(path):
+    """Parse and fixup JSON file or view the cached document
+
+    The cache is keyed by the identity of the file (inode, mtime,
+    size) so a file which is replaced or modified by any process
+    is parsed again. Only fixed up documents are cached, because
+    parsing is about as fast as copying.
+
+    Args:
+        path (py.path): json file
+
+    Returns:
+        object: copy-on-write view of document
+        bool: True if `fixup_old_data` changed the document
+    """
+    global _json_cache_size
+
+    k = str(path)
+    with open(k) as f:
+        i = _json_cache_stat(f)
+        with _json_cache_lock:
+            e = _json_cache.pop(k, None)
+            if e and e[0] == i:
+                _json_cache[k] = e
+                _json_cache_counts.hits += 1
+                return _json_cache_view(e[1]), e[2]
+            _json_cache_counts.misses += 1
+            if e:
+                _json_cache_size -= e[0][-1]
+        res = json_load(f)
+        # file was modified while reading
+        cache = i == _json_cache_stat(f)
+    res, changed = fixup_old_data(res)
+    if not cache or i[-1] > cfg.json_cache_bytes:
+        return res, changed
+    with _json_cache_lock:
+        e = _json_cache.pop(k, None)
+        if e:
+            _json_cache_size -= e[0][-1]
+        _json_cache[k] = (i, res, changed)
+        _json_cache_size += i[-1]
+        while _json_cache_size > cfg.json_cache_bytes:
+            _json_cache_size -= _json_cache.popitem(last=False)[1][0][-1]
+    return _json_cache_view(res), changed
+
+
+def _json_cache_remove(path):
+    """Discard documents for path, which is about to be written"""
+    global _json_cache_size
+
+    with _json_cache_lock:
+        e = _json_cache.pop(str(path), None)
+        if e:
+            _json_cache_size -= e[0][-1]
+
+
+def _json_cache_shared(values):
+    """ids of the values which are containers, i.e. must be viewed"""
+    return set(id(v) for v in values if isinstance(v, (dict, list)))
+
+
+def _json_cache_stat(f):
+    s = os.fstat(f.fileno())
+    # size must be last (see _json_cache_read)
+    return (
+        s.st_ino,
+        getattr(s, 'st_mtime_ns', None) or int(s.st_mtime * 1e9),
+        s.st_size,
+    )
+
+
+def _json_cache_view(value):
+    """Copy-on-write view of a cached dict or list"""
+    return _JsonCacheDict(value) if isinstance(value, dict) else _JsonCacheList(value)
+
+
+def _json_default(value):
+    """Convert numpy arrays and scalars which templates return"""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError('{}: is not JSON serializable'.format(repr(value)))
+
+
+def _link_or_copy(src, dst):
+    """Hard link src to dst or copy if src is on another file system"""
+    try:
+        os.link(str(src), str(dst))
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+            raise
+        src.copy(dst)
+
+
+def _locator_add(sim_type, sid, sim_dir, root=None):
+    """Create locator entry, raising OSError EEXIST if it exists"""
+    p = _locator_path(sim_type, sid, root)
+    pkio.mkdir_parent(p.dirpath())
+    # relative so db_dir can move
+    os.symlink(os.path.relpath(str(sim_dir), str(p.dirpath())), str(p))
+
+
+def _locator_dir():
+    return _app.sirepo_db_dir.join(_LOCATOR_DIR)
+
+
+@contextlib.contextmanager
+def _locator_lock():
+    """Exclusive lock on rebuilding the sid locator across processes"""
+    fd = os.open(
+        str(_app.sirepo_db_dir.join(_LOCK_FILE.format(_LOCATOR_DIR + '.'))),
+        os.O_RDWR | os.O_CREAT,
+        0o666,
+    )
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # releases the lock
+        os.close(fd)
+
+
+def _locator_path(sim_type, sid, root=None):
+    assert _ID_RE.search(sid), \
+        '{}: invalid simulation id'.format(sid)
+    return (root or _locator_dir()).join(sirepo.template.assert_sim_type(sim_type), sid)
+
+
+def _locator_read(sim_type, sid, root=None):
+    """Simulation dir from locator or None (stale entries are removed)"""
+    p = _locator_path(sim_type, sid, root)
+    try:
+        res = p.dirpath().join(os.readlink(str(p)))
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            return None
+        raise
+    if res.check(dir=True):
+        return res
+    if not res.dirpath().check(dir=True):
+        # removed outside of delete_simulation, e.g. purge_users
+        _locator_remove(sim_type, sid)
+    # else _random_id reserved sid, but directory not yet created
+    return None
+
+
+def _locator_rebuild():
+    """Implements `rebuild_sid_locator` (caller holds `_locator_lock`)"""
+    d = _locator_dir()
+    tmp = d.new(basename='{}-{}'.format(d.basename, os.getpid()))
+    pkio.unchecked_remove(tmp)
+    pkio.mkdir_parent(tmp)
+    res = 0
+    for p in pkio.sorted_glob(user_dir_name().join('*', '*', '*', SIMULATION_DATA_FILE)):
+        sim_dir = p.dirpath()
+        t = sim_dir.dirpath().basename
+        if t not in feature_config.cfg.sim_types or not _ID_RE.search(sim_dir.basename):
+            continue
+        try:
+            _locator_add(t, sim_dir.basename, sim_dir, root=tmp)
+            res += 1
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+            pkdlog(
+                '{}: duplicate simulation, locator has {}',
+                sim_dir,
+                _locator_read(t, sim_dir.basename, root=tmp),
+            )
+    old = None
+    if d.check():
+        old = d.new(basename=tmp.basename + '-old')
+        d.rename(old)
+    tmp.rename(d)
+    if old:
+        pkio.unchecked_remove(old)
+    return res
+
+
+def _locator_remove(sim_type, sid):
+    pkio.unchecked_remove(_locator_path(sim_type, sid))
+
+
+def _locator_write(sim_type, sid, sim_dir):
+    """Create or replace locator entry atomically"""
+    p = _locator_path(sim_type, sid)
+    t = p.new(basename='{}-{}'.format(sid, os.getpid()))
+    pkio.unchecked_remove(t)
+    pkio.mkdir_parent(p.dirpath())
+    os.symlink(os.path.relpath(str(sim_dir), str(p.dirpath())), str(t))
+    os.rename(str(t), str(p))
+
+
+def _open_json_file(sim_type, path=None, sid=None, fixup=True):
+    """Implements `open_json_file`
+
+    Returns:
+        dict: data
+        bool: True if `fixup_old_data` changed data
+    """
+    if not path:
+        path = sim_data_file(sim_type, sid)
+    if not os.path.isfile(str(path)):
+        global_sid = None
+        if sid:
+            #TODO(robnagler) workflow should be in server.py,
+            # because only valid in one case, not e.g. for opening examples
+            # which are not found.
+            user_copy_sid = _find_user_simulation_copy(sim_type, sid)
+            if find_global_simulation(sim_type, sid):
+                global_sid = sid
+        if global_sid:
+            raise CopyRedirect({
+                'redirect': {
+                    'simulationId': global_sid,
+                    'userCopySimulationId': user_copy_sid,
+                },
+            })
+        util.raise_not_found(
+            '{}/{}: global simulation not found',
+            sim_type,
+            sid,
+        )
+    data = None
+    try:
+        if fixup:
+            data, changed = _json_cache_read(path)
+        else:
+            data, changed = read_json(path), False
+        # ensure the simulationId matches the path; examples linked from
+        # the shared store contain the store's id (see _example_store)
+        if sid or os.path.basename(str(path)) == SIMULATION_DATA_FILE:
+            data['models']['simulation']['simulationId'] = _sid_from_path(path)
+    except Exception as e:
+        pkdlog('{}: error: {}', path, pkdexc())
+        raise
+    return data, changed
+
+
 def _random_id(parent_dir, simulation_type=None):
     """Create a random id in parent_dir
 
@@ -1010,14 +2035,21 @@ def _random_id(parent_dir, simulation_type=None):
     # Generate cryptographically secure random string
     for _ in range(5):
         i = ''.join(r.choice(_ID_CHARS) for x in range(_ID_LEN))
-        if simulation_type:
-            if find_global_simulation(simulation_type, i):
-                continue
         d = parent_dir.join(i)
+        if simulation_type:
+            try:
+                # reserves the id globally
+                _locator_add(simulation_type, i, d)
+            except OSError as e:
+                if e.errno == errno.EEXIST:
+                    continue
+                raise
         try:
             os.mkdir(str(d))
             return pkcollections.Dict(id=i, path=d)
         except OSError as e:
+            if simulation_type:
+                _locator_remove(simulation_type, i)
             if e.errno == errno.EEXIST:
                 pass
             raise
@@ -1037,6 +2069,17 @@ def _report_name(data):
     return data['report']
 
 
+def _save_simulation_json(data, path):
+    """Write document and catalog entry (see `save_simulation_json`)"""
+    data.models.simulation.simulationSerial = _serial_new()
+    write_json(path, data)
+    _catalog_update(
+        data.simulationType,
+        data.models.simulation.simulationId,
+        _catalog_entry(data, path),
+    )
+
+
 def _search_data(data, search):
     for field, expect in search.items():
         path = field.split('.')
@@ -1082,6 +2125,13 @@ def _sid_from_path(path):
     return sid
 
 
+def _simulation_lock_path(sim_type, sid):
+    """File locked by `simulation_lock`"""
+    if sid:
+        return simulation_dir(sim_type, sid).dirpath().join(_LOCK_FILE.format(sid + '.'))
+    return simulation_dir(sim_type).join(_LOCK_FILE.format(''))
+
+
 def _validate_name(data):
     """Validate and if necessary uniquify name
 
@@ -1091,7 +2141,7 @@ def _validate_name(data):
     starts_with = pkcollections.Dict()
     s = data.models.simulation
     n = s.name
-    for d in iterate_simulation_datafiles(
+    for d in iterate_simulation_catalog(
         data.simulationType,
         lambda res, _, d: res.append(d),
         {'simulation.folder': s.folder},
@@ -1105,54 +2155,31 @@ def _validate_name(data):
 # Validate that the data follows the definitions in the schema (fixup_old_data e.g. directly sets data)
 def _validate_fields(data):
     schema = get_schema(data.simulationType)
-    sch_models = schema['model']
-    sch_enums = schema['enum']
-    for model_name in data.models:
-        if not model_name in sch_models:
+    validators = _field_validators(schema)
+    for model_name, model_data in data.models.items():
+        fields = validators.get(model_name)
+        if not fields:
             continue
-        sch_model = sch_models[model_name]
-        model_data = data.models[model_name]
-        for field_name in model_data:
-            if not field_name in sch_model:
-                continue
-            val = model_data[field_name]
-            if val == '':
+        for field_name, val in model_data.items():
+            f = fields.get(field_name)
+            if f is None or val == '':
                 continue
-            sch_field_info = sch_model[field_name]
-            _validate_enum(val, sch_field_info, sch_enums)
-            _validate_number(val, sch_field_info)
+            _validate_field(val, f, schema['enum'])
 
 
-# Ensure the value of a numeric field falls within the supplied limits (if any)
-# Note that currently the values in enum arrays at the indices below are sometimes
-# used for other purposes, so we return for non-numeric values rather than fail
-def _validate_number(val, sch_field_info):
-    if len(sch_field_info) <= 4:
+def _validate_field(val, validator, sch_enums):
+    """Check val against enum values and numeric limits (see `_field_validators`)"""
+    enum, fmin, fmax, sch_field_info = validator
+    if enum is not None and str(val) not in enum:
+        raise AssertionError(util.err(sch_enums, 'enum value {} not in schema', val))
+    if fmin is None:
         return
-    min = sch_field_info[4]
     try:
         fv = float(val)
-        fmin = float(min)
     except ValueError:
         return
-    if fv < fmin:
+    if fv < fmin or fmax is not None and fv > fmax:
         raise AssertionError(util.err(sch_field_info, 'numeric value {} out of range', val))
-    if len(sch_field_info) > 5:
-        max = sch_field_info[5]
-        try:
-            fmax = float(max)
-        except ValueError:
-            return
-        if fv > fmax:
-            raise AssertionError(util.err(sch_field_info, 'numeric value {} out of range', val))
-
-
-def _validate_enum(val, sch_field_info, sch_enums):
-    type = sch_field_info[1]
-    if not type in sch_enums:
-        return
-    if str(val) not in map(lambda enum: str(enum[0]), sch_enums[type]):
-        raise AssertionError(util.err(sch_enums, 'enum value {} not in schema', val))
 
 
 def _validate_name_uniquify(data, starts_with):
@@ -1191,11 +2218,40 @@ def _user_dir_create():
         str: New user id
     """
     uid = _random_id(user_dir_name())['id']
-    # Must set before calling simulation_dir
+    # Must set before calling simulation_dir. Examples are added
+    # when the user first visits an app (see verify_app_directory).
     _server.session_user(uid)
-    for simulation_type in feature_config.cfg.sim_types:
-        _create_example_and_lib_files(simulation_type)
     return uid
 
 
+def _write_atomic(path, text):
+    """Replace path with text so readers see the old or new file
+
+    The temporary file is in the same directory so the rename is
+    atomic. With cfg.fsync, the data and the rename are flushed to disk.
+
+    Args:
+        path (py.path): file to write
+        text (str): contents
+    """
+    p = str(path)
+    tmp = '{}.tmp{}-{}'.format(p, os.getpid(), threading.current_thread().ident)
+    try:
+        with open(tmp, 'w') as f:
+            f.write(text)
+            if cfg.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.rename(tmp, p)
+    except Exception:
+        pkio.unchecked_remove(tmp)
+        raise
+    if cfg.fsync:
+        fd = os.open(os.path.dirname(p), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
 _init()
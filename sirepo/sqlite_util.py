@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+u"""Stores shared by the server processes on a host
+
+`sirepo.runner_db`, `sirepo.job_history`, and `sirepo.retention` keep
+their state in sqlite files in the db dir.
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+from pykern.pkdebug import pkdc, pkdexc, pkdlog, pkdp
+import contextlib
+import sqlite3
+
+#: Wait this long for another process to release the database
+_LOCK_TIMEOUT_SECS = 10
+
+
+@contextlib.contextmanager
+def transaction(path, lock, immediate=True):
+    """Connect and begin a transaction
+
+    Commits if the block succeeds, else rolls back.
+
+    Args:
+        path (str): database file
+        lock (threading.RLock): serializes access within the process
+        immediate (bool): lock for writing up front so read-modify-write
+            is atomic across processes, else only read [True]
+
+    Yields:
+        sqlite3.Connection: rows are `sqlite3.Row`
+    """
+    with lock:
+        c = sqlite3.connect(path, timeout=_LOCK_TIMEOUT_SECS, isolation_level=None)
+        try:
+            c.row_factory = sqlite3.Row
+            c.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+            try:
+                yield c
+            except Exception:
+                c.execute('ROLLBACK')
+                raise
+            c.execute('COMMIT')
+        finally:
+            c.close()
@@ -14,11 +14,15 @@ import flask
 import flask.testing
 import json
 import re
+import time
 
 
 #: import sirepo.server
 server = None
 
+#: How often `sr_run_wait` polls runStatus
+_RUN_POLL_SECS = 0.5
+
 
 def flask_client(cfg=None):
     """Return FlaskClient with easy access methods.
@@ -119,19 +123,63 @@ class _TestClient(flask.testing.FlaskClient):
         """
         return _req(route_name, params, self.get, raw_response=raw_response)
 
-    def sr_sim_data(self, sim_type, sim_name):
+    def sr_run_sim(self, data, report, timeout=10):
+        """Run report of data and wait for it to complete
+
+        Args:
+            data (dict): from `sr_sim_data`
+            report (str): name of report
+            timeout (float): seconds to wait [10]
+
+        Returns:
+            object: Parsed JSON result of last runStatus
+        """
+        res = self.sr_run_wait(
+            self.sr_post(
+                'runSimulation',
+                dict(
+                    forceRun=True,
+                    models=data.models,
+                    report=report,
+                    simulationId=data.models.simulation.simulationId,
+                    simulationType=data.simulationType,
+                ),
+            ),
+            timeout,
+        )
+        pkunit.pkeq('completed', res.state, '{}: did not complete: {}', report, res)
+        return res
+
+    def sr_run_wait(self, res, timeout=10):
+        """Poll runStatus until the job is no longer pending or running
+
+        Args:
+            res (dict): Parsed JSON result of runSimulation or runStatus
+            timeout (float): seconds to wait [10]
+
+        Returns:
+            object: Parsed JSON result of last runStatus
+        """
+        for _ in range(int(timeout / _RUN_POLL_SECS)):
+            if res.state not in ('pending', 'running'):
+                return res
+            time.sleep(_RUN_POLL_SECS)
+            res = self.sr_post('runStatus', res.nextRequest)
+        pkunit.pkfail('runStatus: did not stop after {}s: {}', timeout, res)
+
+    def sr_sim_data(self, sim_type, sim_name=None):
         """Return simulation data by name
 
         Args:
             sim_type (str): app
-            sim_name (str): case sensitive name
+            sim_name (str): case sensitive name [first simulation]
 
         Returns:
             dict: data
         """
         data = self.sr_post('listSimulations', {'simulationType': sim_type})
         for d in data:
-            if d['name'] == sim_name:
+            if sim_name is None or d['name'] == sim_name:
                 break
         else:
             pkunit.pkfail('{}: not found in ', sim_name, pkdpretty(data))
@@ -12,10 +12,10 @@ from sirepo import simulation_db
 from sirepo.template import elegant_command_importer
 from sirepo.template import elegant_common
 from sirepo.template import elegant_lattice_importer
+from sirepo.template import elegant_rpn
 from sirepo.template import template_common, sdds_util
 import ast
 import glob
-import math
 import numpy as np
 import os
 import os.path
@@ -73,8 +73,6 @@ _PLOT_TITLE = {
 
 _REPORT_STYLE_FIELDS = ['colorMap', 'notes']
 
-_SDDS_INDEX = 0
-
 _SDDS_DOUBLE_TYPE = 1
 
 _SDDS_STRING_TYPE = 7
@@ -111,6 +109,10 @@ def background_percent_complete(report, run_dir, is_running):
     }
 
 
+def background_progress_files(report, run_dir):
+    return [run_dir.join(ELEGANT_LOG_FILE)]
+
+
 def copy_related_files(data, source_path, target_path):
     # copy any simulation output
     if os.path.isdir(str(py.path.local(source_path).join('animation'))):
@@ -122,55 +124,46 @@ def copy_related_files(data, source_path, target_path):
 
 def extract_report_data(xFilename, y2Filename, y3Filename, data, page_index):
     xfield = data['x'] if 'x' in data else data[_X_FIELD]
-    # x, column_names, x_def, err
-    x_col = sdds_util.extract_sdds_column(xFilename, xfield, page_index)
-    if x_col['err']:
-        return x_col['err']
-    x = x_col['values']
-    if _report_type_for_column(x_col['column_names']) == 'parameter':
+    page_info = sdds_util.read_page_index(xFilename)
+    if page_info and _report_type_for_column(page_info.column_names) == 'parameter':
         # parameter plot
+        #TODO(pjm): y2Filename, y3Filename are not currently used. Would require rescaling x value across files.
+        yfields = [data[f] for f in ('y1', 'y2', 'y3') if data[f] != 'none' and data[f] != ' ']
+        cols = sdds_util.extract_sdds_columns(xFilename, [xfield] + yfields, page_index)
+        if cols['err']:
+            return cols['err']
+        x = cols['values'][xfield]
         plots = []
-        filename = {
-            'y1': xFilename,
-            #TODO(pjm): y2Filename, y3Filename are not currently used. Would require rescaling x value across files.
-            'y2': xFilename,
-            'y3': xFilename,
-        }
-        for f in ('y1', 'y2', 'y3'):
-            if data[f] == 'none' or data[f] == ' ':
-                continue
-            yfield = data[f]
-            y_col = sdds_util.extract_sdds_column(filename[f], yfield, page_index)
-            if y_col['err']:
-                return y_col['err']
-            y = y_col['values']
+        for yfield in yfields:
             plots.append({
-                'points': y,
-                'label': _field_label(yfield, y_col['column_def'][1]),
+                'points': cols['values'][yfield].tolist(),
+                'label': _field_label(yfield, cols['column_defs'][yfield][1]),
             })
         return {
             'title': '',
-            'x_range': [min(x), max(x)],
+            'x_range': [float(x.min()), float(x.max())],
             'y_label': '',
-            'x_label': _field_label(xfield, x_col['column_def'][1]),
-            'x_points': x,
+            'x_label': _field_label(xfield, cols['column_defs'][xfield][1]),
+            'x_points': x.tolist(),
             'plots': plots,
             'y_range': template_common.compute_plot_color_and_range(plots),
         }
     yfield = data['y1'] if 'y1' in data else data['y']
-    y_col = sdds_util.extract_sdds_column(xFilename, yfield, page_index)
-    if y_col['err']:
-        return y_col['err']
-    y = y_col['values']
+    cols = sdds_util.extract_sdds_columns(xFilename, [xfield, yfield], page_index)
+    if cols['err']:
+        return cols['err']
     bins = data['histogramBins']
-    hist, edges = np.histogramdd([x, y], template_common.histogram_bins(bins))
+    hist, edges = np.histogramdd(
+        [cols['values'][xfield], cols['values'][yfield]],
+        template_common.histogram_bins(bins),
+    )
     return {
         'x_range': [float(edges[0][0]), float(edges[0][-1]), len(hist)],
         'y_range': [float(edges[1][0]), float(edges[1][-1]), len(hist[0])],
-        'x_label': _field_label(xfield, x_col['column_def'][1]),
-        'y_label': _field_label(yfield, y_col['column_def'][1]),
+        'x_label': _field_label(xfield, cols['column_defs'][xfield][1]),
+        'y_label': _field_label(yfield, cols['column_defs'][yfield][1]),
         'title': _plot_title(xfield, yfield, page_index),
-        'z_matrix': hist.T.tolist(),
+        'z_matrix': hist.T,
     }
 
 
@@ -284,16 +277,16 @@ def get_application_data(data):
             data['input_type'] = _sdds_beam_type_from_file(data['input_file'])
         return data
     if data['method'] == 'rpn_value':
-        value, error = _parse_expr(data['value'], _variables_to_postfix(data['variables']))
+        value, error = _parse_expr(data['value'], _rpn_evaluator(data['variables']))
         if error:
             data['error'] = error
         else:
             data['result'] = value
         return data
     if data['method'] == 'recompute_rpn_cache_values':
-        variables = _variables_to_postfix(data['variables'])
+        evaluator = _rpn_evaluator(data['variables'])
         for k in data['cache']:
-            value, error = _parse_expr(k, variables)
+            value, error = _parse_expr(k, evaluator)
             if not error:
                 data['cache'][k] = value
         return data
@@ -455,15 +448,16 @@ def prepare_for_client(data):
     # evaluate rpn values into model.rpnCache
     cache = {}
     data['models']['rpnCache'] = cache
-    variables = _variables_to_postfix(data['models']['rpnVariables'])
+    # one evaluator for all fields, so each variable is computed once
+    evaluator = _rpn_evaluator(data['models']['rpnVariables'])
     state = {
         'cache': cache,
-        'rpnVariables': variables,
+        'evaluator': evaluator,
     }
     _iterate_model_fields(data, state, _iterator_rpn_values)
 
     for rpn_var in data['models']['rpnVariables']:
-        v, err = _parse_expr(rpn_var['value'], variables)
+        v, err = _parse_expr(rpn_var['value'], evaluator)
         if not err:
             cache[rpn_var['name']] = v
             if elegant_lattice_importer.is_rpn_value(rpn_var['value']):
@@ -506,15 +500,15 @@ def validate_file(file_type, path):
     err = None
     if file_type == 'bunchFile-sourceFile':
         err = 'expecting sdds file with (x, xp, y, yp, t, p) or (r, pr, pz, t, pphi) columns'
-        if sdds.sddsdata.InitializeInput(_SDDS_INDEX, path) == 1:
-            beam_type = _sdds_beam_type(sdds.sddsdata.GetColumnNames(_SDDS_INDEX))
-            if beam_type in ('elegant', 'spiffe'):
-                sdds.sddsdata.ReadPage(_SDDS_INDEX)
-                if len(sdds.sddsdata.GetColumn(_SDDS_INDEX, 0)) > 0:
-                    err = None
-                else:
-                    err = 'sdds file contains no rows'
-        sdds.sddsdata.Terminate(_SDDS_INDEX)
+        with sdds_util.dataset_index() as i:
+            if sdds.sddsdata.InitializeInput(i, path) == 1:
+                beam_type = _sdds_beam_type(sdds.sddsdata.GetColumnNames(i))
+                if beam_type in ('elegant', 'spiffe'):
+                    sdds.sddsdata.ReadPage(i)
+                    if len(sdds.sddsdata.GetColumn(i, 0)) > 0:
+                        err = None
+                    else:
+                        err = 'sdds file contains no rows'
     return err
 
 
@@ -754,47 +748,29 @@ def _file_info(filename, run_dir, id, output_index):
                 'lastUpdateTime': int(os.path.getmtime(str(file_path))),
             }
         return None
-    try:
-        if sdds.sddsdata.InitializeInput(_SDDS_INDEX, str(file_path)) != 1:
-            return None
-        column_names = sdds.sddsdata.GetColumnNames(_SDDS_INDEX)
-        plottable_columns = []
-        double_column_count = 0
-        for col in column_names:
-            col_type = sdds.sddsdata.GetColumnDefinition(_SDDS_INDEX, col)[4]
-            if col_type < _SDDS_STRING_TYPE:
-                plottable_columns.append(col)
-            if col_type == _SDDS_DOUBLE_TYPE:
-                double_column_count += 1
-        parameter_names = sdds.sddsdata.GetParameterNames(_SDDS_INDEX)
-        parameters = dict([(p, []) for p in parameter_names])
-        page_count = 0
-        row_counts = []
-        while True:
-            page = sdds.sddsdata.ReadPage(_SDDS_INDEX)
-            if page <= 0:
-                break
-            row_counts.append(sdds.sddsdata.RowCount(_SDDS_INDEX))
-            page_count += 1
-            for i, p in enumerate(parameter_names):
-                parameters[p].append(_safe_sdds_value(sdds.sddsdata.GetParameter(_SDDS_INDEX, i)))
-        return {
-            'isAuxFile': False if double_column_count > 1 else True,
-            'filename': filename,
-            'id': '{}-{}'.format(id, output_index),
-            'rowCounts': row_counts,
-            'pageCount': page_count,
-            'columns': column_names,
-            'parameters': parameters,
-            'parameterDefinitions': _parameter_definitions(parameters),
-            'plottableColumns': plottable_columns,
-            'lastUpdateTime': int(os.path.getmtime(str(file_path))),
-        }
-    finally:
-        try:
-            sdds.sddsdata.Terminate(_SDDS_INDEX)
-        except Exception:
-            pass
+    page_info = sdds_util.read_page_index(str(file_path))
+    if not page_info:
+        return None
+    plottable_columns = []
+    double_column_count = 0
+    for col in page_info.column_names:
+        col_type = page_info.column_defs[col][4]
+        if col_type < _SDDS_STRING_TYPE:
+            plottable_columns.append(col)
+        if col_type == _SDDS_DOUBLE_TYPE:
+            double_column_count += 1
+    return {
+        'isAuxFile': False if double_column_count > 1 else True,
+        'filename': filename,
+        'id': '{}-{}'.format(id, output_index),
+        'rowCounts': page_info.row_counts,
+        'pageCount': len(page_info.row_counts),
+        'columns': page_info.column_names,
+        'parameters': page_info.parameters,
+        'parameterDefinitions': _parameter_definitions(page_info.parameter_defs),
+        'plottableColumns': plottable_columns,
+        'lastUpdateTime': int(os.path.getmtime(str(file_path))),
+    }
 
 
 def _find_first_command(data, command_type):
@@ -1040,7 +1016,7 @@ def _iterator_lattice_elements(state, model, element_schema=None, field_name=Non
 def _iterator_rpn_values(state, model, element_schema=None, field_name=None):
     if element_schema:
         if element_schema[1] == 'RPNValue' and elegant_lattice_importer.is_rpn_value(model[field_name]):
-            v, err = _parse_expr(model[field_name], state['rpnVariables'])
+            v, err = _parse_expr(model[field_name], state['evaluator'])
             if not err:
                 state['cache'][model[field_name]] = v
 
@@ -1075,20 +1051,20 @@ def _output_info(run_dir, data):
     return res
 
 
-def _parameter_definitions(parameters):
+def _parameter_definitions(parameter_defs):
     """Convert parameters to useful definitions"""
     res = {}
-    for p in parameters:
+    for p in parameter_defs:
         res[p] = dict(zip(
             ['symbol', 'units', 'description', 'format_string', 'type', 'fixed_value'],
-            sdds.sddsdata.GetParameterDefinition(_SDDS_INDEX, p),
+            parameter_defs[p],
         ))
     return res
 
 
-def _parse_expr(expr, variables):
+def _parse_expr(expr, evaluator):
     """If not infix, default to rpn"""
-    return elegant_lattice_importer.parse_rpn_value(_infix_to_postfix(expr), variables)
+    return evaluator.eval(_infix_to_postfix(expr))
 
 
 def _parse_expr_infix(expr):
@@ -1154,10 +1130,8 @@ def _report_type_for_column(columns):
     return 'parameter'
 
 
-def _safe_sdds_value(v):
-    if isinstance(v, float) and (math.isinf(v) or math.isnan(v)):
-        return 0
-    return v
+def _rpn_evaluator(rpn_variables):
+    return elegant_rpn.Evaluator(_variables_to_postfix(rpn_variables))
 
 
 def _sdds_beam_type(column_names):
@@ -1171,9 +1145,9 @@ def _sdds_beam_type(column_names):
 def _sdds_beam_type_from_file(filename):
     res = ''
     path = str(simulation_db.simulation_lib_dir(SIM_TYPE).join(filename))
-    if sdds.sddsdata.InitializeInput(_SDDS_INDEX, path) == 1:
-        res = _sdds_beam_type(sdds.sddsdata.GetColumnNames(_SDDS_INDEX))
-    sdds.sddsdata.Terminate(_SDDS_INDEX)
+    with sdds_util.dataset_index() as i:
+        if sdds.sddsdata.InitializeInput(i, path) == 1:
+            res = _sdds_beam_type(sdds.sddsdata.GetColumnNames(i))
     return res
 
 
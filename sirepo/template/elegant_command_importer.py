@@ -12,6 +12,7 @@ from sirepo import simulation_db
 from sirepo.template import elegant_command_parser
 from sirepo.template import elegant_common
 from sirepo.template import elegant_lattice_importer
+from sirepo.template import elegant_rpn
 
 _SCHEMA = simulation_db.get_schema('elegant')
 
@@ -33,11 +34,12 @@ def import_file(text):
         raise IOError('no commands found in file')
     _verify_lattice_name(commands)
     # iterate commands, validate values and set defaults from schema
+    evaluator = elegant_rpn.Evaluator([])
     for cmd in commands:
         cmd_type = cmd['_type']
         if not cmd_type in _ELEGANT_TYPES:
             raise IOError('unknown command: {}'.format(cmd_type))
-        elegant_lattice_importer.validate_fields(cmd, {}, {})
+        elegant_lattice_importer.validate_fields(cmd, {}, evaluator)
     data = simulation_db.default_data(elegant_common.SIM_TYPE)
     #TODO(pjm) javascript needs to set bunch, bunchSource, bunchFile values from commands
     data['models']['commands'] = commands
@@ -10,6 +10,7 @@ from pykern.pkdebug import pkdc, pkdlog, pkdp
 from sirepo import simulation_db
 from sirepo.template import elegant_common
 from sirepo.template import elegant_lattice_parser
+from sirepo.template import elegant_rpn
 import json
 import math
 import ntpath
@@ -57,11 +58,12 @@ def import_file(text, data=None):
         default_beamline_id = name_to_id[models['default_beamline_name']]
     element_names = {}
     rpn_cache = {}
+    evaluator = elegant_rpn.Evaluator(models['rpnVariables'])
 
     for el in models['elements']:
         el['type'] = _validate_type(el, element_names)
         element_names[el['name'].upper()] = el
-        validate_fields(el, rpn_cache, models['rpnVariables'])
+        validate_fields(el, rpn_cache, evaluator)
 
     for bl in models['beamlines']:
         bl['items'] = _validate_beamline(bl, name_to_id, element_names)
@@ -105,34 +107,12 @@ def max_id(data):
 
 
 def parse_rpn_value(value, variable_list):
-    variables = {x['name']: x['value'] for x in variable_list}
-    depends = build_variable_dependency(value, variables, [])
-    #TODO(robnagler) scan variable values for strings. Need to be parsable
-    var_list = ' '.join(map(lambda x: '{} sto {}'.format(variables[x], x), depends))
-    #TODO(pjm): security - need to scrub field value
-    #     execn  send top of string stack to UNIX and put result on numerical stack
-    #     execs     send top of string stack to UNIX and put output on string stack
-    # csh                       start and enter C shell subprocess
-    # cshs                       send top of string stack to C shell
-    # gets                       get string from input file
-    # seems like this would be bad, because you could construct a string that could be executed
-    # mudf    make user defined function from string stack (name commands mudf)
-    # open                       open input/output file
-    # puts                       put string to file
-    # sleep                       sleep for number of seconds
-    # @                       push command input file
-    pkdc('rpn variables={} expr="{}"', var_list, value)
-    out = elegant_common.subprocess_output(['rpnl', '{} {}'.format(var_list, value)])
-    if out is None:
-        return None, 'invalid'
-    if len(out):
-        return float(out.strip()), None
-    return None, 'empty'
-
-
-def validate_fields(el, rpn_cache, rpn_variables):
+    return elegant_rpn.Evaluator(variable_list).eval(value)
+
+
+def validate_fields(el, rpn_cache, evaluator):
     for field in el.copy():
-        _validate_field(el, field, rpn_cache, rpn_variables)
+        _validate_field(el, field, rpn_cache, evaluator)
     model_name = _model_name_for_data(el)
     for field in _SCHEMA['model'][model_name]:
         if field not in el:
@@ -289,7 +269,7 @@ def _validate_enum(el, field, field_type):
         raise IOError('{} unknown value: "{}"'.format(field, search))
 
 
-def _validate_field(el, field, rpn_cache, rpn_variables):
+def _validate_field(el, field, rpn_cache, evaluator):
     if field in ['_id', '_type']:
         return
     if '_type' not in el and field == 'type':
@@ -304,7 +284,7 @@ def _validate_field(el, field, rpn_cache, rpn_variables):
     elif field_type == "InputFileXY":
         _validate_input_file(el, field)
     elif (field_type == 'RPNValue' or field_type == 'RPNBoolean') and is_rpn_value(el[field]):
-        _validate_rpn_field(el, field, rpn_cache, rpn_variables)
+        _validate_rpn_field(el, field, rpn_cache, evaluator)
     elif field_type.endswith('StringArray'):
         _validate_string_array_field(el, field)
     elif field_type in _SCHEMA['enum']:
@@ -325,7 +305,7 @@ def _validate_input_file(el, field):
         el[field] = fullname
 
 
-def _validate_rpn_field(el, field, rpn_cache, rpn_variables):
+def _validate_rpn_field(el, field, rpn_cache, evaluator):
     if '_type' in el:
         return
     #TODO(pjm): doesn't reach this if?
@@ -336,7 +316,7 @@ def _validate_rpn_field(el, field, rpn_cache, rpn_variables):
         m = re.search('\{\s*rpnl\s+(.*)\}$', el[field])
         if m:
             el[field] = m.group(1)
-    value, error = parse_rpn_value(el[field], rpn_variables)
+    value, error = evaluator.eval(el[field])
     if error:
         raise IOError('invalid rpn: "{}"'.format(el[field]))
     rpn_cache[el[field]] = value
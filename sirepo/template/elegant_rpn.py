@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+u"""elegant rpn expression evaluator
+
+Evaluates the postfix expressions which elegant (and ``rpnl``) accept
+without running a subprocess. The user defined functions and constants
+are read from the same ``defns.rpn`` which is passed to elegant.
+
+Commands which read or write files or run programs (``puts``, ``execs``,
+``mudf``, etc.) are not supported so they result in an error.
+
+Like rpnl, the math functions return inf or nan (C semantics) instead of
+failing, except where rpn checks the arguments (division by zero, sqrt
+of a negative number, a negative number to a fractional power).
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+from pykern import pkio
+from pykern.pkdebug import pkdc, pkdlog, pkdp
+from sirepo.template import elegant_common
+import math
+import operator
+import re
+
+#: Functions of the top two values on the stack (x is below y)
+_BINARY = {
+    '*': operator.mul,
+    '+': operator.add,
+    '-': operator.sub,
+    '/': operator.truediv,
+    # rpn's atan2 takes y from below x
+    'atan2': lambda x, y: math.atan2(y, x),
+    'pow': lambda x, y: _c_pow(x, y),
+}
+
+#: Functions of the top value on the stack
+_UNARY = {
+    'acos': lambda x: _c_inverse_trig(math.acos, x),
+    'asin': lambda x: _c_inverse_trig(math.asin, x),
+    'atan': math.atan,
+    'cos': math.cos,
+    'erf': math.erf,
+    'erfc': math.erfc,
+    'exp': lambda x: _c_exp(x),
+    'int': lambda x: float(int(x)),
+    'ln': lambda x: _c_ln(x),
+    'sin': math.sin,
+    'sqr': lambda x: x * x,
+    'sqrt': math.sqrt,
+}
+
+#: Comparisons of the top two values which push on the logical stack
+_COMPARE = {
+    '<': operator.lt,
+    '==': operator.eq,
+    '>': operator.gt,
+}
+
+#: Memory values defined by defns.rpn
+_CONSTANTS = {}
+
+#: C's HUGE_VAL and NAN, which rpn returns instead of failing
+_INF = float('inf')
+
+_NAN = float('nan')
+
+#: Format rpnl uses to print the result
+_FORMAT = '{:.15g}'
+
+#: user defined function recursion limit
+_MAX_DEPTH = 200
+
+#: Numeric literal
+_NUMBER_RE = re.compile(r'^[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?$')
+
+#: Number at the start of a token, which rpn reads like scanf
+_NUMBER_PREFIX_RE = re.compile(r'^[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?')
+
+#: Splits expressions into tokens, keeping quoted strings together
+_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|\S+')
+
+#: User defined functions (udf) from defns.rpn
+_UDF = {}
+
+
+class Evaluator(object):
+    """Evaluate expressions with a set of rpn variables
+
+    Variables are evaluated once, when first referenced, so all the
+    fields of a simulation can be evaluated with one instance.
+
+    Args:
+        variables (list): dicts with name and (postfix) value
+    """
+
+    def __init__(self, variables):
+        self._defs = dict((v['name'], v['value']) for v in variables)
+        self._memory = {}
+        self._pending = set()
+
+    def eval(self, expr):
+        """Evaluate postfix expression
+
+        Args:
+            expr (str): postfix expression
+
+        Returns:
+            (float, str): value and None, or None and error
+        """
+        try:
+            s = _Stacks()
+            self._run(_tokens(expr), s, 0)
+        except (_Error, ArithmeticError, ValueError) as e:
+            pkdc('{}: error: {}', expr, e)
+            return None, 'invalid'
+        if not s.num:
+            return None, 'empty'
+        # rpnl prints the result, which rounds the value
+        return float(_FORMAT.format(s.num[-1])), None
+
+    def _recall(self, name):
+        if name in self._memory:
+            return self._memory[name]
+        if name in self._defs:
+            if name in self._pending:
+                raise _Error('{}: circular variable definition', name)
+            self._pending.add(name)
+            try:
+                s = _Stacks()
+                self._run(_tokens(self._defs[name]), s, 0)
+                self._memory[name] = s.top()
+            finally:
+                self._pending.discard(name)
+            return self._memory[name]
+        if name in _CONSTANTS:
+            return _CONSTANTS[name]
+        m = _NUMBER_PREFIX_RE.search(name)
+        if m:
+            # trailing text is ignored, e.g. "1;"
+            return float(m.group(0))
+        raise _Error('{}: unknown token', name)
+
+    def _run(self, tokens, s, depth):
+        if depth > _MAX_DEPTH:
+            raise _Error('{}: user defined function recursion too deep', depth)
+        i = 0
+        while i < len(tokens):
+            t = tokens[i]
+            i += 1
+            if _NUMBER_RE.search(t):
+                s.num.append(float(t))
+            elif t.startswith('"'):
+                s.string.append(t[1:-1])
+            elif t == '?':
+                if not s.logical:
+                    raise _Error('?: logical stack empty')
+                if not s.logical.pop():
+                    i = _skip(tokens, i, want_else=True)
+            elif t == ':':
+                # end of true branch
+                i = _skip(tokens, i, want_else=False)
+            elif t == '$':
+                pass
+            elif t == 'sto':
+                if i >= len(tokens):
+                    raise _Error('sto: missing name')
+                self._memory[tokens[i]] = s.top()
+                i += 1
+            elif t in _BINARY:
+                y = s.pop()
+                x = s.pop()
+                s.num.append(_BINARY[t](x, y))
+            elif t in _UNARY:
+                s.num.append(_UNARY[t](s.pop()))
+            elif t in _COMPARE:
+                s.top(2)
+                s.logical.append(_COMPARE[t](s.num[-2], s.num[-1]))
+            elif t == '!':
+                s.logical.append(not s.logical_pop())
+            elif t == '&&':
+                y = s.logical_pop()
+                s.logical.append(s.logical_pop() and y)
+            elif t == '||':
+                y = s.logical_pop()
+                s.logical.append(s.logical_pop() or y)
+            elif t == '=':
+                s.num.append(s.top())
+            elif t == 'swap':
+                s.top(2)
+                s.num[-1], s.num[-2] = s.num[-2], s.num[-1]
+            elif t == 'pop':
+                s.pop()
+            elif t == 'rup':
+                s.num.insert(0, s.pop())
+            elif t == 'rdn':
+                s.top()
+                s.num.append(s.num.pop(0))
+            elif t == 'cle':
+                del s.num[:]
+            elif t == 'stlv':
+                s.num.append(float(len(s.num)))
+            elif t in _UDF:
+                self._run(_UDF[t], s, depth + 1)
+            else:
+                s.num.append(self._recall(t))
+
+
+class _Error(Exception):
+    def __init__(self, fmt, *args):
+        super(_Error, self).__init__(fmt.format(*args))
+
+
+class _Stacks(object):
+    """Numeric, logical, and string stacks of an evaluation"""
+
+    def __init__(self):
+        self.logical = []
+        self.num = []
+        self.string = []
+
+    def logical_pop(self):
+        if not self.logical:
+            raise _Error('logical stack empty')
+        return self.logical.pop()
+
+    def pop(self):
+        self.top()
+        return self.num.pop()
+
+    def top(self, count=1):
+        if len(self.num) < count:
+            raise _Error('too few values on stack')
+        return self.num[-1]
+
+
+def _c_exp(x):
+    try:
+        return math.exp(x)
+    except OverflowError:
+        return _INF
+
+
+def _c_inverse_trig(f, x):
+    return f(x) if -1.0 <= x <= 1.0 else _NAN
+
+
+def _c_ln(x):
+    if x > 0:
+        return math.log(x)
+    return -_INF if x == 0 else _NAN
+
+
+def _c_pow(x, y):
+    if x < 0 and y != int(y):
+        raise _Error('pow: negative number to a fractional power')
+    try:
+        return math.pow(x, y)
+    except OverflowError:
+        return -_INF if x < 0 and y % 2 == 1 else _INF
+    except ValueError:
+        # zero to a negative power
+        return _INF
+
+
+def _init():
+    """Load udfs and constants from defns.rpn"""
+    e = Evaluator([])
+    body = None
+    lines = iter(pkio.read_text(elegant_common.RESOURCE_DIR.join('defns.rpn')).splitlines())
+    for l in lines:
+        l = l.strip()
+        if l.startswith('/*'):
+            continue
+        if body is not None:
+            # udf bodies end at a blank line
+            if l:
+                body.extend(_tokens(l))
+                continue
+            body = None
+        if not l:
+            continue
+        if l == 'udf':
+            body = _UDF[next(lines).strip()] = []
+            continue
+        try:
+            e._run(_tokens(l), _Stacks(), 0)
+        except (_Error, ArithmeticError, ValueError) as err:
+            pkdlog('{}: defns.rpn error: {}', l, err)
+    _CONSTANTS.update(e._memory)
+
+
+def _skip(tokens, i, want_else):
+    """Skip to the matching ":" (if want_else) or "$"
+
+    Args:
+        tokens (list): being executed
+        i (int): index after "?" or ":"
+        want_else (bool): stop after ":" at this level
+
+    Returns:
+        int: index to continue execution
+    """
+    depth = 0
+    while i < len(tokens):
+        t = tokens[i]
+        i += 1
+        if t == '?':
+            depth += 1
+        elif t == '$':
+            if depth == 0:
+                return i
+            depth -= 1
+        elif t == ':' and depth == 0 and want_else:
+            return i
+    return i
+
+
+def _tokens(expr):
+    return _TOKEN_RE.findall(str(expr))
+
+
+_init()
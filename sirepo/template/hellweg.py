@@ -63,6 +63,11 @@ def background_percent_complete(report, run_dir, is_running):
     }
 
 
+def background_progress_files(report, run_dir):
+    # progress is not reported while running
+    return []
+
+
 def extract_beam_histrogram(report, run_dir, frame):
     beam_info = hellweg_dump_reader.beam_info(_dump_file(run_dir), frame)
     points = hellweg_dump_reader.get_points(beam_info, report.reportType)
@@ -90,7 +95,7 @@ def extract_beam_report(report, run_dir, frame):
         'x_label': hellweg_dump_reader.get_label(x),
         'y_label': hellweg_dump_reader.get_label(y),
         'title': _report_title(report.reportType, 'BeamReportType', beam_info),
-        'z_matrix': hist.T.tolist(),
+        'z_matrix': hist.T,
         'z_label': 'Number of Particles',
         'summaryData': _summary_text(run_dir),
     }
@@ -8,27 +8,30 @@ from __future__ import absolute_import, division, print_function
 
 import ctypes
 import math
+import numpy as np
+import os
 
 _LIVE_PARTICLE = 0
 _LOSS_VALUES = ['live', 'radius_lost', 'phase_lost', 'bz_lost', 'br_lost', 'bth_lost', 'beta_lost', 'step_lost']
 _STRUCTURE_VALUES = ['ksi', 'z', 'a', 'rp', 'alpha', 'sbeta', 'ra', 'rb', 'b_ext', 'num', 'e0', 'ereal', 'prf', 'pbeam', 'bbeta', 'wav', 'wmax', 'xb', 'yb', 'er', 'ex', 'ey', 'enr', 'enx', 'eny', 'e4d', 'e4dn', 'et', 'ent']
 _We0 = 0.5110034e6
 
+#: Particle values, vectorized over arrays of TParticle records
 _BEAM_PARAMETER = {
-    'r': lambda p, lmb: abs(p.r * lmb),
+    'r': lambda p, lmb: np.abs(p.r * lmb),
     'th': lambda p, lmb: p.Th * 180.0 / math.pi,
-    'x': lambda p, lmb: p.r * math.cos(p.Th) * lmb,
-    'y': lambda p, lmb: p.r * math.sin(p.Th) * lmb,
-    'br': lambda p, lmb: math.copysign(p.beta.r, p.r),
+    'x': lambda p, lmb: p.r * np.cos(p.Th) * lmb,
+    'y': lambda p, lmb: p.r * np.sin(p.Th) * lmb,
+    'br': lambda p, lmb: np.copysign(p.beta.r, p.r),
     'bth': lambda p, lmb: p.beta.th,
-    'bx': lambda p, lmb: p.beta.r * math.cos(p.Th) - p.beta.th * math.sin(p.Th) * lmb,
-    'by': lambda p, lmb: p.beta.r * math.sin(p.Th) + p.beta.th * math.cos(p.Th) * lmb,
+    'bx': lambda p, lmb: p.beta.r * np.cos(p.Th) - p.beta.th * np.sin(p.Th) * lmb,
+    'by': lambda p, lmb: p.beta.r * np.sin(p.Th) + p.beta.th * np.cos(p.Th) * lmb,
     'bz': lambda p, lmb: p.beta.z,
-    'ar': lambda p, lmb: math.atan2(p.beta.r, p.beta0),
-    'ath': lambda p, lmb: math.atan2(p.beta.th, p.beta0),
-    'ax': lambda p, lmb: math.atan2(p.beta.r * math.cos(p.Th) - p.beta.th * math.sin(p.Th) * lmb, p.beta.z),
-    'ay': lambda p, lmb: math.atan2(p.beta.r * math.sin(p.Th) + p.beta.th * math.cos(p.Th) * lmb, p.beta.z),
-    'az': lambda p, lmb: 0,
+    'ar': lambda p, lmb: np.arctan2(p.beta.r, p.beta0),
+    'ath': lambda p, lmb: np.arctan2(p.beta.th, p.beta0),
+    'ax': lambda p, lmb: np.arctan2(p.beta.r * np.cos(p.Th) - p.beta.th * np.sin(p.Th) * lmb, p.beta.z),
+    'ay': lambda p, lmb: np.arctan2(p.beta.r * np.sin(p.Th) + p.beta.th * np.cos(p.Th) * lmb, p.beta.z),
+    'az': lambda p, lmb: np.zeros_like(p.r),
     'phi': lambda p, lmb: p.phi * 180.0 / math.pi,
     'zrel': lambda p, lmb: lmb * p.phi / (2 * math.pi),
     'z0': lambda p, lmb: p.z,
@@ -168,36 +171,14 @@ def beam_header(filename):
 
 
 def beam_info(filename, idx):
-    info = {}
-    with open (filename, 'rb') as f:
-        header = THeader()
-        assert f.readinto(header) == ctypes.sizeof(header)
-        info['Header'] = header
-        structure = TStructure()
-        size = ctypes.sizeof(structure)
-        if idx > 0:
-            f.seek(idx * size, 1)
-        assert f.readinto(structure) == size
-        info['Structure'] = structure
-        if idx < header.NPoints - 1:
-            f.seek((header.NPoints - idx - 1) * size, 1)
-        beam_header = TBeamHeader()
-        size = ctypes.sizeof(beam_header) + ctypes.sizeof(TParticle()) * header.NParticles
-        if idx > 0:
-            f.seek(idx * size, 1)
-        assert f.readinto(beam_header) == ctypes.sizeof(beam_header)
-        info['BeamHeader'] = beam_header
-        particles = []
-        for _ in xrange(header.NParticles):
-            p = TParticle()
-            assert f.readinto(p) == ctypes.sizeof(p)
-            particles.append(p)
-        info['Particles'] = particles
-        # ensure the expected bytes are present
-        if idx < header.NPoints - 1:
-            f.seek((header.NPoints - idx - 1) * (ctypes.sizeof(beam_header) + ctypes.sizeof(p) * header.NParticles), 1)
-        assert f.readinto(header) == 0
-    return info
+    dump = _dump(filename)
+    beam = dump.Beam[idx]
+    return {
+        'Header': dump.Header,
+        'Structure': dump.Structure[idx],
+        'BeamHeader': beam.BeamHeader,
+        'Particles': beam.Particles.view(np.recarray),
+    }
 
 
 def get_label(field):
@@ -218,14 +199,11 @@ def get_parameter_title(field):
 
 
 def get_points(info, field):
-    res = []
-    fn = _BEAM_PARAMETER[field]
-    lmb = info['BeamHeader'].beam_lmb
-
-    for p in info['Particles']:
-        if p.lost == _LIVE_PARTICLE:
-            res.append(fn(p, lmb))
-    return res
+    p = info['Particles']
+    return _BEAM_PARAMETER[field](
+        p[p.lost == _LIVE_PARTICLE],
+        info['BeamHeader'].beam_lmb,
+    )
 
 
 def parameter_index(name):
@@ -233,62 +211,62 @@ def parameter_index(name):
 
 
 def particle_info(filename, field, count):
-    info = {}
-    with open (filename, 'rb') as f:
-        header = THeader()
-        assert f.readinto(header) == ctypes.sizeof(header)
-        info['Header'] = header
-        if count > header.NPoints:
-            count = header.NPoints
-        z_values = []
-        yfn = _BEAM_PARAMETER[field]
-        zfn = _STRUCTURE_PARAMETER['z']
-        for _ in xrange(header.NPoints):
-            structure = TStructure()
-            assert f.readinto(structure) == ctypes.sizeof(structure)
-            z_values.append(zfn(structure))
-        info['z_values'] = z_values
-        beam_header_size = ctypes.sizeof(TBeamHeader())
-        particle_size = ctypes.sizeof(TParticle())
-        y_map = {}
-        indices = []
-        for i in xrange(count):
-            idx = int(round((i * header.NParticles) / count))
-            y_map[idx] = []
-            indices.append(idx)
-        y_range = None
-
-        for _ in xrange(header.NPoints):
-            beam_header = TBeamHeader()
-            assert f.readinto(beam_header) == beam_header_size
-            lmb = beam_header.beam_lmb
-            pi = 0
-            for idx in indices:
-                assert idx >= pi
-                if idx > pi:
-                    f.seek((idx - pi) * particle_size, 1)
-                p = TParticle()
-                assert f.readinto(p) == particle_size
-                if p.lost == _LIVE_PARTICLE:
-                    v = yfn(p, lmb)
-                    y_map[idx].append(v)
-                    if y_range:
-                        if v < y_range[0]:
-                            y_range[0] = v
-                        elif v > y_range[1]:
-                            y_range[1] = v
-                    else:
-                        y_range = [v, v]
-                pi = idx + 1
-            if pi < header.NParticles:
-                f.seek((header.NParticles - pi) * particle_size, 1)
-        assert f.readinto(header) == 0
-        y_values = []
-        for idx in sorted(y_map.keys()):
-            y_values.append(y_map[idx])
-        info['y_values'] = y_values
-        info['y_range'] = y_range
-    return info
+    dump = _dump(filename)
+    header = dump.Header
+    if count > header.NPoints:
+        count = header.NPoints
+    indices = sorted(set(
+        int(round((i * header.NParticles) / count)) for i in xrange(count)
+    ))
+    beams = dump.Beam.view(np.recarray)
+    # [point, sampled particle]
+    p = beams.Particles[:, indices]
+    y = _BEAM_PARAMETER[field](p, beams.BeamHeader.beam_lmb[:, np.newaxis])
+    live = p.lost == _LIVE_PARTICLE
+    y_range = None
+    if live.any():
+        y_range = [float(np.min(y[live])), float(np.max(y[live]))]
+    return {
+        'Header': header,
+        'z_values': _STRUCTURE_PARAMETER['z'](dump.Structure.view(np.recarray)).tolist(),
+        'y_values': [y[live[:, i], i].tolist() for i in xrange(len(indices))],
+        'y_range': y_range,
+    }
+
+
+def _dtype(struct):
+    """numpy dtype with the same layout as a ctypes.Structure"""
+    res = []
+    for n, t in struct._fields_:
+        res.append((n, _dtype(t) if issubclass(t, ctypes.Structure) else np.dtype(t)))
+    res = np.dtype(res, align=True)
+    assert res.itemsize == ctypes.sizeof(struct), \
+        '{}: dtype size mismatch'.format(struct.__name__)
+    return res
+
+
+def _dump(filename):
+    """Memory map a dump file
+
+    The file is a THeader, followed by NPoints TStructures, followed
+    by NPoints TBeamHeaders each with NParticles TParticles.
+
+    Returns:
+        numpy.record: Header, Structure[NPoints], Beam[NPoints]
+    """
+    header = beam_header(filename)
+    dtype = np.dtype([
+        ('Header', _HEADER_DTYPE),
+        ('Structure', _STRUCTURE_DTYPE, (header.NPoints,)),
+        ('Beam', [
+            ('BeamHeader', _BEAM_HEADER_DTYPE),
+            ('Particles', _PARTICLE_DTYPE, (header.NParticles,)),
+        ], (header.NPoints,)),
+    ])
+    # ensure the expected bytes are present
+    assert os.path.getsize(filename) == dtype.itemsize, \
+        '{}: unexpected dump file size'.format(filename)
+    return np.memmap(filename, dtype=dtype, mode='r', shape=(1,)).view(np.recarray)[0]
 
 
 def _gamma_to_mev(g):
@@ -296,8 +274,14 @@ def _gamma_to_mev(g):
 
 
 def _velocity_to_energy(b):
-    return 1 / math.sqrt(1 - b ** 2)
+    return 1 / np.sqrt(1 - b ** 2)
 
 
 def _velocity_to_mev(b):
     return _gamma_to_mev(_velocity_to_energy(b))
+
+
+_BEAM_HEADER_DTYPE = _dtype(TBeamHeader)
+_HEADER_DTYPE = _dtype(THeader)
+_PARTICLE_DTYPE = _dtype(TParticle)
+_STRUCTURE_DTYPE = _dtype(TStructure)
@@ -13,12 +13,10 @@ from pykern.pkdebug import pkdc, pkdp
 from sirepo import simulation_db
 from sirepo.template import template_common, sdds_util
 import glob
-import math
 import numpy as np
 import os.path
 import py.path
 import re
-import sdds
 
 ELEGANT_TWISS_FILENAME = 'twiss_output.filename.sdds'
 
@@ -107,6 +105,11 @@ def background_percent_complete(report, run_dir, is_running):
     }
 
 
+def background_progress_files(report, run_dir):
+    # ion files are only created in run_dir
+    return [run_dir.join(_BEAM_EVOLUTION_OUTPUT_FILENAME)]
+
+
 def fixup_old_data(data):
     for m in ('ring', 'particleAnimation', 'twissReport'):
         if m not in data['models']:
@@ -325,22 +328,23 @@ def _compute_range_across_files(run_dir):
     for v in _SCHEMA.enum.ParticleColumn:
         res[_map_field_name(v[0])] = []
     for filename in _ion_files(run_dir):
-        sdds_util.process_sdds_page(filename, 0, _compute_sdds_range, res)
+        _compute_sdds_range(filename, res)
     data.models.particleAnimation.fieldRange = res
     simulation_db.write_json(run_dir.join(template_common.INPUT_BASE_NAME), data)
     return res
 
 
-def _compute_sdds_range(res):
-    sdds_index = 0
-    column_names = sdds.sddsdata.GetColumnNames(sdds_index)
+def _compute_sdds_range(filename, res):
+    cols = sdds_util.extract_sdds_columns(filename, list(res.keys()), 0)
+    if cols['err']:
+        return
     for field in res:
-        values = sdds.sddsdata.GetColumn(sdds_index, column_names.index(field))
+        values = cols['values'][field]
         if len(res[field]):
-            res[field][0] = _safe_sdds_value(min(min(values), res[field][0]))
-            res[field][1] = _safe_sdds_value(max(max(values), res[field][1]))
+            res[field][0] = min(float(values.min()), res[field][0])
+            res[field][1] = max(float(values.max()), res[field][1])
         else:
-            res[field] = [_safe_sdds_value(min(values)), _safe_sdds_value(max(values))]
+            res[field] = [float(values.min()), float(values.max())]
 
 
 def _elegant_dir():
@@ -350,37 +354,37 @@ def _elegant_dir():
 def _extract_evolution_plot(report, run_dir):
     filename = str(run_dir.join(_BEAM_EVOLUTION_OUTPUT_FILENAME))
     data = simulation_db.read_json(run_dir.join(template_common.INPUT_BASE_NAME))
-    x_col = sdds_util.extract_sdds_column(filename, _X_FIELD, 0)
-    if x_col['err']:
-        return x_col['err']
-    x = x_col['values']
+    yfields = dict(
+        (f, _map_field_name(report[f])) for f in ('y1', 'y2', 'y3') if report[f] != 'none'
+    )
+    cols = sdds_util.extract_sdds_columns(filename, [_X_FIELD] + yfields.values(), 0)
+    if cols['err']:
+        return cols['err']
+    x = cols['values'][_X_FIELD]
     plots = []
     y_range = None
     for f in ('y1', 'y2', 'y3'):
-        if report[f] == 'none':
+        if f not in yfields:
             continue
-        yfield = _map_field_name(report[f])
-        y_col = sdds_util.extract_sdds_column(filename, yfield, 0)
-        if y_col['err']:
-            return y_col['err']
-        y = y_col['values']
+        yfield = yfields[f]
+        y = cols['values'][yfield]
         if y_range:
-            y_range[0] = min(y_range[0], min(y))
-            y_range[1] = max(y_range[1], max(y))
+            y_range[0] = min(y_range[0], float(y.min()))
+            y_range[1] = max(y_range[1], float(y.max()))
         else:
-            y_range = [min(y), max(y)]
+            y_range = [float(y.min()), float(y.max())]
         plots.append({
-            'points': y,
-            'label': '{}{}'.format(_field_label(yfield, y_col['column_def']), _field_description(yfield, data)),
+            'points': y.tolist(),
+            'label': '{}{}'.format(_field_label(yfield, cols['column_defs'][yfield]), _field_description(yfield, data)),
             #TODO(pjm): refactor with template_common.compute_plot_color_and_range()
             'color': _PLOT_LINE_COLOR[f],
         })
     return {
         'title': '',
-        'x_range': [min(x), max(x)],
+        'x_range': [float(x.min()), float(x.max())],
         'y_label': '',
-        'x_label': _field_label(_X_FIELD, x_col['column_def']),
-        'x_points': x,
+        'x_label': _field_label(_X_FIELD, cols['column_defs'][_X_FIELD]),
+        'x_points': x.tolist(),
         'plots': plots,
         'y_range': y_range,
     }
@@ -402,14 +406,11 @@ def _extract_particle_plot(report, run_dir, page_index):
     time = settings.time / settings.step_number * settings.save_particle_interval * page_index
     if time > settings.time:
         time = settings.time
-    x_col = sdds_util.extract_sdds_column(filename, xfield, 0)
-    if x_col['err']:
-        return x_col['err']
-    x = x_col['values']
-    y_col = sdds_util.extract_sdds_column(filename, yfield, 0)
-    if y_col['err']:
-        return y_col['err']
-    y = y_col['values']
+    cols = sdds_util.extract_sdds_columns(filename, [xfield, yfield], 0)
+    if cols['err']:
+        return cols['err']
+    x = cols['values'][xfield]
+    y = cols['values'][yfield]
     particle_animation = data.models.particleAnimation
     range = None
     if report['plotRangeType'] == 'fixed':
@@ -420,10 +421,10 @@ def _extract_particle_plot(report, run_dir, page_index):
     return {
         'x_range': [float(edges[0][0]), float(edges[0][-1]), len(hist)],
         'y_range': [float(edges[1][0]), float(edges[1][-1]), len(hist[0])],
-        'x_label': _field_label(xfield, x_col['column_def']),
-        'y_label': _field_label(yfield, y_col['column_def']),
+        'x_label': _field_label(xfield, cols['column_defs'][xfield]),
+        'y_label': _field_label(yfield, cols['column_defs'][yfield]),
         'title': 'Ions at time {:.2f} [s]'.format(time),
-        'z_matrix': hist.T.tolist(),
+        'z_matrix': hist.T,
     }
 
 
@@ -496,9 +497,3 @@ def _map_field_name(f):
     if f in _FIELD_MAP:
         return _FIELD_MAP[f]
     return f
-
-
-def _safe_sdds_value(v):
-    if isinstance(v, float) and (math.isinf(v) or math.isnan(v)):
-        return 0
-    return v
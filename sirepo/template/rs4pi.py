@@ -22,7 +22,6 @@ import os
 import os.path
 import py.path
 import re
-import struct
 import time
 import werkzeug
 import zipfile
@@ -53,8 +52,6 @@ _DICOM_MIN_VALUE = -1000
 _DOSE_DICOM_FILE = RTDOSE_EXPORT_FILENAME
 _DOSE_FILE = 'dose3d.dat'
 _EXPECTED_ORIENTATION = np.array([1, 0, 0, 0, 1, 0])
-# using np.float32 for pixel storage
-_FLOAT_SIZE = 4
 _PIXEL_FILE = 'pixels3d.dat'
 _RADIASOFT_ID = 'RadiaSoft'
 _ROI_FILE_NAME = 'rs4pi-roi-data.json'
@@ -78,6 +75,10 @@ def background_percent_complete(report, run_dir, is_running):
     }
 
 
+def background_progress_files(report, run_dir):
+    return []
+
+
 def copy_related_files(data, source_path, target_path):
     # pixels3d.dat, rs4pi-roi-data.json, dicom/*.json
     for filename in (_PIXEL_FILE, _ROI_FILE_NAME, _DOSE_FILE):
@@ -595,6 +596,32 @@ def _pixel_filename(simulation):
     return _sim_file(simulation['simulationId'], _PIXEL_FILE)
 
 
+def _dose_volume(data):
+    """Memory map the dose file
+
+    Returns:
+        numpy.memmap: float32 [frame, row, column]
+    """
+    dicom_dose = data['models']['dicomDose']
+    return _volume(
+        _dose_filename(data['models']['simulation']),
+        [dicom_dose['frameCount']] + dicom_dose['shape'],
+    )
+
+
+def _pixel_volume(data):
+    """Memory map the ct pixel file
+
+    Returns:
+        numpy.memmap: float32 [t, s, c] ordered like the file
+    """
+    plane_info = data['models']['dicomSeries']['planes']
+    return _volume(
+        _pixel_filename(data['models']['simulation']),
+        [plane_info[p]['frameCount'] for p in ('t', 's', 'c')],
+    )
+
+
 def _read_dose_frame(idx, data):
     res = []
     if 'dicomDose' not in data['models']:
@@ -602,55 +629,18 @@ def _read_dose_frame(idx, data):
     dicom_dose = data['models']['dicomDose']
     if idx >= dicom_dose['frameCount']:
         return res
-    shape = dicom_dose['shape']
-    with open (_dose_filename(data['models']['simulation']), 'rb') as f:
-        f.seek(idx * _FLOAT_SIZE * shape[0] * shape[1], 1)
-        for r in range(shape[0]):
-            row = []
-            res.append(row)
-            for c in range(shape[1]):
-                row.append(struct.unpack('f', f.read(_FLOAT_SIZE))[0])
-    return res
+    return _dose_volume(data)[idx].tolist()
 
 
 def _read_pixel_plane(plane, idx, data):
-    plane_info = data['models']['dicomSeries']['planes']
-    size = [plane_info['c']['frameCount'], plane_info['s']['frameCount'], plane_info['t']['frameCount']]
-    frame = []
-    # pixels = np.array(all_frame_pixels)[:, idx]
-    # pixels = np.array(all_frame_pixels)[:, :, idx]
-    with open (_pixel_filename(data['models']['simulation']), 'rb') as f:
-        if plane == 't':
-            if idx > 0:
-                f.seek(idx * _FLOAT_SIZE * size[0] * size[1], 1)
-            for r in range(size[1]):
-                row = []
-                frame.append(row)
-                for v in range(size[0]):
-                    row.append(struct.unpack('f', f.read(_FLOAT_SIZE))[0])
-        elif plane == 'c':
-            if idx > 0:
-                f.seek(idx * _FLOAT_SIZE * size[0], 1)
-            for r in range(size[2]):
-                row = []
-                frame.append(row)
-                for v in range(size[0]):
-                    row.append(struct.unpack('f', f.read(_FLOAT_SIZE))[0])
-                f.seek(_FLOAT_SIZE * (size[0] - 1) * size[1], 1)
-            frame = np.flipud(frame).tolist()
-        elif plane == 's':
-            if idx > 0:
-                f.seek(idx * _FLOAT_SIZE, 1)
-            for r in range(size[2]):
-                row = []
-                frame.append(row)
-                for v in range(size[1]):
-                    row.append(struct.unpack('f', f.read(_FLOAT_SIZE))[0])
-                    f.seek(_FLOAT_SIZE * (size[0] - 1), 1)
-            frame = np.flipud(frame).tolist()
-        else:
-            raise RuntimeError('plane not supported: {}'.format(plane))
-    return frame
+    pixels = _pixel_volume(data)
+    if plane == 't':
+        return pixels[idx].tolist()
+    if plane == 'c':
+        return np.flipud(pixels[:, idx, :]).tolist()
+    if plane == 's':
+        return np.flipud(pixels[:, :, idx]).tolist()
+    raise RuntimeError('plane not supported: {}'.format(plane))
 
 
 def _read_roi_file(sim_id):
@@ -872,3 +862,8 @@ def _update_roi_file(sim_id, contours):
     #TODO(pjm): file locking or atomic update
     simulation_db.write_json(_roi_file(sim_id), data)
     return {}
+
+
+def _volume(filename, shape):
+    """Read only view of a float32 volume written with numpy.tofile"""
+    return np.memmap(filename, dtype=np.float32, mode='r', shape=tuple(shape))
@@ -5,13 +5,20 @@ u"""SDDS utilities.
 :license: http://www.apache.org/licenses/LICENSE-2.0.html
 """
 from __future__ import absolute_import, division, print_function
+from pykern import pkcollections
 from pykern import pkio
 from pykern import pksubprocess
 from pykern.pkdebug import pkdc, pkdexc, pkdlog, pkdp
 from sirepo.template import elegant_common
+import collections
+import contextlib
 import math
+import numpy as np
+import os
 import re
 import sdds
+import threading
+import time
 
 # elegant mux and muy are computed in sddsprocess below
 _ELEGANT_TO_MADX_COLUMNS = [
@@ -33,40 +40,163 @@ _ELEGANT_TO_MADX_COLUMNS = [
 
 MADX_TWISS_COLUMS = map(lambda row: row[1], _ELEGANT_TO_MADX_COLUMNS)
 
-_SDDS_INDEX = 0
+#: sddsdata supports this many open datasets (MAX_FILES in sddsdatamodule.c)
+_MAX_DATASETS = 20
+
+#: Number of files in _page_index_cache
+_PAGE_INDEX_CACHE_MAX = 100
+
+#: A file modified this recently may still be written (see `process_sdds_page`)
+_WRITING_SECS = 5
+
+#: sddsdata indices which are not in use
+_free_indices = list(reversed(range(_MAX_DATASETS)))
+
+#: Signals waiters when an index is released
+_free_indices_cond = threading.Condition()
+
+#: (path, mtime, size) to page index (see `read_page_index`)
+_page_index_cache = collections.OrderedDict()
+
+#: Protects _page_index_cache
+_page_index_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def dataset_index():
+    """Allocate a sddsdata dataset index for the caller
+
+    sddsdata keeps open files in a fixed table so each reader needs its
+    own index. The dataset is terminated when the block exits.
+
+    Yields:
+        int: index to pass to ``sdds.sddsdata`` functions
+    """
+    with _free_indices_cond:
+        while not _free_indices:
+            _free_indices_cond.wait()
+        res = _free_indices.pop()
+    try:
+        yield res
+    finally:
+        try:
+            sdds.sddsdata.Terminate(res)
+        except Exception:
+            pass
+        with _free_indices_cond:
+            _free_indices.append(res)
+            _free_indices_cond.notify()
 
 
 def extract_sdds_column(filename, field, page_index):
-    return process_sdds_page(filename, page_index, _sdds_column, field)
+    res = extract_sdds_columns(filename, [field], page_index)
+    if res['err']:
+        return res
+    return {
+        'values': res['values'][field],
+        'column_names': res['column_names'],
+        'column_def': res['column_defs'][field],
+        'err': None,
+    }
+
+
+def extract_sdds_columns(filename, fields, page_index):
+    """Read several columns from one page with a single open
+
+    Args:
+        filename (str): sdds file
+        fields (list): column names
+        page_index (int): which page
+
+    Returns:
+        dict: values and column_defs by field (values are numpy arrays
+            with inf and nan replaced by 0), column_names, and err
+    """
+    return process_sdds_page(filename, page_index, _sdds_columns, fields)
 
 
 def process_sdds_page(filename, page_index, callback, *args, **kwargs):
-    try:
-        if sdds.sddsdata.InitializeInput(_SDDS_INDEX, filename) != 1:
-            pkdlog('{}: cannot access'.format(filename))
+    """Open filename, read up to page_index, and call callback
+
+    callback is passed the dataset index followed by args and kwargs.
+    Pages which are not in the file (see `read_page_index`) are
+    reported without reading the file. A file which is still being
+    written is not indexed, because its index would be out of date by
+    the next call, so only the pages up to page_index are read.
+
+    Returns:
+        object: result of callback or dict with err
+    """
+    if not _is_writing(filename):
+        pi = read_page_index(filename)
+        if pi is None:
             # In normal execution, the file may not yet be available over NFS
+            return {
+                'err': _sdds_error('Output file is not yet available.'),
+            }
+        if page_index >= len(pi.row_counts):
+            return {
+                'err': _page_not_found(filename, page_index),
+            }
+    err = None
+    with dataset_index() as i:
+        if sdds.sddsdata.InitializeInput(i, filename) != 1:
+            pkdlog('{}: cannot access'.format(filename))
             err = _sdds_error('Output file is not yet available.')
         else:
             #TODO(robnagler) SDDS_GotoPage not in sddsdata, why?
             for _ in xrange(page_index + 1):
-                if sdds.sddsdata.ReadPage(_SDDS_INDEX) <= 0:
-                    #TODO(robnagler) is this an error?
+                if sdds.sddsdata.ReadPage(i) <= 0:
+                    err = _page_not_found(filename, page_index)
                     break
-            try:
-                return callback(*args, **kwargs)
-            except SystemError as e:
-                pkdlog('{}: page not found in {}'.format(page_index, filename))
-                err = _sdds_error('Output page {} not found'.format(page_index) if page_index else 'No output was generated for this report.')
-    finally:
-        try:
-            sdds.sddsdata.Terminate(_SDDS_INDEX)
-        except Exception:
-            pass
+            else:
+                try:
+                    return callback(i, *args, **kwargs)
+                except SystemError as e:
+                    err = _page_not_found(filename, page_index)
     return {
         'err': err,
     }
 
 
+def read_page_index(filename):
+    """Definitions, parameters, and row counts of every page in filename
+
+    The result is cached by path, mtime, and size so repeated frame
+    and status requests for the same output file only read it once.
+    Treat the result as read-only.
+
+    Args:
+        filename (str): sdds file
+
+    Returns:
+        Dict: column_names, column_defs, parameter_names,
+            parameter_defs, parameters (values by page), and row_counts;
+            None if the file cannot be read
+    """
+    try:
+        key = _page_index_key(filename)
+    except OSError:
+        return None
+    with _page_index_lock:
+        res = _page_index_cache.pop(key, None)
+        if res:
+            _page_index_cache[key] = res
+            return res
+    res = _read_page_index(filename)
+    try:
+        if res is None or key != _page_index_key(filename):
+            # modified while reading so next call reads it again
+            return res
+    except OSError:
+        return res
+    with _page_index_lock:
+        _page_index_cache[key] = res
+        while len(_page_index_cache) > _PAGE_INDEX_CACHE_MAX:
+            _page_index_cache.popitem(last=False)
+    return res
+
+
 def twiss_to_madx(elegant_twiss_file, madx_twiss_file):
     outfile = 'sdds_output.txt'
     twiss_file = 'twiss-with-mu.sdds'
@@ -88,29 +218,80 @@ def twiss_to_madx(elegant_twiss_file, madx_twiss_file):
     pkio.write_text(madx_twiss_file, header + '\n'.join(lines) + '\n')
 
 
+def _column_values(values):
+    """Convert sddsdata column to numpy with inf and nan set to 0"""
+    res = np.array(values)
+    if res.dtype.kind == 'f':
+        res[~np.isfinite(res)] = 0
+    return res
+
+
+def _is_writing(filename):
+    try:
+        return os.stat(filename).st_mtime > time.time() - _WRITING_SECS
+    except OSError:
+        return False
+
+
+def _page_index_key(filename):
+    s = os.stat(filename)
+    return (os.path.abspath(filename), s.st_mtime, s.st_size)
+
+
+def _page_not_found(filename, page_index):
+    pkdlog('{}: page not found in {}'.format(page_index, filename))
+    return _sdds_error('Output page {} not found'.format(page_index) if page_index else 'No output was generated for this report.')
+
+
+def _read_page_index(filename):
+    with dataset_index() as i:
+        if sdds.sddsdata.InitializeInput(i, filename) != 1:
+            pkdlog('{}: cannot access'.format(filename))
+            return None
+        res = pkcollections.Dict(
+            column_names=sdds.sddsdata.GetColumnNames(i),
+            parameter_names=sdds.sddsdata.GetParameterNames(i),
+            row_counts=[],
+        )
+        res.column_defs = dict(
+            (c, sdds.sddsdata.GetColumnDefinition(i, c)) for c in res.column_names
+        )
+        res.parameter_defs = dict(
+            (p, sdds.sddsdata.GetParameterDefinition(i, p)) for p in res.parameter_names
+        )
+        res.parameters = dict((p, []) for p in res.parameter_names)
+        while sdds.sddsdata.ReadPage(i) > 0:
+            res.row_counts.append(sdds.sddsdata.RowCount(i))
+            for j, p in enumerate(res.parameter_names):
+                res.parameters[p].append(_safe_sdds_value(sdds.sddsdata.GetParameter(i, j)))
+        return res
+
+
 def _safe_sdds_value(v):
     if isinstance(v, float) and (math.isinf(v) or math.isnan(v)):
         return 0
     return v
 
 
-def _sdds_column(field):
-    column_names = sdds.sddsdata.GetColumnNames(_SDDS_INDEX)
-    column_def = sdds.sddsdata.GetColumnDefinition(_SDDS_INDEX, field)
-    values = sdds.sddsdata.GetColumn(
-        _SDDS_INDEX,
-        column_names.index(field),
-    )
-    return {
-        'values': map(lambda v: _safe_sdds_value(v), values),
+def _sdds_columns(index, fields):
+    column_names = sdds.sddsdata.GetColumnNames(index)
+    res = {
+        'values': {},
+        'column_defs': {},
         'column_names': column_names,
-        'column_def': column_def,
         'err': None,
     }
+    for f in fields:
+        if f in res['values']:
+            continue
+        res['column_defs'][f] = sdds.sddsdata.GetColumnDefinition(index, f)
+        res['values'][f] = _column_values(
+            sdds.sddsdata.GetColumn(index, column_names.index(f)),
+        )
+    return res
 
 
 def _sdds_error(error_text='invalid data file'):
-    sdds.sddsdata.Terminate(_SDDS_INDEX)
     return {
         'error': error_text,
     }
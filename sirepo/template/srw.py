@@ -265,6 +265,11 @@ def background_percent_complete(report, run_dir, is_running):
     return res
 
 
+def background_progress_files(report, run_dir):
+    d = run_dir.join(_LOG_DIR)
+    return [run_dir.join(get_filename_for_model(report)), d] + pkio.sorted_glob(d.join('srwl_*.json'))[-1:]
+
+
 def copy_related_files(data, source_path, target_path):
     # copy results and log for the long-running simulations
     for d in ('fluxAnimation', 'multiElectronAnimation'):
@@ -619,7 +624,7 @@ def lib_files(data, source_lib):
     """Returns list of auxiliary files
 
     Args:
-        data (dict): simulation db
+        data (dict): simulation db (all files of the simulation if no report)
         source_lib (py.path): directory of source
 
     Returns:
@@ -629,7 +634,7 @@ def lib_files(data, source_lib):
     dm = data.models
     # the mirrorReport.heightProfileFile may be different than the file in the beamline
     report = data.report if 'report' in data else None
-    if report == 'mirrorReport':
+    if report == 'mirrorReport' or not report and dm.get('mirrorReport', {}).get('heightProfileFile'):
         res.append(dm['mirrorReport']['heightProfileFile'])
     if _uses_tabulated_zipfile(data):
         if 'tabulatedUndulator' in dm and dm.tabulatedUndulator.magneticFile:
@@ -1912,7 +1917,7 @@ def _remap_3d(info, allrange, z_label, z_units, width_pixels, scale='linear'):
         'z_label': _superscript(z_label + ' [' + z_units + ']'),
         'title': info['title'],
         'subtitle': info['subtitle'],
-        'z_matrix': ar2d.tolist(),
+        'z_matrix': ar2d,
     })
 
 
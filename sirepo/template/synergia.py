@@ -87,6 +87,11 @@ def background_percent_complete(report, run_dir, is_running):
     }
 
 
+def background_progress_files(report, run_dir):
+    # particle files are only created in run_dir
+    return [run_dir.join(OUTPUT_FILE['beamEvolutionAnimation'])]
+
+
 def fixup_old_data(data):
     for m in [
             'beamEvolutionAnimation',
@@ -416,7 +421,7 @@ def _extract_bunch_plot(report, frame_index, run_dir):
             'x_label': label(report['x']),
             'y_label': label(report['y']),
             'title': '{}-{} at {:.1f}m, turn {}'.format(report['x'], report['y'], tlen, rep),
-            'z_matrix': hist.T.tolist(),
+            'z_matrix': hist.T,
         }
 
 
@@ -36,6 +36,18 @@ PARAMETERS_PYTHON_FILE = 'parameters.py'
 #: stderr and stdout
 RUN_LOG = 'run.log'
 
+#: Divisors to convert Float fields to SI by units in the label (first match)
+_FLOAT_SCALE = (
+    (re.compile(r'\[m(m|rad)\]|\[Lines/mm'), 1000),
+    (re.compile(r'\[n(m|rad)\]|\[nm/pixel\]'), 1e09),
+    (re.compile(r'\[ps]'), 1e12),
+    #TODO(pjm): need to handle unicode in label better (mu)
+    (re.compile('\[\xb5(m|rad)\]|\[mm-mrad\]'), 1e6),
+)
+
+#: Characters removed from String fields by `validate_model`
+_ESCAPE_RE = re.compile("[\"'()]")
+
 _HISTOGRAM_BINS_MAX = 500
 
 _PLOT_LINE_COLOR = ['#1f77b4', '#ff7f0e', '#2ca02c']
@@ -44,6 +56,12 @@ _RESOURCE_DIR = py.path.local(pkresource.filename('template'))
 
 _WATCHPOINT_REPORT_NAME = 'watchpointReport'
 
+#: `parse_enums` by id of enum schema (see `validate_models`)
+_enum_info_cache = {}
+
+#: `_model_validator` by ids of model schema and enum info
+_model_validator_cache = {}
+
 
 def compute_plot_color_and_range(plots):
     """ For parameter plots, assign each plot a color and compute the full y_range. """
@@ -283,35 +301,26 @@ def update_model_defaults(model, name, schema):
 def validate_model(model_data, model_schema, enum_info):
 
     """Ensure the value is valid for the field type. Scales values as needed."""
-    for k in model_schema:
-        label = model_schema[k][0]
-        field_type = model_schema[k][1]
+    for k, has_default, default, field_type, enum, scale in _model_validator(model_schema, enum_info):
         if k in model_data:
             value = model_data[k]
-        elif len(model_schema[k]) > 2:
-            value = model_schema[k][2]
+        elif has_default:
+            value = default
         else:
             raise Exception('no value for field "{}" and no default value in schema'.format(k))
-        if field_type in enum_info:
-            if str(value) not in enum_info[field_type]:
+        if enum is not None:
+            if str(value) not in enum:
                 # Check a comma-delimited string against the enumeration
                 for item in re.split(r'\s*,\s*', str(value)):
-                    if item not in enum_info[field_type]:
-                        assert item in enum_info[field_type], \
+                    if item not in enum:
+                        assert item in enum, \
                             '{}: invalid enum "{}" value for field "{}"'.format(item, field_type, k)
         elif field_type == 'Float':
             if not value:
                 value = 0
             v = float(value)
-            if re.search('\[m(m|rad)\]', label) or re.search('\[Lines/mm', label):
-                v /= 1000
-            elif re.search('\[n(m|rad)\]', label) or re.search('\[nm/pixel\]', label):
-                v /= 1e09
-            elif re.search('\[ps]', label):
-                v /= 1e12
-            #TODO(pjm): need to handle unicode in label better (mu)
-            elif re.search('\[\xb5(m|rad)\]', label) or re.search('\[mm-mrad\]', label):
-                v /= 1e6
+            if scale:
+                v /= scale
             model_data[k] = float(v)
         elif field_type == 'Integer':
             if not value:
@@ -323,7 +332,12 @@ def validate_model(model_data, model_schema, enum_info):
 
 def validate_models(model_data, model_schema):
     """Validate top-level models in the schema. Returns enum_info."""
-    enum_info = parse_enums(model_schema['enum'])
+    e = model_schema['enum']
+    c = _enum_info_cache.get(id(e))
+    if not c:
+        # keep e so its id is not reused
+        c = _enum_info_cache[id(e)] = (e, parse_enums(e))
+    enum_info = c[1]
     for k in model_data['models']:
         if k in model_schema['model']:
             validate_model(model_data['models'][k], model_schema['model'][k], enum_info)
@@ -456,4 +470,37 @@ def watchpoint_id(report):
 
 
 def _escape(v):
-    return re.sub("[\"'()]", '', str(v))
+    return _ESCAPE_RE.sub('', str(v))
+
+
+def _model_validator(model_schema, enum_info):
+    """Compile model_schema into a list of fields for `validate_model`
+
+    Enum value sets and Float scales are computed once per model schema.
+
+    Returns:
+        list: (name, has_default, default, type, enum values or None, scale or None)
+    """
+    k = (id(model_schema), id(enum_info))
+    res = _model_validator_cache.get(k)
+    if res:
+        return res[2]
+    v = []
+    for f, info in model_schema.items():
+        scale = None
+        if info[1] == 'Float':
+            for r, s in _FLOAT_SCALE:
+                if r.search(info[0]):
+                    scale = s
+                    break
+        v.append((
+            f,
+            len(info) > 2,
+            info[2] if len(info) > 2 else None,
+            info[1],
+            frozenset(enum_info[info[1]]) if info[1] in enum_info else None,
+            scale,
+        ))
+    # keep objects so ids are not reused
+    _model_validator_cache[k] = (model_schema, enum_info, v)
+    return v
@@ -59,6 +59,10 @@ def background_percent_complete(report, run_dir, is_running):
     }
 
 
+def background_progress_files(report, run_dir):
+    return [run_dir.join('hdf5')] + _h5_file_list(run_dir)[-1:]
+
+
 def extract_field_report(field, coordinate, mode, data_file):
     opmd = _opmd_time_series(data_file)
     F, info = opmd.get_field(
@@ -87,7 +91,7 @@ def extract_field_report(field, coordinate, mode, data_file):
         'y_label': '{} [m]'.format(info.axes[0]),
         'title': "{} in the mode {} at {}".format(
             field_label, mode, _iteration_title(opmd, data_file)),
-        'z_matrix': numpy.flipud(F).tolist(),
+        'z_matrix': numpy.flipud(F),
     }
 
 
@@ -132,7 +136,7 @@ def extract_particle_report(args, particle_type, run_dir, data_file):
         'x_label': '{}{}'.format(xarg, xunits),
         'y_label': '{}{}'.format(yarg, yunits),
         'title': 't = {}'.format(_iteration_title(opmd, data_file)),
-        'z_matrix': hist.T.tolist(),
+        'z_matrix': hist.T,
         'frameCount': data_file.num_frames,
     }
 
@@ -81,6 +81,14 @@ def background_percent_complete(report, run_dir, is_running):
     return res
 
 
+def background_progress_files(report, run_dir):
+    return [
+        _h5_dir(run_dir, 'currentAnimation'),
+        run_dir.join(_EGUN_CURRENT_FILE),
+        run_dir.join(_EGUN_STATUS_FILE),
+    ] + _h5_file_list(run_dir, 'currentAnimation')[-1:]
+
+
 def fixup_old_data(data):
     for m in [
             'egunCurrentAnimation',
@@ -440,7 +448,7 @@ def _extract_field(field, data, data_file):
         'y_label': 'x [m]',
         'title': '{} for Time: {:.4e}s, Step {}'.format(title, data_time, data_file.iteration),
         'aspect_ratio': 6.0 / 14,
-        'z_matrix': values.tolist(),
+        'z_matrix': values,
     }
 
 
@@ -597,11 +605,12 @@ def _generate_parameters_file(data, run_dir=None, is_parallel=False):
         + template_common.render_jinja(SIM_TYPE, v, '{}.py'.format(template_name))
 
 
+def _h5_dir(run_dir, model_name):
+    return run_dir.join('diags/xzsolver/hdf5' if model_name == 'currentAnimation' else 'diags/fields/electric')
+
+
 def _h5_file_list(run_dir, model_name):
-    return pkio.walk_tree(
-        run_dir.join('diags/xzsolver/hdf5' if model_name == 'currentAnimation' else 'diags/fields/electric'),
-        r'\.h5$',
-    )
+    return pkio.walk_tree(_h5_dir(run_dir, model_name), r'\.h5$')
 
 
 def _slope(x1, y1, x2, y2):
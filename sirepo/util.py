@@ -6,6 +6,7 @@ u"""Utilities for requests
 """
 from __future__ import absolute_import, division, print_function
 from pykern.pkdebug import pkdlog
+import os
 import werkzeug.exceptions
 
 
@@ -23,3 +24,17 @@ def merge_dicts(base, derived, depth):
 
 def err(obj, format='', *args, **kwargs):
     return '{}: '.format(obj) + format.format(*args, **kwargs)
+
+def dir_size(path):
+    """Bytes of the files in path and its subdirectories
+
+    Files which are removed while walking are ignored.
+    """
+    res = 0
+    for d, _, files in os.walk(str(path)):
+        for f in files:
+            try:
+                res += os.lstat(os.path.join(d, f)).st_size
+            except OSError:
+                pass
+    return res
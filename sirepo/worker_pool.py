@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+u"""Warm worker processes for sequential reports
+
+A sequential report is run by ``sirepo <type> run <run_dir>`` (see
+`simulation_db.prepare_simulation`). Most of the time of a short report
+is spent starting the interpreter and importing srwlib, numpy, scipy,
+h5py, sdds, etc.
+
+For each type in `cfg.sim_types`, the server keeps a zygote
+(``sirepo service worker-pool <type>``), which imports
+``sirepo.pkcli.<type>`` once. `sirepo.runner.Background` asks the
+zygote to fork a child for each job, which calls the ``run`` entry
+point. The jobs are isolated from each other and the server as before,
+but the imports are paid once per zygote instead of once per report.
+
+The zygote reads requests (json lines) from stdin and writes the pid of
+each child to stdout. It exits when the server closes stdin.
+
+Celery already forks a worker per task (``CELERYD_MAX_TASKS_PER_CHILD=1``)
+so `preload` imports the modules in the parent of the workers and
+`run` calls the entry point in a child of the task.
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+from pykern import pkconfig
+from pykern import pkinspect
+from pykern import pkio
+from pykern.pkdebug import pkdc, pkdexc, pkdlog, pkdp
+from sirepo import job_history
+from sirepo.template import template_common
+import errno
+import importlib
+import json
+import os
+import random
+import resource
+import select
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+#: Only sequential reports are run in the pool
+_POOL_COMMAND = 'run'
+
+#: Written by the zygote once the imports are done
+_READY = 'ready'
+
+#: Don't restart a zygote which died more often than this
+_RESTART_SECS = 60
+
+#: Signals the zygote handles, which the jobs must not inherit
+_SIGNALS = (signal.SIGCHLD, signal.SIGINT, signal.SIGTERM)
+
+#: sim_type to `_Pool` of this server process
+_pools = {}
+
+#: pid to run_dir of the children of the zygote
+_jobs = {}
+
+#: Modules imported by `preload` or `serve`
+_modules = {}
+
+
+def init():
+    """Start the zygotes of `cfg.sim_types`
+
+    Called by `sirepo.runner.init` when jobs run in the background.
+    """
+    for t in cfg.sim_types or ():
+        if t not in _pools:
+            _pools[t] = _Pool(t)
+            _pools[t].start()
+
+
+def preload():
+    """Import the modules of `cfg.sim_types` in this process
+
+    Called in the parent of the Celery workers so the workers
+    (forked per task) don't have to import them.
+    """
+    for t in cfg.sim_types or ():
+        _import(t)
+
+
+def run(cmd, run_dir):
+    """Run a preloaded cmd in a child and wait for it to exit
+
+    Args:
+        cmd (list): from `simulation_db.prepare_simulation`
+        run_dir (py.path): where the output goes
+
+    Returns:
+        bool: False if cmd is not preloaded (caller must run cmd)
+    """
+    m = _modules.get(_sim_type(cmd))
+    if not m:
+        return False
+    pid = os.fork()
+    if pid == 0:
+        _child(m, cmd, run_dir)
+
+    def _signal(signum, frame):
+        os.kill(pid, signum)
+
+    prev = dict((s, signal.signal(s, _signal)) for s in (signal.SIGINT, signal.SIGTERM))
+    try:
+        while True:
+            try:
+                _, status = os.waitpid(pid, 0)
+                break
+            except OSError as e:
+                if e.errno != errno.EINTR:
+                    raise
+    finally:
+        for s, h in prev.items():
+            signal.signal(s, h)
+    if os.WIFSIGNALED(status):
+        raise RuntimeError('{}: signal={}'.format(cmd, os.WTERMSIG(status)))
+    if os.WEXITSTATUS(status):
+        raise RuntimeError('{}: exit status={}'.format(cmd, os.WEXITSTATUS(status)))
+    return True
+
+
+def serve(sim_type):
+    """Run the zygote of sim_type (see module doc)
+
+    Args:
+        sim_type (str): which code to import
+    """
+    m = _import(sim_type)
+    signal.signal(signal.SIGCHLD, _reap)
+    signal.siginterrupt(signal.SIGCHLD, False)
+    _write_line(_READY)
+    b = ''
+    while True:
+        while '\n' not in b:
+            try:
+                # select is interrupted by SIGCHLD even with siginterrupt
+                # False so _reap runs as soon as a job exits
+                if not select.select([0], [], [])[0]:
+                    continue
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            x = os.read(0, 4096)
+            if not x:
+                # server is gone
+                return
+            b += x
+        l, b = b.split('\n', 1)
+        cmd, run_dir, rlimits = json.loads(l)
+        pid = 0
+        try:
+            if _sim_type(cmd) != sim_type:
+                raise AssertionError('{}: not a {} command'.format(cmd, sim_type))
+            pid = os.fork()
+            if pid == 0:
+                _child(m, cmd, run_dir, rlimits=rlimits, write_status=True)
+            try:
+                # also in the child so the server can kill the group right away
+                os.setpgid(pid, pid)
+            except OSError:
+                # child exited
+                pass
+            _jobs[pid] = run_dir
+        except Exception:
+            pkdlog('{}: fork failed: {}', cmd, pkdexc())
+        _write_line(str(pid))
+
+
+def spawn(cmd, run_dir, rlimits=()):
+    """Start cmd in a warm child if there is a pool for it
+
+    The child is not a child of this process, so it has to be
+    polled (``os.kill(pid, 0)``) instead of waited for. The child
+    is the leader of its own process group.
+
+    Args:
+        cmd (list): from `simulation_db.prepare_simulation`
+        run_dir (py.path): where the job runs
+        rlimits (list): (resource name, (soft, hard)) for the child [()]
+
+    Returns:
+        int: pid of the job or None if the caller must start cmd
+    """
+    p = _pools.get(_sim_type(cmd))
+    return p and p.spawn(cmd, run_dir, rlimits)
+
+
+class _Pool(object):
+    """Zygote of a sim_type owned by this (server) process"""
+
+    def __init__(self, sim_type):
+        self.sim_type = sim_type
+        self.lock = threading.RLock()
+        self.process = None
+        self.is_ready = False
+        self.jobs = 0
+        self.start_time = 0
+
+    def is_warm(self):
+        """Start the zygote if necessary and check it has imported
+
+        Returns:
+            bool: True if the zygote is accepting jobs
+        """
+        with self.lock:
+            if not self.process or self.process.poll() is not None:
+                if self.process:
+                    pkdlog('{}: zygote exited: status={}', self.sim_type, self.process.returncode)
+                    self.process = None
+                if time.time() < self.start_time + _RESTART_SECS:
+                    return False
+                self.start()
+                if not self.process:
+                    return False
+            if not self.is_ready:
+                if not select.select([self.process.stdout], [], [], 0)[0]:
+                    return False
+                if self.process.stdout.readline().strip() != _READY:
+                    self._stop()
+                    return False
+                pkdlog('{}: zygote ready: pid={}', self.sim_type, self.process.pid)
+                self.is_ready = True
+            return True
+
+    def spawn(self, cmd, run_dir, rlimits):
+        with self.lock:
+            if not self.is_warm():
+                return None
+            try:
+                self.process.stdin.write(json.dumps([cmd, str(run_dir), rlimits]) + '\n')
+                self.process.stdin.flush()
+                pid = int(self.process.stdout.readline())
+            except Exception:
+                pkdlog('{}: zygote failed: {}', self.sim_type, pkdexc())
+                self._stop()
+                return None
+            if pid:
+                self.jobs += 1
+            return pid or None
+
+    def start(self):
+        with self.lock:
+            self.start_time = time.time()
+            self.is_ready = False
+            try:
+                self.process = subprocess.Popen(
+                    [
+                        pkinspect.root_package(sys.modules[__name__]),
+                        'service',
+                        'worker-pool',
+                        self.sim_type,
+                    ],
+                    close_fds=True,
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                )
+            except OSError as e:
+                pkdlog('{}: zygote start failed: {}', self.sim_type, e)
+                self.process = None
+                return
+            pkdlog('{}: zygote started: pid={}', self.sim_type, self.process.pid)
+
+    def _stop(self):
+        try:
+            self.process.kill()
+            self.process.wait()
+        except Exception:
+            pass
+        self.process = None
+        self.is_ready = False
+
+
+def _cfg_sim_types(value):
+    return tuple(value.split(':')) if value else ()
+
+
+def _child(module, cmd, run_dir, rlimits=None, write_status=False):
+    """Run cmd in this (forked) process and exit"""
+    status = 1
+    try:
+        for s in _SIGNALS:
+            signal.signal(s, signal.SIG_DFL)
+        if rlimits is not None:
+            # like sirepo.runner.Background
+            os.setpgid(0, 0)
+            for k, v in rlimits:
+                resource.setrlimit(getattr(resource, k), v)
+        run_dir = pkio.py_path(run_dir)
+        os.chdir(str(run_dir))
+        i = os.open(os.devnull, os.O_RDONLY)
+        o = os.open(template_common.RUN_LOG, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o666)
+        os.dup2(i, 0)
+        os.dup2(o, 1)
+        os.dup2(o, 2)
+        os.close(i)
+        os.close(o)
+        # otherwise every job gets the same random numbers
+        random.seed()
+        if 'numpy' in sys.modules:
+            sys.modules['numpy'].random.seed()
+        if write_status:
+            from sirepo import simulation_db
+            simulation_db.write_status('running', run_dir)
+        getattr(module, cmd[2].replace('-', '_'))(*cmd[3:])
+        status = 0
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        pkdlog('{}: error: {}', cmd, pkdexc())
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(status)
+
+
+def _import(sim_type):
+    if sim_type not in _modules:
+        _modules[sim_type] = importlib.import_module(
+            '{}.pkcli.{}'.format(pkinspect.root_package(sys.modules[__name__]), sim_type),
+        )
+    return _modules[sim_type]
+
+
+def _reap(signum=None, frame=None):
+    try:
+        while True:
+            pid, status, ru = os.wait4(-1, os.WNOHANG)
+            if not pid:
+                break
+            d = _jobs.pop(pid, None)
+            if not d:
+                continue
+            d = pkio.py_path(d)
+            # the server can't wait for the job (see sirepo.runner.Background)
+            job_history.write_rusage(d, job_history.rusage(ru, status))
+            if os.WIFSIGNALED(status) and os.WTERMSIG(status) == signal.SIGXCPU:
+                from sirepo import simulation_db
+                simulation_db.write_status(
+                    'error',
+                    d,
+                    reason=simulation_db.STATUS_REASON_CPU_LIMIT,
+                )
+    except OSError as e:
+        if e.errno != errno.ECHILD:
+            pkdlog('waitpid: OSError: {} errno={}', e.strerror, e.errno)
+
+
+def _sim_type(cmd):
+    """sim_type of cmd if it may be run in a pool"""
+    if len(cmd) == 4 and cmd[2] == _POOL_COMMAND:
+        return cmd[1]
+    return None
+
+
+def _write_line(value):
+    try:
+        sys.stdout.write(value + '\n')
+        sys.stdout.flush()
+    except IOError as e:
+        if e.errno != errno.EPIPE:
+            raise
+        # server is gone
+        sys.exit(0)
+
+
+cfg = pkconfig.init(
+    sim_types=(None, _cfg_sim_types, 'sim types (colon separated) with warm workers for sequential reports'),
+)
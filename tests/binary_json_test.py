@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+u"""PyTest for :mod:`sirepo.binary_json`
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+import pytest
+
+
+def test_benchmark():
+    """Compare JSON and binary_json size and speed per template
+
+    Frames are synthesized with the shapes the templates return.
+    """
+    from pykern import pkunit
+    from pykern.pkdebug import pkdlog
+    from sirepo import binary_json
+    from sirepo import simulation_db
+    import numpy
+    import time
+
+    def _time(op):
+        t = time.time()
+        for _ in range(3):
+            res = op()
+        return res, (time.time() - t) / 3
+
+    pkdlog('{:10} {:>10} {:>8} {:>10} {:>8}', 'template', 'json bytes', 'secs', 'bin bytes', 'secs')
+    for name, frame in _frames(numpy):
+        j, jt = _time(lambda: simulation_db.generate_json(frame))
+        b, bt = _time(lambda: binary_json.encode(frame))
+        pkdlog('{:10} {:10d} {:8.4f} {:10d} {:8.4f}', name, len(j), jt, len(b), bt)
+        pkunit.pkok(len(b) < len(j), '{}: binary={} not smaller than json={}', name, len(b), len(j))
+
+
+def test_encode():
+    from pykern import pkunit
+    from sirepo import binary_json
+    import numpy
+
+    z = numpy.random.RandomState(1).rand(40, 50)
+    value = {
+        'title': 'x',
+        'x_range': [0.5, numpy.float64(1.5), 50],
+        'z_matrix': z,
+        'points': z[0].tolist(),
+        'counts': list(range(100)),
+        'big': [2 ** 40] * binary_json.MIN_ARRAY_SIZE,
+        'short': [1.0, 2.0],
+        'labels': ['a'] * binary_json.MIN_ARRAY_SIZE,
+        'ragged': [[1.0] * binary_json.MIN_ARRAY_SIZE, [2.0]],
+        'nested': {'empty': []},
+    }
+    b = binary_json.encode(value)
+    res = binary_json.decode(b)
+    for k in 'title', 'x_range', 'short', 'labels', 'nested':
+        pkunit.pkeq(value[k], res[k])
+    pkunit.pkeq((40, 50), res['z_matrix'].shape)
+    pkunit.pkeq('<f4', res['z_matrix'].dtype.str)
+    pkunit.pkok(numpy.allclose(z, res['z_matrix'], rtol=1e-6), 'z_matrix differs')
+    pkunit.pkok(numpy.allclose(value['points'], res['points'], rtol=1e-6), 'points differs')
+    pkunit.pkeq('<i4', res['counts'].dtype.str)
+    pkunit.pkeq(value['counts'], res['counts'].tolist())
+    pkunit.pkeq(value['big'], res['big'].astype(int).tolist())
+    # each row is encoded separately
+    pkunit.pkeq(value['ragged'][0], res['ragged'][0].tolist())
+    pkunit.pkeq(value['ragged'][1], res['ragged'][1])
+    res = binary_json.decode(binary_json.encode(value, float_dtype='<f8'))
+    pkunit.pkok(numpy.array_equal(z, res['z_matrix']), 'float64 z_matrix differs')
+
+
+def test_response():
+    from pykern import pkunit
+    from sirepo import binary_json
+    from sirepo import sr_unit
+    import json
+
+    fc = sr_unit.flask_client({'SIREPO_FEATURE_CONFIG_SIM_TYPES': 'myapp'})
+    fc.get('/myapp')
+    data = fc.sr_post('listSimulations', {'simulationType': 'myapp', 'search': {}})[0].simulation
+    req = dict(
+        report='dogReport',
+        simulationId=data.simulationId,
+        simulationType='myapp',
+    )
+    r = fc.post('/run-status', data=json.dumps(req), content_type='application/json')
+    pkunit.pkeq('application/json', r.mimetype)
+    expect = json.loads(r.data)
+    r = fc.post(
+        '/run-status',
+        data=json.dumps(req),
+        content_type='application/json',
+        headers={'Accept': binary_json.MIME_TYPE},
+    )
+    pkunit.pkeq(binary_json.MIME_TYPE, r.mimetype)
+    pkunit.pkok('Accept' in r.headers['Vary'], '{}: Vary missing Accept', r.headers.get('Vary'))
+    pkunit.pkeq(expect, binary_json.decode(r.data))
+
+
+def _frames(numpy):
+    r = numpy.random.RandomState(1)
+
+    def _heatmap(bins, **kwargs):
+        h, e = numpy.histogramdd(r.randn(100000, 2), bins)
+        res = {
+            'x_range': [float(e[0][0]), float(e[0][-1]), len(h)],
+            'y_range': [float(e[1][0]), float(e[1][-1]), len(h[0])],
+            'x_label': 'x [m]',
+            'y_label': 'y [m]',
+            'title': 'frame',
+            'z_matrix': h.T,
+        }
+        res.update(kwargs)
+        return res
+
+    def _plot(count, plots):
+        x = numpy.linspace(0, 100, count)
+        return {
+            'title': '',
+            'x_range': [0, 100],
+            'y_label': '',
+            'x_label': 's [m]',
+            'x_points': x.tolist(),
+            'plots': [
+                {'points': r.rand(count).tolist(), 'label': str(i), 'color': '#000'}
+                for i in range(plots)
+            ],
+            'y_range': [0, 1],
+        }
+
+    return (
+        ('elegant', _heatmap(200)),
+        ('elegant', _plot(2000, 3)),
+        ('hellweg', _heatmap(100, z_label='Number of Particles', summaryData={})),
+        ('jspec', _heatmap(100)),
+        ('srw', _heatmap(500, z_label='Intensity', subtitle='')),
+        ('synergia', _heatmap(200)),
+        ('warppba', _heatmap(500, frameCount=10)),
+        ('warpvnd', dict(_heatmap(300), aspect_ratio=6.0 / 14)),
+    )
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+u"""PyTest for :mod:`sirepo.crystal` cache with a local X0h stand-in
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+import BaseHTTPServer
+import pytest
+import urlparse
+
+#: xi jumps at this energy like an absorption edge [keV]
+_EDGE_KEV = 8.65
+
+#: requests received by _X0hHandler
+_requests = []
+
+
+def test_cache():
+    from pykern import pkconfig
+    from pykern import pkunit
+    import threading
+
+    s = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), _X0hHandler)
+    t = threading.Thread(target=s.serve_forever)
+    t.daemon = True
+    t.start()
+    try:
+        with pkunit.save_chdir_work() as d:
+            pkconfig.reset_state_for_testing({
+                'SIREPO_CRYSTAL_CACHE_DIR': str(d),
+                'SIREPO_CRYSTAL_SERVER': 'http://127.0.0.1:{}/x0h'.format(s.server_address[1]),
+            })
+            from sirepo import crystal
+
+            p = crystal.get_crystal_parameters('Silicon', 8000, 1, 1, 1)
+            pkunit.pkeq(1, len(_requests))
+            _assert_close(_values(8.0), p)
+            pkunit.pkeq(p, crystal.get_crystal_parameters('Silicon', '8000', '1', '1', '1'))
+            crystal._stores.clear()
+            # read from file
+            pkunit.pkeq(p, crystal.get_crystal_parameters('Silicon', 8000, 1, 1, 1))
+            pkunit.pkeq(1, len(_requests))
+            n = crystal.cache_grid('Silicon', 1, 1, 1, 8000, 9000)
+            pkunit.pkeq(n + 1, len(_requests))
+            del _requests[:]
+            for e in 8011.5, 8503.25, 8999:
+                p = crystal.get_crystal_parameters('Silicon', e, 1, 1, 1)
+                _assert_close(_values(e / 1000), p, rtol=1e-5)
+            pkunit.pkeq(0, len(_requests))
+            # neighbors straddle the edge
+            p = crystal.get_crystal_parameters('Silicon', 8651, 1, 1, 1)
+            _assert_close(_values(8.651), p)
+            pkunit.pkeq(1, len(_requests))
+            # outside grid and other reflection
+            crystal.get_crystal_parameters('Silicon', 12000, 1, 1, 1)
+            crystal.get_crystal_parameters('Silicon', 8503.25, 2, 2, 0)
+            pkunit.pkeq(3, len(_requests))
+    finally:
+        s.shutdown()
+
+
+class _X0hHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        q = urlparse.parse_qs(urlparse.urlparse(self.path).query)
+        _requests.append(q)
+        v = _values(float(q['wave'][0]))
+        b = '\n'.join([
+            '<pre>',
+            ' a1= 5.4309',
+            ' d= 3.1355',
+            ' QB= {:.10e}'.format(v['bragg_angle_deg']),
+            ' xr0= {:.10e}'.format(v['xr0']),
+            ' xi0= {:.10e}'.format(v['xi0']),
+            ' xrh= {:.10e}'.format(v['xrh']),
+            ' xih= {:.10e}'.format(v['xih']),
+            '</pre>',
+        ])
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.end_headers()
+        self.wfile.write(b)
+
+    def log_message(self, *args):
+        pass
+
+
+def _assert_close(expect, actual, rtol=1e-6):
+    from pykern import pkunit
+
+    for k in expect:
+        pkunit.pkok(
+            abs(expect[k] - actual[k]) <= rtol * abs(expect[k]),
+            '{}: expect={} actual={}',
+            k,
+            expect[k],
+            actual[k],
+        )
+
+
+def _values(kev):
+    """Polarizabilities with power law energy dependence"""
+    import math
+
+    xi = 8 if kev > _EDGE_KEV else 1
+    return {
+        'xr0': -1.5e-4 / kev ** 2,
+        'xi0': xi * 4.5e-6 / kev ** 3,
+        'xrh': 7.9e-5 / kev ** 2,
+        'xih': xi * 3.1e-6 / kev ** 3,
+        'bragg_angle_deg': math.degrees(math.asin(1.23984193 / kev / (2 * 0.3135531576941939))),
+    }
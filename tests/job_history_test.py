@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+u"""PyTest for :mod:`sirepo.job_history`
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+import pytest
+
+_SECRET = 'test-secret'
+
+
+def test_record():
+    from pykern.pkunit import pkeq, pkok
+    from sirepo import sr_unit
+    import time
+
+    fc = sr_unit.flask_client({
+        'SIREPO_FEATURE_CONFIG_SIM_TYPES': 'myapp',
+        'SIREPO_JOB_HISTORY_ADMIN_SECRET': _SECRET,
+    })
+    from sirepo import job_history
+    from sirepo.pkcli import admin
+
+    sim_type = 'myapp'
+    data = fc.sr_sim_data(sim_type)
+    for _ in range(2):
+        data.models.dog.weight += 1
+        fc.sr_run_sim(data, 'dogReport')
+    # recorded by a thread
+    for _ in range(20):
+        res = job_history.summarize()
+        if res and res[0].jobs == 2:
+            break
+        time.sleep(.2)
+    pkeq(1, len(res))
+    r = res[0]
+    pkeq(sim_type, r.sim_type)
+    pkeq('dogReport', r.report)
+    pkeq(2, r.jobs)
+    pkeq(0, r.errors)
+    for m in job_history.METRICS:
+        for p in job_history.PERCENTILES:
+            pkok(r['{}_p{}'.format(m, p)] > 0, '{}_p{}: not recorded: {}', m, p, r)
+    pkeq([], job_history.summarize(sim_type='srw'))
+    pkok('dogReport' in admin.job_history(days=1), 'dogReport not in admin.job_history')
+    res = fc.sr_post('jobHistory', {'adminSecret': _SECRET})
+    pkeq('ok', res.state)
+    pkeq(2, res.reports[0].jobs)
+    r = fc.sr_post('jobHistory', {'adminSecret': 'x'}, raw_response=True)
+    pkeq(404, r.status_code)
+
+
+def test_percentile():
+    from pykern.pkunit import pkeq
+    from sirepo import job_history
+
+    v = list(range(1, 101))
+    pkeq(50, job_history._percentile(v, 50))
+    pkeq(99, job_history._percentile(v, 99))
+    pkeq(7, job_history._percentile([7], 90))
+    pkeq(None, job_history._percentile([], 50))
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+u"""PyTest for :mod:`sirepo.result_cache`
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+import pytest
+
+
+def test_shared_result():
+    from pykern import pkcollections
+    from pykern import pkio
+    from pykern.pkunit import pkeq, pkok
+    from sirepo import sr_unit
+    import copy
+
+    fc = sr_unit.flask_client({
+        'SIREPO_FEATURE_CONFIG_SIM_TYPES': 'myapp',
+        'SIREPO_RESULT_CACHE_MAX_BYTES': '1000000',
+    })
+    from sirepo import result_cache
+    from sirepo import simulation_db
+    from sirepo.template import template_common
+
+    sim_type = 'myapp'
+    report = 'dogReport'
+
+    def _request(sid):
+        return pkcollections.Dict(
+            forceRun=False,
+            models=fc.sr_get(
+                'simulationData',
+                params=dict(pretty='0', simulation_id=sid, simulation_type=sim_type),
+            ).models,
+            report=report,
+            simulationId=sid,
+            simulationType=sim_type,
+        )
+
+    def _run_dir(sid):
+        return pkio.py_path(simulation_db.find_global_simulation(sim_type, sid)).join(report)
+
+    def _entries():
+        return pkio.sorted_glob(simulation_db.user_dir_name().dirpath().join(result_cache.DIR, '*'))
+
+    req = _request(fc.sr_sim_data(sim_type).models.simulation.simulationId)
+    sid = req.simulationId
+    # the run, as the job would have done it
+    run_dir = pkio.mkdir_parent(_run_dir(sid))
+    d = copy.deepcopy(req)
+    template_common.report_parameters_hash(d)
+    simulation_db.write_json(run_dir.join(template_common.INPUT_BASE_NAME), d)
+    simulation_db.write_result({'x_points': [1, 2, 3]}, run_dir=run_dir)
+    res = fc.sr_post('runStatus', req)
+    pkeq('completed', res.state)
+    pkeq(1, len(_entries()))
+    out = run_dir.join(template_common.OUTPUT_BASE_NAME + simulation_db.JSON_SUFFIX)
+
+    def _run(sid):
+        res = fc.sr_post('runSimulation', _request(sid))
+        pkeq('completed', res.state)
+        pkeq([1, 2, 3], res.x_points)
+        pkeq(False, res.parametersChanged)
+        r = _run_dir(sid)
+        pkeq(out.stat().ino, r.join(out.basename).stat().ino, '{}: not linked', sid)
+        pkeq(sid, simulation_db.read_json(r.join(template_common.INPUT_BASE_NAME)).simulationId)
+
+    # a copy
+    _run(
+        fc.sr_post(
+            'copySimulation',
+            {'simulationType': sim_type, 'simulationId': sid},
+        ).models.simulation.simulationId,
+    )
+    # another user with the example
+    fc.cookie_jar.clear()
+    sid = fc.sr_post('listSimulations', {'simulationType': sim_type})[0].simulationId
+    _run(sid)
+    pkeq(1, len(_entries()))
+    req = _request(sid)
+    req.models.dog.weight += 1
+    sr_unit.test_in_request(
+        lambda: pkok(not result_cache.fetch(req, _run_dir(sid)), 'changed parameters are a hit'),
+    )
+
+
+def test_evict():
+    from sirepo import sr_unit
+
+    fc = sr_unit.flask_client({
+        'SIREPO_FEATURE_CONFIG_SIM_TYPES': 'myapp',
+        'SIREPO_RESULT_CACHE_MAX_BYTES': '250',
+    })
+    fc.sr_post('listSimulations', {'simulationType': 'myapp'})
+    sr_unit.test_in_request(_evict)
+
+
+def _evict():
+    from pykern import pkcollections
+    from pykern import pkio
+    from pykern import pkunit
+    from pykern.pkunit import pkeq, pkok
+    from sirepo import result_cache
+    from sirepo import simulation_db
+    from sirepo.template import template_common
+
+    # not save_chdir_work, which would remove the db
+    d = pkio.mkdir_parent(pkunit.work_dir().join('evict'))
+    result_cache.init(d)
+    data = []
+    for i in range(3):
+        x = pkcollections.Dict(
+            reportParametersHash=str(i),
+            report='dogReport',
+            simulationType='myapp',
+        )
+        r = pkio.mkdir_parent(d.join('sim{}'.format(i), x.report))
+        simulation_db.write_json(r.join(template_common.INPUT_BASE_NAME), x)
+        pkio.write_text(r.join('out.dat'), str(i) * 100)
+        result_cache.store(x, r)
+        data.append(x)
+        if i == 1:
+            # used, so more recent than 1 when 2 is stored
+            pkok(result_cache.fetch(data[0], d.join('copy', x.report)), 'not stored')
+            pkeq('0' * 100, pkio.read_text(d.join('copy', x.report, 'out.dat')))
+    # entries are a little over 100 bytes so the least recently used is evicted
+    hits = [result_cache.fetch(x, d.join('copy{}'.format(i), x.report)) for i, x in enumerate(data)]
+    pkeq([True, False, True], hits)
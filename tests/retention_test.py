@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+u"""PyTest for :mod:`sirepo.retention`
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+import pytest
+
+
+def test_sweep():
+    from pykern import pkio
+    from pykern.pkunit import pkeq, pkok
+    from sirepo import sr_unit
+    import os
+    import time
+
+    fc = sr_unit.flask_client({
+        'SIREPO_FEATURE_CONFIG_SIM_TYPES': 'myapp',
+        'SIREPO_RETENTION_MIN_IDLE_SECS': '60',
+        'SIREPO_RETENTION_USER_MAX_BYTES': '2500',
+    })
+    from sirepo import retention
+    from sirepo import simulation_db
+
+    sim_type = 'myapp'
+    report = 'dogReport'
+    old = time.time() - 3600
+
+    def _run(sid, state='completed', mtime=old):
+        d = pkio.mkdir_parent(
+            pkio.py_path(simulation_db.find_global_simulation(sim_type, sid)).join(report),
+        )
+        pkio.write_text(d.join('out.dat'), 'x' * 1000)
+        simulation_db.write_status(state, d)
+        os.utime(str(d), (mtime, mtime))
+        return d
+
+    def _status(sid):
+        fc.sr_post(
+            'runStatus',
+            dict(report=report, reportParametersHash='x', simulationId=sid, simulationType=sim_type),
+        )
+
+    sid = fc.sr_post('listSimulations', {'simulationType': sim_type})[0].simulationId
+    sids = [sid] + [
+        fc.sr_post(
+            'copySimulation',
+            {'simulationType': sim_type, 'simulationId': sid},
+        ).models.simulation.simulationId for _ in range(3)
+    ]
+    # oldest, but running
+    d = [_run(sids[0], state='running', mtime=old - 100)]
+    d += [_run(s, mtime=old + i) for i, s in enumerate(sids[1:])]
+    # recently accessed
+    _status(sids[1])
+    # another user within the budget
+    fc.cookie_jar.clear()
+    d.append(
+        _run(fc.sr_post('listSimulations', {'simulationType': sim_type})[0].simulationId, mtime=old + 10),
+    )
+    res = retention.sweep(confirm=False)
+    pkeq(5, res.runs)
+    pkeq([d[2], d[3]], res.removed)
+    pkok(res.reclaimed > 2000, 'reclaimed={}', res.reclaimed)
+    pkok(all(x.check() for x in d), 'removed without confirm')
+    retention.cfg.max_bytes = 2000
+    res = retention.sweep()
+    # sids[1] is recent and sids[0] is running
+    pkeq([d[2], d[3], d[4]], res.removed)
+    for x in d:
+        pkeq(x not in res.removed, x.check())
+        pkok(x.dirpath().join(simulation_db.SIMULATION_DATA_FILE).check(), 'input removed')
+    res = retention.sweep()
+    pkeq(2, res.runs)
+    pkeq([], res.removed)
+    # only walked when modified since the size was recorded
+    m = int(d[1].mtime())
+    os.utime(str(d[1]), (m, m))
+    b = retention.sweep(confirm=False).bytes
+    pkio.write_text(d[1].join('out.dat'), 'x' * 5000)
+    os.utime(str(d[1]), (m, m))
+    pkeq(b, retention.sweep(confirm=False).bytes)
+    retention.record_size(d[1], 10 ** 6)
+    pkok(retention.sweep(confirm=False).bytes > 10 ** 6, 'recorded size not used')
+    os.utime(str(d[1]), (m + 1, m + 1))
+    pkok(retention.sweep(confirm=False).bytes < 10 ** 6, 'modified run dir not walked')
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+u"""PyTest for :mod:`sirepo.runner_db`
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+import pytest
+
+
+def test_admit():
+    from pykern import pkunit
+    from pykern.pkunit import pkeq
+    from sirepo import runner_db
+
+    with pkunit.save_chdir_work() as d:
+        runner_db.init(d)
+        for jid, uid in ('a', 'u1'), ('b', 'u1'), ('c', 'u2'), ('d', 'u1'):
+            pkeq(True, runner_db.insert(jid, uid, 'Background', 'sequential', 'QUEUE'))
+        pkeq(False, runner_db.insert('a', 'u1', 'Background', 'sequential', 'QUEUE'))
+        # two jobs per host, one per user
+        pkeq(True, runner_db.admit('a', 2, 1))
+        pkeq(False, runner_db.admit('b', 2, 1))
+        # b is waiting for u1 so c gets the slot
+        pkeq(True, runner_db.admit('c', 2, 1))
+        pkeq(False, runner_db.admit('d', 2, 1))
+        runner_db.delete('a')
+        # b is older
+        pkeq(False, runner_db.admit('d', 2, 1))
+        pkeq(True, runner_db.admit('b', 2, 1))
+        pkeq(None, runner_db.admit('b', 2, 1))
+        pkeq('START', runner_db.read('b').state)
+        runner_db.update('c', state='STOP')
+        runner_db.delete('c')
+        pkeq(None, runner_db.read('c'))
+        # unlimited host, u1 still limited
+        pkeq(False, runner_db.admit('d', 0, 1))
+        pkeq(True, runner_db.admit('d', 0, 0))
+
+
+def test_dead_process():
+    from pykern import pkunit
+    from pykern.pkunit import pkeq
+    from sirepo import runner_db
+    import sqlite3
+    import subprocess
+
+    with pkunit.save_chdir_work() as d:
+        runner_db.init(d)
+        p = subprocess.Popen(['true'])
+        p.wait()
+        pkeq(True, runner_db.insert('x', 'u1', 'Background', 'sequential', 'QUEUE'))
+        runner_db.update('x', state='RUN', pid=p.pid)
+        # job exited
+        pkeq(None, runner_db.read('x'))
+        pkeq(True, runner_db.insert('x', 'u1', 'Background', 'sequential', 'QUEUE'))
+        pkeq(True, runner_db.insert('y', 'u1', 'Background', 'sequential', 'QUEUE'))
+        c = sqlite3.connect(str(d.join(runner_db.DB_FILE)))
+        c.execute('UPDATE job SET owner_pid = ?, state = ? WHERE jid = ?', (p.pid, 'RUN', 'x'))
+        c.commit()
+        c.close()
+        # server process which owned x died so its slot is free
+        pkeq(True, runner_db.admit('y', 1, 1))
+        pkeq(None, runner_db.read('x'))
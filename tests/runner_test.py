@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+u"""PyTest for :mod:`sirepo.runner`
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+import pytest
+
+
+def test_docker_resources():
+    from pykern import pkconfig
+    from pykern.pkunit import pkeq, pkexcept
+
+    pkconfig.reset_state_for_testing({
+        'SIREPO_RUNNER_DOCKER_RESOURCES': 'parallel=4:8g srw.parallel=8:16g srw.fluxReport=2:2g',
+    })
+    from sirepo import runner
+
+    def _res(resource_class, sim_type=None, report=None):
+        r = runner._docker_resources(
+            resource_class,
+            sim_type and dict(simulationType=sim_type, report=report),
+        )
+        return '{}:{}'.format(r.cpus, r.memory)
+
+    pkeq('1:1g', _res('sequential'))
+    pkeq('1:1g', _res('sequential', 'elegant', 'twissReport'))
+    pkeq('2:2g', _res('sequential', 'srw', 'fluxReport'))
+    pkeq('4:8g', _res('parallel', 'warppba', 'animation'))
+    pkeq('8:16g', _res('parallel', 'srw', 'multiElectronAnimation'))
+    with pkexcept('expect key=cpus:memory'):
+        runner._cfg_docker_resources('parallel=4')
+
+
+def test_background_limits():
+    from pykern import pkcollections
+    from pykern.pkunit import pkeq
+    from sirepo import sr_unit
+
+    fc = sr_unit.flask_client({
+        'SIREPO_FEATURE_CONFIG_SIM_TYPES': 'myapp',
+        'SIREPO_RUNNER_RLIMIT_CPU': '1',
+        'SIREPO_RUNNER_SEQUENTIAL_SECS': '3',
+    })
+    from sirepo import simulation_db
+
+    sim_type = 'myapp'
+    models = fc.sr_sim_data(sim_type).models
+    sid = models.simulation.simulationId
+    # a job which sleeps forever and one which computes forever
+    for cmd, reason in (
+        (['bash', '-c', 'sleep 100 & sleep 100'], 'Timed out after 3 seconds'),
+        (['bash', '-c', 'while :; do :; done'], simulation_db.STATUS_REASON_CPU_LIMIT),
+    ):
+        models.dog.weight += 1
+        data = pkcollections.Dict(
+            forceRun=True,
+            models=models,
+            report='dogReport',
+            simulationId=sid,
+            simulationType=sim_type,
+        )
+        sr_unit.test_in_request(lambda: _start(data, cmd))
+        res = fc.sr_run_wait(fc.sr_post('runStatus', data))
+        pkeq('error', res.state)
+        pkeq(reason, res.error)
+
+
+def test_coalesce():
+    from pykern import pkio
+    from pykern.pkunit import pkeq, pkok
+    from sirepo import sr_unit
+    import os
+    import threading
+
+    fc = sr_unit.flask_client({
+        'SIREPO_FEATURE_CONFIG_SIM_TYPES': 'myapp',
+        'SIREPO_RUNNER_MAX_USER_JOBS': '1',
+    })
+    from sirepo import runner
+    from sirepo import runner_db
+    from sirepo import simulation_db
+    from sirepo.template import template_common
+
+    sim_type = 'myapp'
+    models = fc.sr_sim_data(sim_type).models
+    sid = models.simulation.simulationId
+    sids = [sid] + [
+        fc.sr_post(
+            'copySimulation',
+            {'simulationType': sim_type, 'simulationId': sid},
+        ).models.simulation.simulationId for _ in range(3)
+    ]
+    d = pkio.py_path(simulation_db.find_global_simulation(sim_type, sid))
+    uid = d.dirpath().dirpath().basename
+    # holds the user's only slot so the runs are in flight together
+    block = uid + '-block'
+    runner_db.insert(block, uid, 'Background', 'sequential', 'RUN')
+    runner_db.update(block, pid=os.getpid())
+    res = {}
+
+    def _run(sid):
+        res[sid] = fc.sr_post(
+            'runSimulation',
+            dict(
+                forceRun=True,
+                models=models,
+                report='dogReport',
+                simulationId=sid,
+                simulationType=sim_type,
+            ),
+        )
+
+    t = [threading.Thread(target=_run, args=(s,)) for s in sids]
+    for x in t:
+        x.start()
+    for x in t:
+        x.join()
+    pkeq(1, len(runner._job_map))
+    leader = list(runner._job_map.values())[0].jid
+    for s in sids:
+        pkeq('pending', res[s].state)
+        j = '-'.join((uid, s, 'dogReport'))
+        pkeq(j != leader, bool(runner_db.follower(j)))
+    runner_db.delete(block)
+    out = set()
+    for s in sids:
+        r = fc.sr_run_wait(res[s])
+        pkeq('completed', r.state)
+        pkok(r.plots, 'no plots: {}', r)
+        d = pkio.py_path(simulation_db.find_global_simulation(sim_type, s)).join('dogReport')
+        pkeq(s, simulation_db.read_json(d.join(template_common.INPUT_BASE_NAME)).simulationId)
+        out.add(simulation_db.json_filename(template_common.OUTPUT_BASE_NAME, d).stat().ino)
+    # one execution, whose output all runs share
+    pkeq(1, len(out))
+    # followers of parallel jobs would not see the frames while running
+    pkeq(None, runner._run_key({}, d, 'parallel'))
+
+
+def _start(data, cmd):
+    """Like runner.job_start, but runs cmd instead of the report"""
+    from sirepo import runner
+    from sirepo import runner_db
+    from sirepo import simulation_db
+
+    jid = simulation_db.job_id(data)
+    job = runner.Background(jid, data)
+    runner_db.insert(jid, job.uid, 'Background', job.resource_class, job.state.name)
+    runner._job_map[jid] = job
+    job.start()
+    job.cmd = cmd
+    runner._schedule()
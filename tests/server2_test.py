@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+u"""Test runStatus long poll and simulationBatch
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+import pytest
+
+#: SIREPO_SERVER_RUN_STATUS_WAIT_SECS
+_WAIT_SECS = 3
+
+
+def test_run_status_wait():
+    from pykern import pkcollections
+    from pykern import pkio
+    from pykern.pkunit import pkeq, pkok
+    from sirepo import sr_unit
+    import os
+    import threading
+    import time
+
+    fc = sr_unit.flask_client({
+        'SIREPO_FEATURE_CONFIG_SIM_TYPES': 'myapp',
+        'SIREPO_SERVER_RUN_STATUS_WAIT_SECS': str(_WAIT_SECS),
+    })
+    from sirepo import runner_db
+    from sirepo import simulation_db
+    from sirepo.template import template_common
+
+    sim_type = 'myapp'
+    models = fc.sr_sim_data(sim_type).models
+    sid = models.simulation.simulationId
+    req = pkcollections.Dict(
+        models=models,
+        report='dogReport',
+        simulationId=sid,
+        simulationType=sim_type,
+    )
+    template_common.report_parameters_hash(req)
+    run_dir = pkio.mkdir_parent(
+        pkio.py_path(simulation_db.find_global_simulation(sim_type, sid)).join(req.report),
+    )
+    simulation_db.write_json(run_dir.join(template_common.INPUT_BASE_NAME), req)
+    simulation_db.write_status('running', run_dir)
+    # a running job owned by this process
+    jid = []
+    sr_unit.test_in_request(lambda: jid.append(simulation_db.job_id(req)))
+    runner_db.insert(jid[0], 'u', 'Background', 'sequential', 'RUN')
+    runner_db.update(jid[0], pid=os.getpid())
+    res = fc.sr_post('runStatus', req)
+    pkeq('running', res.state)
+    pkok(res.nextRequest.runStatusKey, 'no runStatusKey: {}', res.nextRequest)
+    t = time.time()
+    res = fc.sr_post('runStatus', res.nextRequest)
+    pkeq('running', res.state)
+    pkok(time.time() - t >= _WAIT_SECS - 0.1, 'returned before timeout without a change')
+    from sirepo import server
+    server.cfg.run_status_wait_max = 0
+    t = time.time()
+    r = fc.sr_post('runStatus', res.nextRequest)
+    pkok(time.time() - t < _WAIT_SECS - 0.5, 'held beyond run_status_wait_max')
+    pkok('runStatusKey' not in r.nextRequest, 'runStatusKey when no request can be held')
+    server.cfg.run_status_wait_max = 5
+
+    def _complete():
+        time.sleep(1)
+        simulation_db.write_result({'x_points': [1]}, run_dir=run_dir)
+        runner_db.delete(jid[0])
+
+    c = threading.Thread(target=_complete)
+    c.start()
+    t = time.time()
+    res = fc.sr_post('runStatus', res.nextRequest)
+    c.join()
+    pkeq('completed', res.state)
+    pkok(time.time() - t < _WAIT_SECS - 0.5, 'change not seen before timeout')
+
+
+def test_simulation_batch():
+    from pykern import pkcollections
+    from pykern import pkio
+    from pykern.pkunit import pkeq
+    from sirepo import sr_unit
+
+    fc = sr_unit.flask_client({'SIREPO_FEATURE_CONFIG_SIM_TYPES': 'hellweg'})
+    from sirepo import simulation_db
+    from sirepo.template import hellweg
+    from sirepo.template import hellweg_dump_reader
+    from sirepo.template import template_common
+
+    sim_type = 'hellweg'
+    models = fc.sr_sim_data(sim_type).models
+    sid = models.simulation.simulationId
+    data = pkcollections.Dict(
+        models=models,
+        report='animation',
+        simulationId=sid,
+        simulationType=sim_type,
+    )
+    h = template_common.report_parameters_hash(data)
+    # a completed run with two frames
+    run_dir = pkio.mkdir_parent(
+        pkio.py_path(simulation_db.find_global_simulation(sim_type, sid)).join(data.report),
+    )
+    simulation_db.write_json(run_dir.join(template_common.INPUT_BASE_NAME), data)
+    with open(str(run_dir.join(hellweg.HELLWEG_DUMP_FILE)), 'wb') as f:
+        x = hellweg_dump_reader.THeader()
+        x.NPoints = 2
+        x.NParticles = 3
+        f.write(x)
+        for _ in range(x.NPoints):
+            f.write(hellweg_dump_reader.TStructure())
+        for i in range(x.NPoints):
+            b = hellweg_dump_reader.TBeamHeader()
+            b.beam_lmb = 1
+            f.write(b)
+            for j in range(x.NParticles):
+                p = hellweg_dump_reader.TParticle()
+                p.x = i + j
+                p.y = j
+                f.write(p)
+    pkio.write_text(run_dir.join(hellweg.HELLWEG_SUMMARY_FILE), 'summary')
+    simulation_db.write_result({}, run_dir=run_dir)
+
+    def _frame(index):
+        return '*'.join([sim_type, sid, 'beamAnimation', 'x-y_10_' + h, str(index), h])
+
+    items = [
+        dict(report=data.report),
+        dict(frameId=_frame(1)),
+        dict(frameId=_frame(0)),
+        # no such frame
+        dict(frameId=_frame(5)),
+        dict(report=data.report, reportParametersHash=h),
+        # another simulationType
+        dict(frameId='myapp' + _frame(0)[len(sim_type):]),
+    ]
+    del data['report']
+    data['items'] = items
+    res = fc.sr_post('simulationBatch', data)['items']
+    pkeq(len(items), len(res))
+    for i in 0, 4:
+        pkeq('completed', res[i].state)
+        pkeq(2, res[i].frameCount)
+        pkeq(False, res[i].parametersChanged)
+    for i in 1, 2:
+        pkeq(
+            fc.sr_get('simulationFrame', dict(frame_id=items[i]['frameId'])),
+            res[i],
+        )
+        pkeq('summary', res[i].summaryData)
+    for i in 3, 5:
+        pkeq('error', res[i].state)
+    del data['items']
+    pkeq('error', fc.sr_post('simulationBatch', data).state)
@@ -0,0 +1,418 @@
+# -*- coding: utf-8 -*-
+u"""PyTest for :mod:`sirepo.simulation_db`
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+import pytest
+
+
+def test_catalog():
+    pytest.importorskip('srwl_bl')
+    from pykern import pkio
+    from pykern.pkunit import pkeq, pkok
+    from sirepo import simulation_db
+    from sirepo import sr_unit
+
+    fc = sr_unit.flask_client()
+    sim_type = 'srw'
+    rows = fc.sr_post('listSimulations', {'simulationType': sim_type})
+    d = pkio.sorted_glob(simulation_db.user_dir_name().join('*', sim_type))[0]
+    c = _catalog(d)
+    pkeq(len(rows), len(c), '{}: catalog does not match list', c.keys())
+    sid = rows[0]['simulationId']
+    pkeq(rows[0]['name'], c[sid].models.simulation.name)
+    fc.sr_post('deleteSimulation', {'simulationType': sim_type, 'simulationId': sid})
+    c = _catalog(d)
+    pkok(sid not in c, '{}: deleted simulation still in catalog', sid)
+    rows2 = fc.sr_post('listSimulations', {'simulationType': sim_type})
+    pkeq(len(rows) - 1, len(rows2))
+
+
+def test_catalog_log():
+    from pykern import pkio
+    from pykern.pkunit import pkeq, pkok
+    from sirepo import sr_unit
+
+    fc = sr_unit.flask_client({'SIREPO_FEATURE_CONFIG_SIM_TYPES': 'myapp'})
+    from sirepo import simulation_db
+
+    sim_type = 'myapp'
+    rows = fc.sr_post('listSimulations', {'simulationType': sim_type})
+    for _ in range(2):
+        fc.sr_post(
+            'copySimulation',
+            {'simulationType': sim_type, 'simulationId': rows[0].simulationId},
+        )
+    rows = fc.sr_post('listSimulations', {'simulationType': sim_type})
+    pkeq(3, len(rows))
+    d = pkio.sorted_glob(simulation_db.user_dir_name().join('*', sim_type))[0]
+    f = d.join(simulation_db.CATALOG_FILE)
+    i = f.stat().ino
+    sid = rows[0].simulationId
+    data = fc.sr_get(
+        'simulationData',
+        params=dict(pretty='0', simulation_id=sid, simulation_type=sim_type),
+    )
+    data.models.simulation.name = 'logged'
+    fc.sr_post('saveSimulationData', data)
+    fc.sr_post('deleteSimulation', {'simulationType': sim_type, 'simulationId': rows[1].simulationId})
+    pkeq(i, f.stat().ino, 'catalog rewritten on save')
+    rows2 = fc.sr_post('listSimulations', {'simulationType': sim_type})
+    pkeq(len(rows) - 1, len(rows2))
+    pkeq('logged', [r.name for r in rows2 if r.simulationId == sid][0])
+    # created outside of the catalog
+    x = d.join(rows[2].simulationId)
+    x.copy(d.join('Xcopied1'))
+    pkeq(len(rows), len(fc.sr_post('listSimulations', {'simulationType': sim_type})))
+    # written outside of save, e.g. by the srw python import
+    p = x.join(simulation_db.SIMULATION_DATA_FILE)
+    data = simulation_db.read_json(p)
+    data.models.simulation.name = 'imported'
+    simulation_db.write_json(p, data)
+    rows2 = fc.sr_post('listSimulations', {'simulationType': sim_type})
+    pkeq('imported', [r.name for r in rows2 if r.simulationId == rows[2].simulationId][0])
+    simulation_db._CATALOG_LOG_MAX_BYTES = 0
+    fc.sr_post('listSimulations', {'simulationType': sim_type})
+    pkok(i != f.stat().ino, 'catalog not compacted')
+    pkeq(0, d.join(simulation_db._CATALOG_LOG_FILE).size())
+    c = simulation_db.read_json(f).simulations
+    pkeq(len(rows), len(c))
+    pkeq('logged', c[sid].models.simulation.name)
+
+
+def test_run_dir_signature():
+    from pykern import pkio
+    from pykern import pkunit
+    from pykern.pkunit import pkeq, pkok
+    from sirepo import simulation_db
+    from sirepo.template import template_common
+
+    with pkunit.save_chdir_work() as d:
+        run_dir = d.join('run')
+        pkeq(None, simulation_db.run_dir_signature(run_dir))
+        pkio.mkdir_parent(run_dir)
+        pkio.write_text(run_dir.join('status'), 'running')
+        s1 = simulation_db.run_dir_signature(run_dir)
+        pkeq(s1, simulation_db.run_dir_signature(run_dir))
+        with open(str(run_dir.join('status')), 'a') as f:
+            f.write('x')
+        s2 = simulation_db.run_dir_signature(run_dir)
+        pkok(s1 != s2, 'signature unchanged after append')
+        pkio.mkdir_parent(run_dir.join('frames'))
+        pkio.write_text(run_dir.join('frames', 'frame-0'), '1')
+        s3 = simulation_db.run_dir_signature(run_dir)
+        pkok(s2 != s3, 'signature unchanged after subdirectory create')
+        pkio.write_text(run_dir.join(template_common.RUN_LOG), 'step 1')
+        s4 = simulation_db.run_dir_signature(run_dir)
+        pkok(s3 != s4, 'signature unchanged after run log write')
+        p = [run_dir.join('frames'), run_dir.join('frames', 'frame-0')]
+        s5 = simulation_db.run_dir_signature(run_dir, p)
+        with open(str(p[1]), 'a') as f:
+            f.write('2')
+        pkok(s5 != simulation_db.run_dir_signature(run_dir, p), 'signature unchanged after progress file write')
+        run_dir.join('status').remove()
+        pkok(s4 != simulation_db.run_dir_signature(run_dir), 'signature unchanged after remove')
+
+
+def test_sid_locator():
+    from pykern import pkio
+    from pykern.pkunit import pkeq, pkok
+    from sirepo import sr_unit
+
+    fc = sr_unit.flask_client({'SIREPO_FEATURE_CONFIG_SIM_TYPES': 'myapp'})
+    from sirepo import simulation_db
+
+    sim_type = 'myapp'
+    rows = fc.sr_post('listSimulations', {'simulationType': sim_type})
+    for _ in range(2):
+        fc.sr_post(
+            'copySimulation',
+            {'simulationType': sim_type, 'simulationId': rows[0]['simulationId']},
+        )
+    rows = fc.sr_post('listSimulations', {'simulationType': sim_type})
+    pkeq(3, len(rows))
+    for r in rows:
+        d = simulation_db.find_global_simulation(sim_type, r['simulationId'], checked=True)
+        pkeq(r['simulationId'], pkio.py_path(d).basename)
+    # another worker starting doesn't rebuild it
+    i = simulation_db._locator_dir().stat().ino
+    simulation_db.init_by_server(simulation_db._app, simulation_db._server)
+    pkeq(i, simulation_db._locator_dir().stat().ino)
+    pkeq(len(rows), simulation_db.rebuild_sid_locator())
+    pkok(i != simulation_db._locator_dir().stat().ino, 'locator not rebuilt')
+    sid = rows[0]['simulationId']
+    d = simulation_db.find_global_simulation(sim_type, sid)
+    pkok(d, '{}: not found after rebuild', sid)
+    l = pkio.py_path(d).dirpath().join('.{}.lock'.format(sid))
+    fc.sr_post(
+        'saveSimulationData',
+        fc.sr_get(
+            'simulationData',
+            params=dict(pretty='0', simulation_id=sid, simulation_type=sim_type),
+        ),
+    )
+    pkok(l.check(), '{}: lock file not created by save', l)
+    fc.sr_post('deleteSimulation', {'simulationType': sim_type, 'simulationId': sid})
+    pkeq(None, simulation_db.find_global_simulation(sim_type, sid))
+    pkok(not l.check(), '{}: lock file not removed', l)
+    # removed without delete_simulation, e.g. purge_users
+    sid = rows[1]['simulationId']
+    pkio.unchecked_remove(simulation_db.find_global_simulation(sim_type, sid))
+    pkeq(None, simulation_db.find_global_simulation(sim_type, sid))
+    pkeq(len(rows) - 2, simulation_db.rebuild_sid_locator())
+
+
+def test_concurrent_saves():
+    """Processes save the same simulation and create same named simulations
+
+    Each save reads the document, increments dog.weight, and saves it
+    with the serial it read. A save rejected with invalidSerial is
+    retried so no increment may be lost. Throughput is logged.
+    """
+    from pykern.pkdebug import pkdlog, pkdexc
+    from pykern.pkunit import pkeq, pkok
+    from sirepo import sr_unit
+    import os
+    import signal
+    import time
+
+    procs = 4
+    saves = 10
+    fc = sr_unit.flask_client({'SIREPO_FEATURE_CONFIG_SIM_TYPES': 'myapp'})
+    sim_type = 'myapp'
+    fc.sr_post('listSimulations', {'simulationType': sim_type})
+    d = fc.sr_post(
+        'newSimulation',
+        {'simulationType': sim_type, 'name': 'stress', 'folder': '/'},
+    )
+    sid = d.models.simulation.simulationId
+    w = d.models.dog.weight
+
+    def _child():
+        fc.sr_post(
+            'newSimulation',
+            {'simulationType': sim_type, 'name': 'same', 'folder': '/'},
+        )
+        retries = 0
+        for _ in range(saves):
+            while True:
+                d = fc.sr_get(
+                    'simulationData',
+                    params=dict(pretty='0', simulation_id=sid, simulation_type=sim_type),
+                )
+                d.models.dog.weight += 1
+                r = fc.sr_post('saveSimulationData', d)
+                if r.get('error') != 'invalidSerial':
+                    break
+                retries += 1
+        return retries
+
+    # runner's handler would reap the children
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    pids = []
+    t = time.time()
+    for _ in range(procs):
+        pid = os.fork()
+        if pid == 0:
+            res = 1
+            try:
+                pkdlog('retries={}', _child())
+                res = 0
+            except Exception:
+                pkdlog('{}', pkdexc())
+            finally:
+                os._exit(res)
+        pids.append(pid)
+    for pid in pids:
+        pkeq(0, os.waitpid(pid, 0)[1], '{}: child failed', pid)
+    t = time.time() - t
+    pkdlog('{} saves in {:.2f}s: {:.1f} saves/s', procs * saves, t, procs * saves / t)
+    d = fc.sr_get(
+        'simulationData',
+        params=dict(pretty='0', simulation_id=sid, simulation_type=sim_type),
+    )
+    pkeq(w + procs * saves, d.models.dog.weight)
+    rows = fc.sr_post('listSimulations', {'simulationType': sim_type})
+    n = sorted(r.name for r in rows if r.name.startswith('same'))
+    pkeq(procs, len(set(n)), '{}: names not unique', n)
+
+
+def test_example_store():
+    from pykern import pkio
+    from pykern.pkunit import pkeq, pkok
+    from sirepo import sr_unit
+    import os
+
+    fc = sr_unit.flask_client({'SIREPO_FEATURE_CONFIG_SIM_TYPES': 'myapp'})
+    from sirepo import simulation_db
+
+    sim_type = 'myapp'
+
+    def _doc(sid):
+        return pkio.py_path(simulation_db.find_global_simulation(sim_type, sid)).join(
+            simulation_db.SIMULATION_DATA_FILE,
+        )
+
+    # store of another version, which its servers may still link from
+    other = pkio.mkdir_parent(
+        simulation_db._app.sirepo_db_dir.join(simulation_db._EXAMPLE_STORE_DIR, sim_type + '-other'),
+    )
+    simulation_db._example_stores.pop(sim_type, None)
+    pkio.unchecked_remove(*pkio.sorted_glob(other.dirpath().join(sim_type + '-[0-9a-f]*')))
+    rows = []
+    for _ in range(2):
+        # new user
+        fc.cookie_jar.clear()
+        r = fc.sr_post('listSimulations', {'simulationType': sim_type})
+        pkok(r, 'no examples')
+        rows.append(r[0])
+    pkok(rows[0].simulationId != rows[1].simulationId, 'users share sid')
+    docs = [_doc(r.simulationId) for r in rows]
+    pkeq(docs[0].stat().ino, docs[1].stat().ino)
+    pkok(not os.access(str(docs[0]), os.W_OK) or os.getuid() == 0, 'shared example writable')
+    d = fc.sr_get(
+        'simulationData',
+        params=dict(pretty='0', simulation_id=rows[1].simulationId, simulation_type=sim_type),
+    )
+    pkeq(rows[1].simulationId, d.models.simulation.simulationId)
+    pkok(d.models.simulation.isExample, 'not an example')
+    n = d.models.simulation.name
+    d.models.simulation.name = 'private'
+    fc.sr_post('saveSimulationData', d)
+    pkok(docs[0].stat().ino != docs[1].stat().ino, 'save did not replace link')
+    pkeq(n, simulation_db.read_json(docs[0]).models.simulation.name)
+    pkeq('private', simulation_db.read_json(docs[1]).models.simulation.name)
+    pkok(other.check(dir=True), 'store of another version removed')
+
+
+def test_json_cache():
+    from pykern import pkio
+    from pykern import pkunit
+    from pykern.pkunit import pkeq, pkok
+    from sirepo import simulation_db
+    import copy
+
+    with pkunit.save_chdir_work() as d:
+        fn = d.join('doc.json')
+        doc = simulation_db.read_json(
+            simulation_db.STATIC_FOLDER.dirpath().join('template', 'myapp', 'examples', 'scooby-doo.json'),
+        )
+        doc.models.elements = [{'l': 1.5, 'a': [1]}, {'l': 2}]
+        simulation_db.write_json(fn, doc)
+        s = simulation_db.json_cache_stats()
+        # not cached
+        simulation_db.read_json(fn)
+        pkeq(s, simulation_db.json_cache_stats())
+        expect = copy.deepcopy(simulation_db.open_json_file('myapp', path=fn))
+        r1 = simulation_db.open_json_file('myapp', path=fn)
+        r1.models.dog.weight = -1
+        r1.models.dog.pop('height')
+        r1.models.simulation.setdefault('x', []).append(1)
+        r1.models.elements[0].a.append(2)
+        r1.models.elements[1:][0].l = 3
+        for e in r1.models.elements:
+            e.l += 10
+        x = copy.deepcopy(r1)
+        pkeq(x, r1)
+        pkeq([11.5, 13], [e.l for e in x.models.elements])
+        pkeq([1, 2], x.models.elements[0].a)
+        r2 = simulation_db.open_json_file('myapp', path=fn)
+        pkeq(expect, r2)
+        pkeq(expect, simulation_db.json_load(simulation_db.generate_json(r2)))
+        s2 = simulation_db.json_cache_stats()
+        pkeq(s.misses + 1, s2.misses)
+        pkeq(s.hits + 2, s2.hits)
+        pkeq(s.entries + 1, s2.entries)
+        simulation_db.write_json(fn, r1)
+        pkeq(-1, simulation_db.open_json_file('myapp', path=fn).models.dog.weight)
+        # modified by another process
+        r1.models.dog.weight = -2
+        pkio.write_text(fn, simulation_db.generate_json(r1))
+        pkeq(-2, simulation_db.open_json_file('myapp', path=fn).models.dog.weight)
+        s3 = simulation_db.json_cache_stats()
+        pkeq(s2.misses + 2, s3.misses)
+        pkeq(s2.hits, s3.hits)
+        pkeq(s2.entries, s3.entries)
+
+
+
+def test_write_json():
+    """Atomic write and save latency of the largest examples"""
+    from pykern import pkio
+    from pykern import pkunit
+    from pykern.pkdebug import pkdlog
+    from pykern.pkunit import pkeq, pkok
+    from sirepo import simulation_db
+    import os
+    import time
+
+    def _time(op):
+        t = time.time()
+        for _ in range(3):
+            op()
+        return (time.time() - t) / 3
+
+    examples = sorted(
+        pkio.sorted_glob(simulation_db.STATIC_FOLDER.dirpath().join('template', '*', 'examples', '*.json')),
+        key=lambda p: -p.size(),
+    )[:3]
+    with pkunit.save_chdir_work() as d:
+        pkdlog('{:50} {:>10} {:>8} {:>10} {:>8} {:>8}', 'example', 'pretty', 'secs', 'compact', 'secs', 'fsync')
+        for e in examples:
+            data = simulation_db.read_json(e)
+            fn = d.join(e.basename)
+            res = []
+            for c, f in (False, False), (True, False), (True, True):
+                simulation_db.cfg.compact_json = c
+                simulation_db.cfg.fsync = f
+                res.append(_time(lambda: simulation_db.write_json(fn, data)))
+                res.append(fn.size())
+                pkeq(data, simulation_db.read_json(fn))
+            pkdlog(
+                '{:50} {:10d} {:8.4f} {:10d} {:8.4f} {:8.4f}',
+                e.relto(simulation_db.STATIC_FOLDER.dirpath()),
+                res[1],
+                res[0],
+                res[3],
+                res[2],
+                res[4],
+            )
+            pkok(res[3] < res[1], '{}: compact={} not smaller than pretty={}', e, res[3], res[1])
+        pkeq([], [f for f in os.listdir(str(d)) if '.tmp' in f])
+        pkio.mkdir_parent('x.json')
+        with pkunit.pkexcept(OSError):
+            simulation_db.write_json('x', {})
+        pkeq([], [f for f in os.listdir(str(d)) if '.tmp' in f])
+
+
+def test_run_dir_wait():
+    from pykern import pkio
+    from pykern import pkunit
+    from pykern.pkunit import pkok
+    from sirepo import simulation_db
+    import sys
+    import threading
+    import time
+
+    with pkunit.save_chdir_work() as d:
+        run_dir = pkio.mkdir_parent(d.join('run'))
+        t = time.time()
+        simulation_db.run_dir_wait(run_dir, 0.5)
+        pkok(time.time() - t >= 0.45, 'returned before timeout without a change')
+        w = threading.Timer(0.2, lambda: pkio.write_text(run_dir.join('status'), 'running'))
+        w.start()
+        t = time.time()
+        simulation_db.run_dir_wait(run_dir, 5)
+        w.join()
+        if sys.platform.startswith('linux'):
+            # inotify, otherwise waits for the timeout
+            pkok(time.time() - t < 2, 'change not seen')
+
+
+def _catalog(sim_dir):
+    from sirepo import simulation_db
+
+    with simulation_db._catalog_log(sim_dir) as fd:
+        return simulation_db._catalog_load(sim_dir, fd)[0]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+u"""Test simulationSchema caching
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+import pytest
+
+
+def test_etag():
+    from pykern import pkunit
+    from sirepo import simulation_db
+    from sirepo import sr_unit
+    import gzip
+    import io
+    import json
+
+    fc = sr_unit.flask_client({'SIREPO_FEATURE_CONFIG_SIM_TYPES': 'myapp'})
+    uri = '/simulation-schema?simulationType=myapp'
+    r = fc.get(uri)
+    pkunit.pkeq(200, r.status_code)
+    expect = json.loads(r.data)
+    pkunit.pkeq('myapp', expect['simulationType'])
+    pkunit.pkeq(json.loads(simulation_db.generate_json(simulation_db.get_schema('myapp'))), expect)
+    r = fc.get(uri, headers={'Accept-Encoding': 'gzip'})
+    pkunit.pkeq('gzip', r.headers['Content-Encoding'])
+    pkunit.pkeq(expect, json.loads(gzip.GzipFile(fileobj=io.BytesIO(r.data)).read()))
+    etag = r.headers['ETag']
+    r = fc.get(uri, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    pkunit.pkeq(304, r.status_code)
+    pkunit.pkeq(b'', r.data)
+    r = fc.get(uri, headers={'If-None-Match': etag})
+    pkunit.pkeq(200, r.status_code)
+    # original client request
+    r = fc.post('/simulation-schema', data={'simulationType': 'myapp'})
+    pkunit.pkeq(expect, json.loads(r.data))
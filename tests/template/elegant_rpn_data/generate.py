@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+u"""Regenerate rpnl.txt by running rpnl on each of its expressions
+
+Usage: python generate.py [rpnl]
+
+rpnl (from the SDDS toolkit) must be on the PATH or passed as the
+argument. It is run with RPN_DEFNS set to sirepo's defns.rpn, once per
+expression, like sirepo did before `sirepo.template.elegant_rpn`.
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+import os
+import subprocess
+import sys
+
+_HEADER = '''# rpnl output for each expression (with RPN_DEFNS=defns.rpn)
+# generated by generate.py, which runs rpnl once per expression
+# format: expression => output, where "error" is a non-zero exit of rpnl
+'''
+
+
+def main():
+    rpnl = sys.argv[1] if len(sys.argv) > 1 else 'rpnl'
+    d = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    env['RPN_DEFNS'] = os.path.join(
+        d, '..', '..', '..', 'sirepo', 'package_data', 'template', 'elegant', 'defns.rpn',
+    )
+    p = os.path.join(d, 'rpnl.txt')
+    res = []
+    with open(p) as f:
+        for l in f:
+            l = l.rstrip('\n')
+            if not l or l.startswith('#'):
+                continue
+            e = l.split(' => ')[0]
+            r = subprocess.Popen(
+                [rpnl, e],
+                env=env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+            out = r.communicate()[0].decode().strip()
+            res.append('{} => {}'.format(e, out if r.returncode == 0 else 'error'))
+    with open(p, 'w') as f:
+        f.write(_HEADER + '\n'.join(res) + '\n')
+
+
+if __name__ == '__main__':
+    main()
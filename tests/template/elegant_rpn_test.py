@@ -10,9 +10,43 @@ from pykern import pkunit
 from pykern.pkdebug import pkdc, pkdp, pkdlog, pkdexc
 import pytest
 
-pytest.importorskip('sdds')
+
+def test_conformance():
+    """Compare with rpnl.txt, which is generated by running rpnl (see generate.py)"""
+    from sirepo.template import elegant_rpn
+    import math
+
+    e = elegant_rpn.Evaluator([])
+    for l in pkio.read_text(pkunit.data_dir().join('rpnl.txt')).splitlines():
+        if not l or l.startswith('#'):
+            continue
+        expr, expect = l.split(' => ')
+        actual, err = e.eval(expr)
+        if expect == 'error':
+            pkunit.pkok(err, '{}: expected error, got {}', expr, actual)
+            continue
+        pkunit.pkok(
+            actual == float(expect) or math.isnan(float(expect)) and actual is not None and math.isnan(actual),
+            '{}: expect={} actual={} err={}',
+            expr,
+            expect,
+            actual,
+            err,
+        )
+
+
+def test_rejected():
+    """rpnl runs these, but they read, write, or execute files"""
+    from sirepo.template import elegant_rpn
+
+    e = elegant_rpn.Evaluator([])
+    for expr in ('"ls" execs', '"x" puts', '"f" mudf'):
+        actual, err = e.eval(expr)
+        pkunit.pkok(err, '{}: expected error, got {}', expr, actual)
+
 
 def test_rpn():
+    pytest.importorskip('sdds')
     # postfix
     assert _rpn_value({
         'value': '1 2 +',
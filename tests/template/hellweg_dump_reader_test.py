@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+u"""PyTest for :mod:`sirepo.template.hellweg_dump_reader`
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+from pykern import pkunit
+import pytest
+
+
+def test_beam_info():
+    from sirepo.template import hellweg_dump_reader as r
+
+    with pkunit.save_chdir_work() as d:
+        fn = str(d.join('all-data.bin'))
+        expect = _write_dump(fn, 5, 37)
+        pkunit.pkeq(5, r.beam_header(fn).NPoints)
+        for idx in (0, 2, 4):
+            info = r.beam_info(fn, idx)
+            bh, particles = expect['beams'][idx]
+            pkunit.pkeq(
+                expect['structures'][idx].ksi * expect['structures'][idx].lmb,
+                r.get_parameter(info, 'z'),
+            )
+            for field in r._BEAM_PARAMETER:
+                _assert_values(
+                    [r._BEAM_PARAMETER[field](p, bh.beam_lmb) for p in particles if p.lost == 0],
+                    r.get_points(info, field),
+                    '{}: frame={}'.format(field, idx),
+                )
+
+
+def test_particle_info():
+    from sirepo.template import hellweg_dump_reader as r
+
+    with pkunit.save_chdir_work() as d:
+        fn = str(d.join('all-data.bin'))
+        expect = _write_dump(fn, 6, 23)
+        for field in ('x', 'w', 'ay'):
+            for count in (1, 4, 6, 10):
+                info = r.particle_info(fn, field, count)
+                _assert_values(
+                    [s.ksi * s.lmb for s in expect['structures']],
+                    info['z_values'],
+                    'z_values',
+                )
+                indices = sorted(set(int(round((i * 23) / min(count, 6))) for i in range(min(count, 6))))
+                pkunit.pkeq(len(indices), len(info['y_values']))
+                all_y = []
+                for i, idx in enumerate(indices):
+                    y = []
+                    for bh, particles in expect['beams']:
+                        p = particles[idx]
+                        if p.lost == 0:
+                            y.append(r._BEAM_PARAMETER[field](p, bh.beam_lmb))
+                    _assert_values(y, info['y_values'][i], '{}: particle={}'.format(field, idx))
+                    all_y.extend(y)
+                _assert_values([min(all_y), max(all_y)], info['y_range'], 'y_range')
+
+
+def test_truncated():
+    from sirepo.template import hellweg_dump_reader as r
+
+    with pkunit.save_chdir_work() as d:
+        fn = str(d.join('all-data.bin'))
+        _write_dump(fn, 2, 3)
+        with open(fn, 'ab') as f:
+            f.write(b'x')
+        with pytest.raises(AssertionError):
+            r.beam_info(fn, 0)
+
+
+def _assert_values(expect, actual, msg):
+    import numpy
+
+    pkunit.pkeq(len(expect), len(actual), '{}: length', msg)
+    pkunit.pkok(
+        numpy.allclose(numpy.array(expect, dtype=float), actual, rtol=1e-14, atol=0),
+        '{}: expect={} actual={}',
+        msg,
+        expect,
+        actual,
+    )
+
+
+def _write_dump(filename, points, particles):
+    """Write a random dump with ctypes and read it back the same way"""
+    from sirepo.template import hellweg_dump_reader as r
+    import ctypes
+    import random
+
+    def _fill(struct):
+        for n, t in struct._fields_:
+            if issubclass(t, ctypes.Structure):
+                _fill(getattr(struct, n))
+            elif t == ctypes.c_double:
+                setattr(struct, n, random.uniform(0.1, 0.9))
+            elif t == ctypes.c_bool:
+                setattr(struct, n, random.random() < 0.5)
+            else:
+                setattr(struct, n, random.randint(0, 2))
+        return struct
+
+    def _read(f, struct):
+        assert f.readinto(struct) == ctypes.sizeof(struct)
+        return struct
+
+    random.seed(points * particles)
+    with open(filename, 'wb') as f:
+        h = r.THeader()
+        h.NPoints = points
+        h.NParticles = particles
+        f.write(h)
+        for _ in range(points):
+            f.write(_fill(r.TStructure()))
+        for _ in range(points):
+            f.write(_fill(r.TBeamHeader()))
+            for _ in range(particles):
+                f.write(_fill(r.TParticle()))
+    res = {
+        'structures': [],
+        'beams': [],
+    }
+    with open(filename, 'rb') as f:
+        _read(f, r.THeader())
+        for _ in range(points):
+            res['structures'].append(_read(f, r.TStructure()))
+        for _ in range(points):
+            res['beams'].append((
+                _read(f, r.TBeamHeader()),
+                [_read(f, r.TParticle()) for _ in range(particles)],
+            ))
+    return res
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+u"""PyTest for :mod:`sirepo.template.sdds_util`
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+import pytest
+
+pytest.importorskip('sdds')
+
+_FILE = 'bunchFile-sourceFile.beamFile.sdds'
+
+
+def test_extract_columns():
+    from pykern import pkunit
+    from sirepo.template import sdds_util
+    import numpy
+
+    fn = _path()
+    fields = ['x', 'xp', 't']
+    res = sdds_util.extract_sdds_columns(fn, fields, 0)
+    pkunit.pkeq(None, res['err'])
+    for f in fields:
+        c = sdds_util.extract_sdds_column(fn, f, 0)
+        pkunit.pkok(isinstance(c['values'], numpy.ndarray), '{}: not ndarray', f)
+        pkunit.pkok(numpy.array_equal(c['values'], res['values'][f]), '{}: values differ', f)
+        pkunit.pkeq(c['column_def'], res['column_defs'][f])
+    pi = sdds_util.read_page_index(fn)
+    pkunit.pkeq(pi.row_counts[0], len(res['values']['x']))
+    pkunit.pkok(pi is sdds_util.read_page_index(fn), 'page index not cached')
+    res = sdds_util.extract_sdds_columns(fn, fields, len(pi.row_counts))
+    pkunit.pkok(res['err'], 'page past end of file should be an error')
+
+
+def test_writing():
+    from pykern import pkunit
+    from sirepo.template import sdds_util
+    import shutil
+
+    d = pkunit.empty_work_dir()
+    fn = str(d.join(_FILE))
+    shutil.copy(_path(), fn)
+    # just written so not indexed
+    res = sdds_util.extract_sdds_columns(fn, ['x'], 0)
+    pkunit.pkeq(None, res['err'])
+    pkunit.pkok(
+        not any(k[0] == fn for k in sdds_util._page_index_cache),
+        'file being written should not be indexed',
+    )
+    pkunit.pkok(sdds_util.extract_sdds_columns(fn, ['x'], 100)['err'], 'page 100 should not be found')
+
+
+def test_threads():
+    from pykern import pkunit
+    from sirepo.template import sdds_util
+    import numpy
+    import threading
+
+    fn = _path()
+    expect = sdds_util.extract_sdds_columns(fn, ['x', 'y'], 0)
+    errors = []
+
+    def _read():
+        for _ in range(20):
+            r = sdds_util.extract_sdds_columns(fn, ['x', 'y'], 0)
+            if r['err'] or not numpy.array_equal(r['values']['y'], expect['values']['y']):
+                errors.append(r)
+
+    threads = [threading.Thread(target=_read) for _ in range(sdds_util._MAX_DATASETS + 5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    pkunit.pkeq([], errors)
+
+
+def _path():
+    from sirepo.template import elegant_common
+
+    return str(elegant_common.RESOURCE_DIR.join(_FILE))
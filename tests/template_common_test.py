@@ -8,6 +8,7 @@ from __future__ import absolute_import, division, print_function
 import pytest
 import zipfile
 
+from pykern import pkcollections
 from pykern import pkresource
 from pykern import pkunit
 
@@ -36,3 +37,106 @@ def test_validate_safe_zip():
 
     # Finally, accept a zip file known to be safe
     validate_safe_zip(zip_dir + '/good_zip.zip', zip_dir, validate_magnet_data_file)
+
+
+def test_validate_model():
+    from pykern.pkunit import pkeq
+    from sirepo.template import template_common
+
+    schema = {
+        'enum': {'Color': [['red', 'Red'], ['blue', 'Blue']]},
+        'model': {
+            'm': {
+                'color': ['Color', 'Color', 'red'],
+                'colors': ['Colors', 'Color'],
+                'len': ['Length [mm]', 'Float', 1.0],
+                'wave': ['Wavelength [nm]', 'Float'],
+                'n': ['Count', 'Integer', 1],
+                'name': ['Name', 'String', ''],
+            },
+        },
+    }
+    data = {'models': {'m': {'colors': 'red, blue', 'len': '2.5', 'wave': 3, 'n': '4', 'name': 'a"b'}}}
+    template_common.validate_models(data, schema)
+    m = data['models']['m']
+    pkeq(0.0025, m['len'])
+    pkeq(3e-9, m['wave'])
+    pkeq(4, m['n'])
+    m['colors'] = 'red,green'
+    with pkunit.pkexcept('green'):
+        template_common.validate_models(data, schema)
+    m['colors'] = 'blue'
+    del m['wave']
+    with pkunit.pkexcept('no value'):
+        template_common.validate_models(data, schema)
+
+
+def test_validate_models_benchmark():
+    """Time validation of large elegant and srw documents
+
+    Documents are synthesized from the schema, one element for every
+    model repeated to fill a large lattice or beamline.
+    """
+    from pykern.pkdebug import pkdlog
+    from sirepo import simulation_db
+    from sirepo.template import template_common
+    import copy
+    import time
+
+    def _doc(sim_type, schema, key, count):
+        models = {}
+        for name, fields in schema['model'].items():
+            m = {}
+            for f, info in fields.items():
+                if info[1] in schema['enum']:
+                    m[f] = schema['enum'][info[1]][0][0]
+                elif info[1] == 'Float':
+                    m[f] = 1.5
+                elif info[1] == 'Integer':
+                    m[f] = 1
+                elif len(info) > 2 and info[2] is not None:
+                    m[f] = info[2]
+                else:
+                    m[f] = 'x'
+            models[name] = m
+        res = {'simulationType': sim_type, 'models': copy.deepcopy(models)}
+        # validate_models expects a list of elements
+        res['models'].pop('beamline', None)
+        # beamline elements are identified by type
+        names = sorted(k for k, v in models.items() if 'type' not in v)
+        res['models'][key] = []
+        for i in range(count):
+            m = copy.deepcopy(models[names[i % len(names)]])
+            m['type'] = names[i % len(names)]
+            res['models'][key].append(m)
+        return pkcollections.Dict(res)
+
+    def _validate(data, schema, key):
+        # like elegant._validate_data
+        enum_info = template_common.validate_models(data, schema)
+        if key != 'beamline':
+            for m in data['models'][key]:
+                template_common.validate_model(m, schema['model'][m['type']], enum_info)
+
+    def _time(op, docs):
+        t = time.time()
+        for d in docs:
+            op(d)
+        return (time.time() - t) / len(docs) * 1000
+
+    pkdlog('{:8} {:>8} {:>14} {:>14}', 'type', 'models', 'validate_models', '_validate_fields')
+    for sim_type, key, count in ('elegant', 'elements', 2000), ('srw', 'beamline', 200):
+        schema = simulation_db.get_schema(sim_type)
+        d = _doc(sim_type, schema, key, count)
+        n = 5
+        docs = [copy.deepcopy(d) for _ in range(n)]
+        v1 = _time(lambda x: _validate(x, schema, key), docs)
+        docs = [pkcollections.json_load_any(simulation_db.generate_json(d)) for _ in range(n)]
+        v2 = _time(simulation_db._validate_fields, docs)
+        pkdlog(
+            '{:8} {:8d} {:12.2f}ms {:12.2f}ms',
+            sim_type,
+            len(d['models']) + count,
+            v1,
+            v2,
+        )
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+u"""PyTest for :mod:`sirepo.worker_pool`
+
+:copyright: Copyright (c) 2018 RadiaSoft LLC.  All Rights Reserved.
+:license: http://www.apache.org/licenses/LICENSE-2.0.html
+"""
+from __future__ import absolute_import, division, print_function
+import pytest
+
+_CFG = {
+    'SIREPO_FEATURE_CONFIG_SIM_TYPES': 'myapp',
+    'SIREPO_WORKER_POOL_SIM_TYPES': 'myapp',
+}
+
+
+def test_background():
+    from pykern.pkunit import pkeq, pkfail, pkok
+    from sirepo import sr_unit
+    import time
+
+    fc = sr_unit.flask_client(_CFG)
+    from sirepo import worker_pool
+
+    sim_type = 'myapp'
+    pool = worker_pool._pools[sim_type]
+    for _ in range(50):
+        if pool.is_warm():
+            break
+        time.sleep(.2)
+    else:
+        pkfail('{}: zygote did not start', sim_type)
+    z = pool.process.pid
+    data = fc.sr_sim_data(sim_type)
+    for i in range(2):
+        data.models.dog.weight += 1
+        res = fc.sr_run_sim(data, 'dogReport')
+        pkok(res.plots, 'no plots: {}', res)
+    pkeq(2, pool.jobs)
+    pkeq(z, pool.process.pid)
+
+
+def test_preload():
+    from sirepo import sr_unit
+
+    fc = sr_unit.flask_client(_CFG)
+    fc.sr_post('listSimulations', {'simulationType': 'myapp'})
+    sr_unit.test_in_request(_preload)
+
+
+def _preload():
+    from pykern.pkunit import pkeq, pkexcept, pkok
+    from sirepo import simulation_db
+    from sirepo import worker_pool
+
+    sim_type = 'myapp'
+    data = simulation_db.open_json_file(
+        sim_type,
+        sid=simulation_db.iterate_simulation_datafiles(
+            sim_type,
+            lambda res, path, data: res.append(data.models.simulation.simulationId),
+        )[0],
+    )
+    data.report = 'dogReport'
+    cmd, run_dir = simulation_db.prepare_simulation(data)
+    pkeq(False, worker_pool.run(cmd, run_dir))
+    worker_pool.preload()
+    pkeq(True, worker_pool.run(cmd, run_dir))
+    res, err = simulation_db.read_result(run_dir)
+    pkeq(None, err)
+    pkok(res.plots, 'no plots: {}', res)
+    data.report = 'noSuchReport'
+    cmd, run_dir = simulation_db.prepare_simulation(data)
+    with pkexcept('exit status=1'):
+        worker_pool.run(cmd, run_dir)